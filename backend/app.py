@@ -1,21 +1,32 @@
 import os
-import string
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
 from fastapi import FastAPI, Request, Depends, HTTPException, File, UploadFile
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel
 from typing import Optional, List
 from googleapiclient.http import MediaFileUpload
 import mimetypes
+from collections import namedtuple
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request as GoogleRequest
-from googleapiclient.discovery import build
-from src.prompt_builder import process_user_query, process_logs_query
+from src.prompt_builder import process_update_query, process_logs_query, stream_logs_query
+from src.sheet_cache import snapshot_cache
+from src.sheet_index import build_sheet_index, column_letter_to_number, column_number_to_letter
+from src.write_queue import write_queue, CellWrite, WriteQueueFull, main_cell
+from src.prompt_pruning import pruning_metrics
+from src.log_writer import log_writer
+from src.log_mirror import log_mirror, in_time_window, LOG_HEADERS
+from src.sheet_metadata import metadata_cache
+from src.concurrency import run_blocking, map_concurrently, shutdown as shutdown_blocking_pool
+from src.streaming import stream_blocking, SSE_HEADERS
+from src.google_services import get_service, token_key
+from src.log_analytics import LogTable, answer_logs_query, plan_logs_query, parse_log_time, AGGREGATE_MAX_ROWS
 from dotenv import load_dotenv
 from datetime import datetime
 import uvicorn
@@ -70,11 +81,20 @@ class UpdateSheetRequest(BaseModel):
     site_engineer_name: str = "Unknown"
     groq_api_key: str
 
+class BulkUpdateRequest(BaseModel):
+    spreadsheet_id: str
+    sheet_name: str = "Sheet1"
+    user_queries: List[str]  # One update per entry, e.g. the lines of a DPR
+    site_engineer_name: str = "Unknown"
+    groq_api_key: str
+
 class LogsQueryRequest(BaseModel):
     spreadsheet_id: str
     query: str
     groq_api_key: str
     max_logs: int = 500  # Default to last 500 logs
+    date_from: Optional[str] = None  # YYYY-MM-DD, inclusive
+    date_to: Optional[str] = None  # YYYY-MM-DD, inclusive
 
 # -----------------------------
 # Helper function to get Sheets service
@@ -97,24 +117,64 @@ def get_sheets_service(token: str = Depends(oauth2_scheme)):
                 # This part might need to be improved depending on how refresh tokens are handled client-side
                 pass
 
-        return build('sheets', 'v4', credentials=creds)
+        return get_service('sheets', 'v4', creds)
     except Exception as e:
         raise HTTPException(
             status_code=401,
             detail=f"Invalid authentication credentials: {str(e)}"
         )
 
-def column_letter_to_number(col_letter):
-    """Convert column letter(s) to 0-based column number.
-    
-    Examples:
-    A -> 0, B -> 1, Z -> 25, AA -> 26, AB -> 27, etc.
-    """
-    col_letter = col_letter.upper()
-    result = 0
-    for char in col_letter:
-        result = result * 26 + (ord(char) - ord('A') + 1)
-    return result - 1
+def get_sheet_revision(token, spreadsheet_id):
+    """Return the Drive modifiedTime of a spreadsheet, or None if it can't be read."""
+    try:
+        creds = Credentials(
+            token=token,
+            token_uri=os.getenv("GOOGLE_TOKEN_URI"),
+            client_id=os.getenv("GOOGLE_CLIENT_ID"),
+            client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+            scopes=["https://www.googleapis.com/auth/drive.file"]
+        )
+        drive_service = get_service('drive', 'v3', creds)
+        metadata = drive_service.files().get(
+            fileId=spreadsheet_id,
+            fields='modifiedTime'
+        ).execute()
+        return metadata.get('modifiedTime')
+    except Exception as e:
+        print(f"Warning: Could not read revision of spreadsheet {spreadsheet_id}: {str(e)}")
+        return None
+
+def load_sheet_snapshot(service, token, spreadsheet_id, sheet_name):
+    """Get the sheet grid from the snapshot cache, refetching only when the sheet changed."""
+    def fetch_values():
+        sheet = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=get_sheet_range(sheet_name)
+        ).execute()
+        return sheet.get("values", [])
+
+    def fetch_layout(index):
+        # Header row plus the row descriptor columns: all build_sheet_index reads
+        last_column = column_number_to_letter(max(len(index.headers), 1) - 1)
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[get_sheet_range(sheet_name, "2:2"), get_sheet_range(sheet_name, f"A:{last_column}")]
+        ).execute()
+        header_range, rows_range = result.get('valueRanges', [{}, {}])
+        values = rows_range.get('values', [])
+        if len(values) < 2:
+            return None
+        values[1] = (header_range.get('values') or [[]])[0]
+        return build_sheet_index(values).fingerprint
+
+    return snapshot_cache.get(
+        spreadsheet_id,
+        sheet_name,
+        token_key(token),
+        fetch_values=fetch_values,
+        fetch_revision=lambda: get_sheet_revision(token, spreadsheet_id),
+        fetch_layout=fetch_layout
+    )
 
 def get_sheet_range(sheet_name, cell_range=None):
     """Get proper range specification for Google Sheets API.
@@ -160,18 +220,109 @@ def escape_sheet_name(sheet_name):
     # For direct API calls, use the original name without quotes
     return sheet_name
 
+def parse_quantity(qty):
+    """Parse a requested quantity, treating anything non-numeric as 0."""
+    try:
+        return float(str(qty).strip()) if str(qty).strip().replace('.', '').isdigit() else 0.0
+    except (ValueError, AttributeError):
+        return 0.0
+
+def find_log_last_row(service, spreadsheet_id):
+    """Last non-empty LOG row, from the cached metadata or (once) from column A."""
+    metadata = metadata_cache.get(service, spreadsheet_id)
+    if metadata.log_last_row is None:
+        result = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range="'LOG'!A:A"
+        ).execute()
+        metadata.log_last_row = len(result.get('values', []))
+    return metadata.log_last_row
+
+def read_recent_logs(service, spreadsheet_id, max_logs, since=None, until=None, refreshed=False):
+    """
+    Read the last `max_logs` LOG rows (oldest first) as {header: value} dicts.
+
+    Rows are read backwards from the last LOG row, first in a block of
+    `max_logs`, so without a date window this is a single request for exactly
+    those rows. With `since` / `until` (epoch seconds) older blocks are read
+    until the window is filled or a row older than `since` is reached. Each
+    block is at least twice the previous one and is sized from the rows per
+    second seen so far to reach the window in one step, so a window takes one
+    or two requests when updates are spread evenly and a few otherwise.
+
+    The last LOG row comes from the shared metadata cache. Rows appended after
+    it was cached are still read (the newest block is open-ended); if LOG has
+    fewer rows than cached, the last row is looked up again (`refreshed`).
+    """
+    logs = []
+    last_row = find_log_last_row(service, spreadsheet_id)
+    end_row = last_row
+    block_size = max(1, max_logs)
+    newest_time = oldest_time = None
+    while end_row >= 2 and len(logs) < max_logs:
+        start_row = max(2, end_row - block_size + 1)
+        # The newest block is open-ended so rows appended by other instances are included
+        cell_range = f"'LOG'!A{start_row}:L" if end_row == last_row else f"'LOG'!A{start_row}:L{end_row}"
+        result = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=cell_range,
+            valueRenderOption='FORMATTED_VALUE'  # Changed to get formatted dates instead of serial numbers
+        ).execute()
+        rows = result.get('values', [])
+        if end_row == last_row:
+            metadata = metadata_cache.get(service, spreadsheet_id)
+            if rows and start_row + len(rows) - 1 >= last_row:
+                # Rows appended since log_last_row was cached come with the open-ended block
+                metadata.log_last_row = start_row + len(rows) - 1
+            elif not refreshed:
+                # LOG is shorter than the cached last row (rows deleted by hand): find its end again
+                metadata.log_last_row = None
+                return read_recent_logs(service, spreadsheet_id, max_logs, since, until, refreshed=True)
+        
+        reached_start = False
+        for row in reversed(rows):
+            if len(row) < len(LOG_HEADERS):
+                # Pad the row with empty strings if it's shorter than the headers
+                row = row + [''] * (len(LOG_HEADERS) - len(row))
+            log_entry = dict(zip(LOG_HEADERS, row[:len(LOG_HEADERS)]))
+            time = parse_log_time(log_entry['time'])
+            if not math.isnan(time):
+                newest_time = time if newest_time is None else newest_time
+                oldest_time = time
+            if since is not None and time < since:
+                reached_start = True
+                break
+            if in_time_window(time, since, until) and len(logs) < max_logs:
+                logs.append(log_entry)
+        
+        if reached_start or (since is None and until is None):
+            break
+        end_row = start_row - 1
+        block_size *= 2
+        target = since if since is not None else until
+        if target is not None and oldest_time is not None and newest_time > oldest_time > target:
+            # Rows needed to get back to the window at the rate seen so far, plus some slack
+            rows_per_second = (last_row - start_row + 1) / (newest_time - oldest_time)
+            block_size = max(block_size, int((oldest_time - target) * rows_per_second * 1.25) + max_logs)
+    return list(reversed(logs))
+
+def parse_date_window(date_from, date_to):
+    """Epoch-second bounds for inclusive YYYY-MM-DD dates (either may be None)."""
+    since = datetime.strptime(date_from, "%Y-%m-%d").timestamp() if date_from else None
+    until = (datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)).timestamp() if date_to else None
+    return since, until
+
 def ensure_log_sheet_exists(service, spreadsheet_id):
     """Ensure LOG sheet exists and has the correct headers."""
     try:
         # Check if LOG sheet exists
-        spreadsheet = service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id
-        ).execute()
+        metadata = metadata_cache.get(service, spreadsheet_id)
         
         log_sheet_id = None
-        for sheet in spreadsheet.get('sheets', []):
-            if sheet['properties']['title'] == 'LOG':
-                log_sheet_id = sheet['properties']['sheetId']
+        log_sheet = metadata.sheets.get('LOG')
+        if log_sheet is not None:
+            log_sheet_id = log_sheet.sheet_id
+            if 'log_headers' not in metadata.flags:
                 # Check if headers exist
                 result = service.spreadsheets().values().get(
                     spreadsheetId=spreadsheet_id,
@@ -191,7 +342,7 @@ def ensure_log_sheet_exists(service, spreadsheet_id):
                         valueInputOption='USER_ENTERED',
                         body={'values': [headers]}
                     ).execute()
-                break
+                metadata.flags.add('log_headers')
         
         # If LOG sheet doesn't exist, create it
         if log_sheet_id is None:
@@ -212,7 +363,9 @@ def ensure_log_sheet_exists(service, spreadsheet_id):
                 body={'requests': [add_sheet_request]}
             ).execute()
             
-            log_sheet_id = result['replies'][0]['addSheet']['properties']['sheetId']
+            log_sheet_properties = result['replies'][0]['addSheet']['properties']
+            log_sheet_id = log_sheet_properties['sheetId']
+            metadata_cache.record_sheet(spreadsheet_id, log_sheet_properties)
             
             # Add headers
             headers = [
@@ -227,6 +380,8 @@ def ensure_log_sheet_exists(service, spreadsheet_id):
                 valueInputOption='USER_ENTERED',
                 body={'values': [headers]}
             ).execute()
+            metadata.flags.add('log_headers')
+            metadata.log_last_row = 1
             
             # Freeze the header row
             service.spreadsheets().batchUpdate(
@@ -252,6 +407,16 @@ def ensure_log_sheet_exists(service, spreadsheet_id):
         print(f"Warning: Could not ensure LOG sheet exists: {str(e)}")
         return None
 
+# -----------------------------
+# Shutdown
+# -----------------------------
+@app.on_event("shutdown")
+def shutdown_background_workers():
+    # Apply queued sheet writes, then any LOG entries still buffered by the background writer
+    write_queue.close()
+    log_writer.close()
+    shutdown_blocking_pool()
+
 # -----------------------------
 # Exception handlers
 # -----------------------------
@@ -272,8 +437,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # -----------------------------
 # Existing Hello World endpoint
 # -----------------------------
-@app.post("/api/print-hello-world")
-async def print_hello_world(request: HelloWorldRequest, service=Depends(get_sheets_service)):
+def print_hello_world_sync(request: HelloWorldRequest, service):
     
     spreadsheet_id = request.spreadsheet_id
     sheet_name = request.sheet_name
@@ -291,512 +455,345 @@ async def print_hello_world(request: HelloWorldRequest, service=Depends(get_shee
     ).execute()
     return {"status": "success", "updated_cells": result.get('updatedCells')}
 
+@app.post("/api/print-hello-world")
+async def print_hello_world(request: HelloWorldRequest, service=Depends(get_sheets_service)):
+    return await run_blocking(print_hello_world_sync, request, service)
+
 # -----------------------------
 # New endpoint: get_sheet_info
 # -----------------------------
-@app.post("/api/get-sheet-info")
-async def get_sheet_info(request: SheetInfoRequest, service=Depends(get_sheets_service)):
-    sheet = service.spreadsheets().values().get(
-        spreadsheetId=request.spreadsheet_id,
-        range=get_sheet_range(request.sheet_name)
-    ).execute()
-
-    values = sheet.get("values", [])
-    if not values or len(values) < 2:
+def get_sheet_info_sync(request: SheetInfoRequest, service, token):
+    snapshot = load_sheet_snapshot(service, token, request.spreadsheet_id, request.sheet_name)
+    if not snapshot.index.has_data:
         return {"status": "error", "message": "No data found in the sheet"}
+    return snapshot.index.to_sheet_info()
 
-    # Step 1: Get header row (second row in the sheet)
-    header_row = values[1]
-
-    # Detect breakpoint (first empty cell)
-    breakpoint_index = 0
-    for i, col in enumerate(header_row):
-        if col.strip() == "":
-            breakpoint_index = i
-            break
-    else:
-        breakpoint_index = len(header_row)
-
-    headers_before_break = header_row[:breakpoint_index]
-
-    # Step 2: Prepare ROW_INDEX data
-    row_index_data = {}
-    empty_row_count = 0
-    max_consecutive_empty = 4
-    
-    for idx, row in enumerate(values[2:], start=3):  # start=3 to match sheet row numbers
-        # Check if current row is empty (all cells before breakpoint are empty)
-        is_empty = all((cell.strip() == "" if isinstance(cell, str) else True) 
-                      for cell in row[:breakpoint_index])
-        
-        if is_empty:
-            empty_row_count += 1
-            if empty_row_count >= max_consecutive_empty:
-                break  # Stop if we hit 4 consecutive empty rows
-            continue
-        else:
-            empty_row_count = 0  # Reset counter if we find a non-empty row
-            
-        row_data = row[:breakpoint_index] + [""] * (len(headers_before_break) - len(row))
-        row_index_data[idx] = dict(zip(headers_before_break, row_data))
-
-    # Step 3: Prepare COLUMN_INDEX data (after breakpoint until empty after non-empty found)
-    column_index_data = {}
-    col_letters = list(string.ascii_uppercase)
-    col_letters += [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase]
-
-    found_non_empty = False
-    for i in range(breakpoint_index, len(header_row)):
-        col_name = header_row[i] if i < len(header_row) else ""
-        if col_name.strip() != "":
-            found_non_empty = True
-            column_index_data[col_letters[i]] = col_name
-        elif found_non_empty:  
-            # Stop only if we already started collecting column headers
-            break
-
-    return {
-        "status": "success",
-        "ROW_INDEX": row_index_data,
-        "COLUMN_INDEX": column_index_data
-    }
+@app.post("/api/get-sheet-info")
+async def get_sheet_info(request: SheetInfoRequest, service=Depends(get_sheets_service), token: str = Depends(oauth2_scheme)):
+    return await run_blocking(get_sheet_info_sync, request, service, token)
 
 # -----------------------------
 # New endpoint: update_sheet
 # -----------------------------
-@app.post("/api/update-sheet")
-async def update_sheet(request: UpdateSheetRequest, service=Depends(get_sheets_service), token: str = Depends(oauth2_scheme)):
+class UpdateError(Exception):
+    """An update that can't be applied; the message is returned to the client."""
+
+CellUpdate = namedtuple('CellUpdate', ['row_idx', 'col_idx', 'update', 'quantity', 'feedback', 'user_query'])
+
+def load_update_target(service, token, spreadsheet_id, sheet_name):
+    """Check the sheet exists and load its index; returns (metadata, snapshot)."""
+    # First check if the sheet exists
     try:
-        # First check if the sheet exists
+        metadata = metadata_cache.get(service, spreadsheet_id)
+        if sheet_name not in metadata.sheets:
+            # The sheet may have been added since the metadata was cached
+            metadata_cache.invalidate(spreadsheet_id)
+            metadata = metadata_cache.get(service, spreadsheet_id)
+        
+        available_sheets = metadata.titles
+        print(f"DEBUG: Available sheets: {available_sheets}")
+        print(f"DEBUG: Requested sheet: '{sheet_name}'")
+        
+    except Exception as e:
+        print(f"DEBUG: Error checking spreadsheet info: {str(e)}")
+        raise UpdateError(f"Error accessing spreadsheet: {str(e)}")
+    
+    if sheet_name not in available_sheets:
+        raise UpdateError(f"Sheet '{sheet_name}' not found. Available sheets: {available_sheets}")
+    
+    # Get the compiled sheet index from the snapshot cache
+    snapshot = load_sheet_snapshot(service, token, spreadsheet_id, sheet_name)
+    sheet_index = snapshot.index
+    if not sheet_index.has_data:
+        raise UpdateError("No data found in the sheet")
+    if sheet_index.location_col is None or sheet_index.peta_location_col is None:
+        raise UpdateError("Required columns 'Location' and 'Peta Location' not found in sheet")
+    return metadata, snapshot
+
+def update_sheet_info(snapshot):
+    """ROW_INDEX / COLUMN_INDEX for update prompts, built once per snapshot."""
+    return snapshot.derive("update_sheet_info", lambda index: {
+        "status": "success",
+        "ROW_INDEX": index.to_location_index(),
+        "COLUMN_INDEX": index.columns
+    })
+
+def cell_updates(user_query, parsed):
+    """Pair the parallel lists returned by process_update_query into CellUpdates."""
+    row_indices, columns_indices, updations, quantities, feedbacks = parsed
+    return [
+        CellUpdate(row_idx, col_idx, update, qty, feedbacks[i] if i < len(feedbacks) else '', user_query)
+        for i, (row_idx, col_idx, update, qty) in enumerate(zip(row_indices, columns_indices, updations, quantities))
+    ]
+
+def commit_cell_updates(service, token, spreadsheet_id, sheet_name, metadata, sheet_index, updates,
+                        site_engineer_name, emit):
+    """
+    Write cell updates through the spreadsheet's write queue, then append them to LOG.
+    
+    Updates to the same cell are merged: quantities add up into the QNT total
+    and the last status wins. Returns the number of distinct cells written.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    
+    # Get both sheet IDs (main sheet and QNT sheet) from the cached metadata
+    main_sheet = metadata.sheets.get(sheet_name)
+    qnt_sheet = metadata.sheets.get('QNT')
+    main_sheet_id = main_sheet.sheet_id if main_sheet is not None else None
+    qnt_sheet_id = qnt_sheet.sheet_id if qnt_sheet is not None else None
+    
+    if main_sheet_id is None:
+        raise UpdateError(f"Sheet '{sheet_name}' not found in the spreadsheet")
+        
+    if qnt_sheet_id is None:
+        # Create the QNT sheet if it doesn't exist
         try:
-            spreadsheet_info = service.spreadsheets().get(
-                spreadsheetId=request.spreadsheet_id
+            add_sheet_request = {
+                'addSheet': {
+                    'properties': {
+                        'title': 'QNT',
+                        'gridProperties': {
+                            'rowCount': 1000,
+                            'columnCount': 26
+                        }
+                    }
+                }
+            }
+            
+            # Execute the batch update to add the sheet
+            result = service.spreadsheets().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'requests': [add_sheet_request]}
             ).execute()
             
-            available_sheets = [sheet['properties']['title'] for sheet in spreadsheet_info.get('sheets', [])]
-            print(f"DEBUG: Available sheets: {available_sheets}")
-            print(f"DEBUG: Requested sheet: '{request.sheet_name}'")
+            # Get the new sheet's ID from the response
+            qnt_sheet_properties = result['replies'][0]['addSheet']['properties']
+            qnt_sheet_id = qnt_sheet_properties['sheetId']
+            metadata_cache.record_sheet(spreadsheet_id, qnt_sheet_properties)
             
-            if request.sheet_name not in available_sheets:
-                return {"status": "error", "message": f"Sheet '{request.sheet_name}' not found. Available sheets: {available_sheets}"}
+            print(f"Created new QNT sheet with ID: {qnt_sheet_id}")
                 
         except Exception as e:
-            print(f"DEBUG: Error checking spreadsheet info: {str(e)}")
-            return {"status": "error", "message": f"Error accessing spreadsheet: {str(e)}"}
-        
-        # First get the sheet data
-        range_to_use = get_sheet_range(request.sheet_name)
-        print(f"DEBUG: Using range: '{range_to_use}' for sheet: '{request.sheet_name}'")
-        
-        sheet = service.spreadsheets().values().get(
-            spreadsheetId=request.spreadsheet_id,
-            range=range_to_use
-        ).execute()
-
-        # Manually process sheet_info as it's done in get_sheet_info
-        values = sheet.get("values", [])
-        if not values or len(values) < 2:
-            return {"status": "error", "message": "No data found in the sheet"}
-
-        header_row = values[1]
-        breakpoint_index = 0
-        for i, col in enumerate(header_row):
-            if col.strip() == "":
-                breakpoint_index = i
-                break
-        else:
-            breakpoint_index = len(header_row)
-        headers_before_break = header_row[:breakpoint_index]
-
-        # Get the indices of Location and Peta Location columns
-        location_idx = None
-        peta_location_idx = None
-        for idx, header in enumerate(headers_before_break):
-            if header.strip().lower() == 'location':
-                location_idx = idx
-            elif header.strip().lower() == 'peta location':
-                peta_location_idx = idx
-        
-        if location_idx is None or peta_location_idx is None:
-            return {"status": "error", "message": "Required columns 'Location' and 'Peta Location' not found in sheet"}
-
-        row_index_data = {}
-        empty_row_count = 0
-        max_consecutive_empty = 4
-        
-        for idx, row in enumerate(values[2:], start=3):
-            # Check if row has enough columns for our indices
-            if len(row) <= max(location_idx, peta_location_idx):
-                empty_row_count += 1
-                if empty_row_count >= max_consecutive_empty:
-                    break
-                continue
-                
-            # Get location and peta location values
-            location = row[location_idx].strip() if location_idx < len(row) else ""
-            peta_location = row[peta_location_idx].strip() if peta_location_idx < len(row) else ""
+            raise UpdateError(f"Failed to create QNT sheet: {str(e)}")
+    
+    emit("rows_matched", {"cells": [
+        {"cell": f"{u.col_idx.upper()}{u.row_idx}", "location": " ".join(sheet_index.location_of(u.row_idx)),
+         "work_type": sheet_index.column_header(u.col_idx) or ""}
+        for u in updates
+    ]})
+    if not updates:
+        return 0
+    
+    # Final status per cell (0-based grid indices) and the QNT increments in order
+    main_cells = {}
+    increments = []
+    for u in updates:
+        # Convert column letter to column number (0-based)
+        col_num = column_letter_to_number(u.col_idx)
+        row_num = int(u.row_idx)  # 1-based sheet row
+        main_cells[(row_num - 1, col_num)] = main_cell(u.update, today)
+        # QNT rows are offset by one
+        increments.append((f"{u.col_idx.upper()}{row_num + 1}", (row_num, col_num), parse_quantity(u.quantity)))
+    
+    # The queue adds the increments to the current QNT totals and merges this
+    # write with concurrent ones of the same user into one batchUpdate
+    try:
+        item_totals = write_queue.submit(
+            spreadsheet_id, CellWrite(service, token_key(token), main_sheet_id, qnt_sheet_id, main_cells, increments)
+        )
+    except WriteQueueFull as e:
+        raise UpdateError(str(e))
+    emit("written", {"updated_cells": len(updates)})
+    
+    # Build LOG entries from the sheet index and the totals just written (no reads)
+    log_entries = []
+    log_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for u, total_value in zip(updates, item_totals):
+        try:
+            row_num = int(u.row_idx)
+            row_values = (sheet_index.row_cells(row_num) + [''] * 4)[:4]
+            column_header = sheet_index.column_header(u.col_idx) or ''
             
-            # Skip if both are empty
-            if not location and not peta_location:
-                empty_row_count += 1
-                if empty_row_count >= max_consecutive_empty:
-                    break
-                continue
-            else:
-                empty_row_count = 0
+            # Create log entry
+            log_entry = [
+                log_time,                                      # time
+                site_engineer_name,                            # site_engineer_name
+                str(row_values[0]),                            # Location
+                str(row_values[1]),                            # Sub Location
+                str(row_values[2]),                            # Peta Location
+                str(row_values[3]),                            # Category
+                str(column_header),                            # updation (column header)
+                parse_quantity(u.quantity),                    # quantity
+                total_value,                                   # updated_quantity
+                u.user_query,                                  # user_query
+                str(u.feedback),                               # feedback
+                f"{u.col_idx.upper()}{row_num + 1}"            # updated_cell (add 1 for 1-based indexing)
+            ]
+            log_entries.append(log_entry)
+            
+        except Exception as e:
+            print(f"Warning: Could not prepare log entry for {u.col_idx}{u.row_idx}: {str(e)}")
+    
+    # Write log entries to LOG sheet if any
+    if log_entries:
+        try:
+            # Ensure LOG sheet exists and get its ID
+            log_sheet_id = ensure_log_sheet_exists(service, spreadsheet_id)
+            
+            if log_sheet_id is not None:
+                # Append after the last LOG row (no read of the LOG column needed)
+                appended = log_writer.write(service, spreadsheet_id, log_entries, token_key(token))
+                # Buffered entries are appended later by the log writer
+                emit("logged" if appended else "queued", {"entries": len(log_entries)})
                 
-            # Store as tuple (Location, Peta Location)
-            row_index_data[str(idx)] = (location, peta_location)
-
-        column_index_data = {}
-        col_letters = list(string.ascii_uppercase)
-        col_letters += [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase]
-        found_non_empty = False
-        for i in range(breakpoint_index, len(header_row)):
-            col_name = header_row[i] if i < len(header_row) else ""
-            if col_name.strip() != "":
-                found_non_empty = True
-                column_index_data[col_letters[i]] = col_name
-            elif found_non_empty:
-                break
-
-        sheet_info = {
-            "status": "success",
-            "ROW_INDEX": row_index_data,
-            "COLUMN_INDEX": column_index_data
-        }
-        
-        if sheet_info.get("status") != "success":
-            return {"status": "error", "message": "Failed to fetch sheet data"}
-        
-        print("sheet data", sheet_info) 
-        
-        ACTION_PROMPT = f"""
-        You are given
-        SHEET DATA: 
-        {sheet_info}
-
-        USER QUERY:
-        {request.user_query}
-
-        PROCESSING STEPS:
-
-        1. PARSE QUERY:
-        - Identify Location, Peta Location(s), work type, status, quantity
-        - Handle ranges (e.g., "101 to 105" becomes ["101", "102", "103", "104", "105"])
-
-        2. FIND ROWS:
-        - For each Peta Location, look for exact match in ROW_INDEX
-        - Keep track of found and missing Peta Locations
-
-        3. MATCH COLUMN:
-        - Compare work type against COLUMN_INDEX values using flexible matching
-        - Handle common typos and variations
-        - Pick best match or provide helpful feedback if none found
-
-        4. GENERATE RESULTS:
-        - Create lists for each successful match
-        - Include appropriate feedback for each case
-        - Ensure lists are same length and correspond to each other
+        except Exception as e:
+            metadata_cache.invalidate(spreadsheet_id)
+            print(f"Warning: Could not write to LOG sheet: {str(e)}")
 
-        5. VALIDATION:
-        - Verify output format is correct
-        - Ensure feedback is always provided, even for failures
-        - Double-check that no empty results are returned without explanation
+    return len(main_cells)
 
-        Remember: 
-        - NEVER return completely empty lists without feedback
-        - Handle typos and variations in work types gracefully  
-        - Provide specific, actionable feedback messages
-        - Process partial matches when possible
-        
-        Important:
-        - Do NOT attempt fuzzy matching for Location or Peta Location
-        - Do NOT try to correct spelling or infer missing values
-        - Do NOT output any extra keys or change the order of keys in the response
-        - If there's any ambiguity or missing information, provide clear feedback in the feedbacks list
+def update_sheet_sync(request: UpdateSheetRequest, service, token, emit=None):
+    # emit(event, data) reports progress to streaming clients
+    emit = emit or (lambda event, data=None: None)
+    try:
+        metadata, snapshot = load_update_target(service, token, request.spreadsheet_id, request.sheet_name)
+        sheet_info = update_sheet_info(snapshot)
         
-        Now process the query and return the response in the exact format expected by the SupportResult model.
-        """
+        print("sheet data", sheet_info) 
         
-        # Process the query through LLM
-        row_indices, columns_indices, updations, quantities, feedbacks = process_user_query(ACTION_PROMPT, request.groq_api_key)
+        # Resolve the query locally when possible, otherwise through the LLM
+        parsed = process_update_query(request.user_query, snapshot.index, sheet_info, request.groq_api_key)
+        row_indices, columns_indices, updations, quantities, feedbacks = parsed
         
-        # Debug print the LLM processing results
-        print("\nLLM Processing results:")
+        # Debug print the query processing results
+        print("\nQuery processing results:")
         print(f"Row Indices: {row_indices}")
         print(f"Column Indices: {columns_indices}")
         print(f"Updates: {updations}")
         print(f"Quantities: {quantities}")
         print(f"Feedbacks: {feedbacks}")
+        emit("parsed", {"updates": len(updations), "feedback": feedbacks})
         
-        # Get Google Sheets service
-        today = datetime.now().strftime("%Y-%m-%d")
+        commit_cell_updates(
+            service, token, request.spreadsheet_id, request.sheet_name, metadata, snapshot.index,
+            cell_updates(request.user_query, parsed), request.site_engineer_name, emit
+        )
         
-        # Get both sheet IDs (main sheet and QNT sheet) from the same spreadsheet
-        spreadsheet = service.spreadsheets().get(
-            spreadsheetId=request.spreadsheet_id
-        ).execute()
+        # Combine all feedbacks into a single message
+        combined_feedback = "\n\n".join(feedbacks)
         
-        main_sheet_id = None
-        qnt_sheet_id = None
+        return {
+            "status": "success",
+            "message": "Sheet updated successfully",
+            "feedback": combined_feedback,
+            "updates_applied": len(updations),
+            "updated_cells": len(updations)
+        }
         
-        for sheet in spreadsheet.get('sheets', []):
-            title = sheet['properties']['title']
-            if title == request.sheet_name:
-                main_sheet_id = sheet['properties']['sheetId']
-            elif title == 'QNT':
-                qnt_sheet_id = sheet['properties']['sheetId']
+    except UpdateError as e:
+        return {"status": "error", "message": str(e)}
+    except Exception as e:
+        # Sheet IDs may be stale (e.g. QNT deleted by hand); refetch them next time
+        metadata_cache.invalidate(request.spreadsheet_id)
+        return {
+            "status": "error",
+            "message": f"Failed to update sheet: {str(e)}"
+        }
+
+def bulk_update_sheet_sync(request: BulkUpdateRequest, service, token):
+    """
+    Apply many update lines as one commit.
+    
+    Lines are parsed concurrently (only those the local parser can't resolve
+    reach the LLM); the cell updates of all lines are merged and written with a
+    single batchUpdate and a single LOG append. A line that fails to parse is
+    reported as "error", and one that yields no updates as "skipped"; neither
+    blocks the others nor counts towards the applied lines.
+    """
+    user_queries = [query.strip() for query in request.user_queries if query and query.strip()]
+    if not user_queries:
+        return {"status": "error", "message": "No update lines given"}
+    
+    try:
+        metadata, snapshot = load_update_target(service, token, request.spreadsheet_id, request.sheet_name)
+        sheet_info = update_sheet_info(snapshot)
         
-        if main_sheet_id is None:
-            return {"status": "error", "message": f"Sheet '{request.sheet_name}' not found in the spreadsheet"}
-            
-        if qnt_sheet_id is None:
-            # Create the QNT sheet if it doesn't exist
+        def parse(user_query):
             try:
-                add_sheet_request = {
-                    'addSheet': {
-                        'properties': {
-                            'title': 'QNT',
-                            'gridProperties': {
-                                'rowCount': 1000,
-                                'columnCount': 26
-                            }
-                        }
-                    }
-                }
-                
-                # Execute the batch update to add the sheet
-                result = service.spreadsheets().batchUpdate(
-                    spreadsheetId=request.spreadsheet_id,
-                    body={'requests': [add_sheet_request]}
-                ).execute()
-                
-                # Get the new sheet's ID from the response
-                qnt_sheet_id = result['replies'][0]['addSheet']['properties']['sheetId']
-                
-                print(f"Created new QNT sheet with ID: {qnt_sheet_id}")
-                    
+                return process_update_query(user_query, snapshot.index, sheet_info, request.groq_api_key), None
             except Exception as e:
-                return {"status": "error", "message": f"Failed to create QNT sheet: {str(e)}"}
+                return None, str(e)
         
-        # Prepare batch update request for cell formatting and values
-        requests = []
-        
-        for (row_idx, col_idx, update, qty) in zip(row_indices, columns_indices, updations, quantities):
-            # Convert column letter to column number (0-based)
-            col_num = column_letter_to_number(col_idx)
-            row_num = int(row_idx)  # Convert to 0-based
-            
-            # 1. Update main sheet with date and formatting
-            bg_color = {
-                'red': 1.0, 'green': 0.9, 'blue': 0.0, 'alpha': 1.0  # Yellow for WIP
-            } if update == 'WIP' else {
-                'red': 0.0, 'green': 0.8, 'blue': 0.0, 'alpha': 1.0  # Green for COM
-            }
-            
-            # Add request for main sheet update
-            requests.append({
-                'updateCells': {
-                    'range': {
-                        'sheetId': main_sheet_id,
-                        'startRowIndex': row_num-1,
-                        'endRowIndex': row_num,
-                        'startColumnIndex': col_num,
-                        'endColumnIndex': col_num + 1
-                    },
-                    'rows': [{
-                        'values': [{
-                            'userEnteredValue': {'stringValue': today},
-                            'userEnteredFormat': {
-                                'backgroundColor': bg_color,
-                                'textFormat': {'bold': True},
-                                'horizontalAlignment': 'CENTER',
-                                'verticalAlignment': 'MIDDLE'
-                            }
-                        }]
-                    }],
-                    'fields': 'userEnteredValue,userEnteredFormat(backgroundColor,textFormat,horizontalAlignment,verticalAlignment)'
-                }
-            })
-            
-            # 2. Get existing value from QNT sheet and add new quantity
-            try:
-                # First, get the current value from the QNT sheet
-                cell_range = f"{col_idx}{row_num + 1}"  # +1 because row_num is 0-based
-                result = service.spreadsheets().values().get(
-                    spreadsheetId=request.spreadsheet_id,
-                    range=get_sheet_range("QNT", cell_range),
-                    valueRenderOption='UNFORMATTED_VALUE'
-                ).execute()
-                
-                # Parse the existing value (default to 0 if empty)
-                existing_value = 0.0
-                if 'values' in result and result['values']:
-                    try:
-                        existing_value = float(str(result['values'][0][0]))
-                    except (ValueError, IndexError, KeyError):
-                        existing_value = 0.0
-                
-                # Parse the new quantity
-                try:
-                    new_qty = float(str(qty).strip()) if str(qty).strip().replace('.', '').isdigit() else 0.0
-                except (ValueError, AttributeError):
-                    new_qty = 0.0
-                
-                # Calculate the total
-                total_value = existing_value + new_qty
-                
-            except Exception as e:
-                return {"status": "error", "message": f"Failed to read from QNT sheet: {str(e)}"}
-            
-            # Add request to update QNT sheet with the total
-            requests.append({
-                'updateCells': {
-                    'range': {
-                        'sheetId': qnt_sheet_id,
-                        'startRowIndex': row_num,
-                        'endRowIndex': row_num + 1,
-                        'startColumnIndex': col_num,
-                        'endColumnIndex': col_num + 1
-                    },
-                    'rows': [{
-                        'values': [{
-                            'userEnteredValue': {'numberValue': total_value},
-                            'userEnteredFormat': {
-                                'numberFormat': {
-                                    'type': 'NUMBER',
-                                    'pattern': '0.00'
-                                },
-                                'horizontalAlignment': 'CENTER',
-                                'verticalAlignment': 'MIDDLE'
-                            }
-                        }]
-                    }],
-                    'fields': 'userEnteredValue,userEnteredFormat(numberFormat,horizontalAlignment,verticalAlignment)'
-                }
+        updates = []
+        results = []
+        for user_query, (parsed, error) in zip(user_queries, map_concurrently(parse, user_queries)):
+            if parsed is None:
+                results.append({"user_query": user_query, "status": "error", "message": f"Failed to parse update: {error}"})
+                continue
+            line_updates = cell_updates(user_query, parsed)
+            updates.extend(line_updates)
+            results.append({
+                "user_query": user_query,
+                # No updates means the line was rejected (unknown work type,
+                # no matching rows, LLM unavailable); its feedback says why
+                "status": "success" if line_updates else "skipped",
+                "feedback": "\n\n".join(parsed[4]),
+                "updates_applied": len(line_updates)
             })
         
-        # Execute the batch update if there are requests
-        if requests:
-            body = {'requests': requests}
-            service.spreadsheets().batchUpdate(
-                spreadsheetId=request.spreadsheet_id,
-                body=body
-            ).execute()
-            
-            # Log the updates to LOG sheet
-            log_entries = []
-            for i, (row_idx, col_idx, update, qty, feedback) in enumerate(zip(row_indices, columns_indices, updations, quantities, feedbacks)):
-                try:
-                    # Get the row data (A,B,C,D columns)
-                    row_num = int(row_idx)
-                    range_notation = get_sheet_range(request.sheet_name, f"A{row_num}:D{row_num}")
-                    result = service.spreadsheets().values().get(
-                        spreadsheetId=request.spreadsheet_id,
-                        range=range_notation,
-                        valueRenderOption='UNFORMATTED_VALUE'
-                    ).execute()
-                    
-                    # Get the column header (row 2 of the updated column)
-                    header_range = get_sheet_range(request.sheet_name, f"{col_idx}2")
-                    header_result = service.spreadsheets().values().get(
-                        spreadsheetId=request.spreadsheet_id,
-                        range=header_range,
-                        valueRenderOption='UNFORMATTED_VALUE'
-                    ).execute()
-                    
-                    # Get the column header value
-                    column_header = header_result.get('values', [['']])[0][0] if 'values' in header_result else ''
-                    
-                    # Get the row values
-                    row_values = result.get('values', [['', '', '', '']])[0]
-                    
-                    # Get the updated quantity from the QNT sheet (add 1 to row_num for 1-based indexing)
-                    qnt_range = get_sheet_range("QNT", f"{col_idx.upper()}{row_num + 1}")
-                    qnt_result = service.spreadsheets().values().get(
-                        spreadsheetId=request.spreadsheet_id,
-                        range=qnt_range,
-                        valueRenderOption='UNFORMATTED_VALUE'
-                    ).execute()
-                    
-                    updated_qty = 0.0
-                    if 'values' in qnt_result and qnt_result['values']:
-                        try:
-                            updated_qty = float(str(qnt_result['values'][0][0]))
-                        except (ValueError, IndexError, KeyError):
-                            updated_qty = 0.0
-                    
-                    # Create log entry
-                    log_entry = [
-                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'),  # time
-request.site_engineer_name,                    # site_engineer_name
-                        str(row_values[0]) if len(row_values) > 0 else '',  # Location
-                        str(row_values[1]) if len(row_values) > 1 else '',  # Sub Location
-                        str(row_values[2]) if len(row_values) > 2 else '',  # Peta Location
-                        str(row_values[3]) if len(row_values) > 3 else '',  # Category
-                        str(column_header),                            # updation (column header)
-                        float(qty) if str(qty).replace('.', '').isdigit() else 0.0,  # quantity
-                        updated_qty,                                   # updated_quantity
-                        request.user_query,                            # user_query
-                        str(feedback),                                 # feedback
-                        f"{col_idx.upper()}{row_num + 1}"                  # updated_cell (add 1 for 1-based indexing)
-                    ]
-                    log_entries.append(log_entry)
-                    
-                except Exception as e:
-                    print(f"Warning: Could not prepare log entry for {col_idx}{row_idx}: {str(e)}")
-            
-            # Write log entries to LOG sheet if any
-            if log_entries:
-                try:
-                    # Ensure LOG sheet exists and get its ID
-                    log_sheet_id = ensure_log_sheet_exists(service, request.spreadsheet_id)
-                    
-                    if log_sheet_id is not None:
-                        # Get the next empty row in LOG sheet
-                        result = service.spreadsheets().values().get(
-                            spreadsheetId=request.spreadsheet_id,
-                            range="'LOG'!A:A",
-                            valueRenderOption='UNFORMATTED_VALUE'
-                        ).execute()
-                        
-                        next_row = len(result.get('values', [])) + 1
-                        
-                        # Append log entries
-                        service.spreadsheets().values().update(
-                            spreadsheetId=request.spreadsheet_id,
-                            range=f"'LOG'!A{next_row}",
-                            valueInputOption='USER_ENTERED',
-                            body={'values': log_entries}
-                        ).execute()
-                        
-                except Exception as e:
-                    print(f"Warning: Could not write to LOG sheet: {str(e)}")
-        
-        # Combine all feedbacks into a single message
-        combined_feedback = "\n\n".join(feedbacks)
+        updated_cells = 0
+        if updates:
+            updated_cells = commit_cell_updates(
+                service, token, request.spreadsheet_id, request.sheet_name, metadata, snapshot.index,
+                updates, request.site_engineer_name, lambda event, data=None: None
+            )
         
+        succeeded = sum(1 for result in results if result["status"] == "success")
         return {
-            "status": "success",
-            "message": "Sheet updated successfully",
-            "feedback": combined_feedback,
-            "updates_applied": len(updations),
-            "updated_cells": len(updations)
+            "status": "success" if succeeded else "error",
+            "message": f"Applied {len(updates)} updates from {succeeded} of {len(results)} lines",
+            "results": results,
+            "updates_applied": len(updates),
+            "updated_cells": updated_cells
         }
         
+    except UpdateError as e:
+        return {"status": "error", "message": str(e)}
     except Exception as e:
+        metadata_cache.invalidate(request.spreadsheet_id)
         return {
             "status": "error",
             "message": f"Failed to update sheet: {str(e)}"
         }
 
+@app.post("/api/update-sheet")
+async def update_sheet(request: UpdateSheetRequest, service=Depends(get_sheets_service), token: str = Depends(oauth2_scheme)):
+    # Sheets and Groq calls are blocking; run them off the event loop
+    return await run_blocking(update_sheet_sync, request, service, token)
+
+@app.post("/api/update-sheet/stream")
+async def update_sheet_stream(request: UpdateSheetRequest, service=Depends(get_sheets_service), token: str = Depends(oauth2_scheme)):
+    """
+    Server-sent-event variant of /api/update-sheet.
+    
+    Emits "parsed", "rows_matched", "written" and "logged" (or "queued" when
+    LOG writes are buffered) as each phase completes, then "result" with the same body /api/update-sheet returns.
+    """
+    return StreamingResponse(
+        stream_blocking(update_sheet_sync, request, service, token),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@app.post("/api/update-sheet/bulk")
+async def bulk_update_sheet(request: BulkUpdateRequest, service=Depends(get_sheets_service), token: str = Depends(oauth2_scheme)):
+    return await run_blocking(bulk_update_sheet_sync, request, service, token)
+
 # -----------------------------
 # -----------------------------
 # New endpoint: query_logs
 # -----------------------------
-@app.post("/api/query-logs")
-async def query_logs(request: LogsQueryRequest, service=Depends(get_sheets_service), site_engineer_name: str = Depends(oauth2_scheme)):
+def query_logs_sync(request: LogsQueryRequest, service, site_engineer_name, emit=None):
     """
     Query the logs in the spreadsheet.
     
@@ -804,11 +801,14 @@ async def query_logs(request: LogsQueryRequest, service=Depends(get_sheets_servi
         request: Contains:
             - spreadsheet_id: ID of the spreadsheet
             - query: The user's query about the logs
-            - max_logs: Maximum number of logs to retrieve (default: 500)
+            - max_logs: Number of most recent logs to retrieve (default: 500)
+            - date_from / date_to: Optional YYYY-MM-DD window the logs must fall in
             
     Returns:
         A response containing the answer to the user's query
     """
+    streaming = emit is not None
+    emit = emit or (lambda event, data=None: None)
     try:
             
         # Ensure LOG sheet exists
@@ -816,43 +816,57 @@ async def query_logs(request: LogsQueryRequest, service=Depends(get_sheets_servi
         if log_sheet_id is None:
             return {"status": "error", "message": "Could not access or create LOG sheet"}
         
-        # Get the log data
-        result = service.spreadsheets().values().get(
-            spreadsheetId=request.spreadsheet_id,
-            range="'LOG'!A2:L" + str(request.max_logs + 1),  # +1 because of 1-based indexing
-            valueRenderOption='FORMATTED_VALUE'  # Changed to get formatted dates instead of serial numbers
-        ).execute()
+        try:
+            since, until = parse_date_window(request.date_from, request.date_to)
+        except ValueError:
+            return {"status": "error", "message": "date_from and date_to must be dates in YYYY-MM-DD format"}
+        
+        # Get the most recent log data, from the local mirror when enabled (only new rows are downloaded)
+        if log_mirror is not None:
+            log_mirror.sync(service, request.spreadsheet_id)
+            logs = log_mirror.recent_logs(request.spreadsheet_id, request.max_logs, since, until)
+        else:
+            logs = read_recent_logs(service, request.spreadsheet_id, request.max_logs, since, until)
+        emit("logs_loaded", {"count": len(logs)})
         
         # If no logs found, return empty response
-        if 'values' not in result or not result['values']:
+        if not logs:
             return {
                 "status": "success",
                 "result": "No log entries found in the spreadsheet.",
                 "logs_analyzed": 0
             }
         
-        # Convert the log data to a list of dictionaries
-        headers = [
-            'time', 'site_engineer_name', 'Location', 'Sub Location',
-            'Peta Location', 'Category', 'updation', 'requested_quantity',
-            'updated_quantity', 'user_query', 'feedback', 'updated_cell'
-        ]
-        
-        logs = []
-        for row in result['values']:
-            if len(row) < len(headers):
-                # Pad the row with empty strings if it's shorter than the headers
-                row = row + [''] * (len(headers) - len(row))
-            log_entry = dict(zip(headers, row[:len(headers)]))
-            logs.append(log_entry)
-        
-        # Process the query using the log agent
-        result = process_logs_query(logs, request.query, site_engineer_name, request.groq_api_key)
+        # Sums, counts and latest-by questions are answered exactly from the rows;
+        # anything else goes to the log agent
+        table = LogTable.from_logs(logs)
+        logs_analyzed = len(logs)
+        if len(logs) >= request.max_logs and plan_logs_query(request.query, table) is not None:
+            # max_logs may have cut the history short; aggregates cover all of it
+            if log_mirror is not None:
+                history = log_mirror.recent_logs(request.spreadsheet_id, AGGREGATE_MAX_ROWS, since, until)
+            else:
+                history = read_recent_logs(service, request.spreadsheet_id, AGGREGATE_MAX_ROWS, since, until)
+            history_table = LogTable.from_logs(history)
+            result = answer_logs_query(history_table, request.query, partial=len(history) >= AGGREGATE_MAX_ROWS)
+            if result is not None:
+                logs_analyzed = len(history)
+        else:
+            result = answer_logs_query(table, request.query)
+        if result is None and streaming:
+            # Forward the answer to the client as the model produces it
+            parts = []
+            for text in stream_logs_query(logs, request.query, request.groq_api_key, table=table):
+                parts.append(text)
+                emit("token", {"text": text})
+            result = "".join(parts)
+        elif result is None:
+            result = process_logs_query(logs, request.query, site_engineer_name, request.groq_api_key, table=table)
         
         return {
             "status": "success",
             "result": result,
-            "logs_analyzed": len(logs)
+            "logs_analyzed": logs_analyzed
         }
         
     except Exception as e:
@@ -863,6 +877,24 @@ async def query_logs(request: LogsQueryRequest, service=Depends(get_sheets_servi
             "message": f"An error occurred while processing your query: {str(e)}"
         }
 
+@app.post("/api/query-logs")
+async def query_logs(request: LogsQueryRequest, service=Depends(get_sheets_service), site_engineer_name: str = Depends(oauth2_scheme)):
+    return await run_blocking(query_logs_sync, request, service, site_engineer_name)
+
+@app.post("/api/query-logs/stream")
+async def query_logs_stream(request: LogsQueryRequest, service=Depends(get_sheets_service), site_engineer_name: str = Depends(oauth2_scheme)):
+    """
+    Server-sent-event variant of /api/query-logs.
+    
+    Emits "logs_loaded", then "token" events with the answer text as the model
+    produces it, then "result" with the same body /api/query-logs returns.
+    """
+    return StreamingResponse(
+        stream_blocking(query_logs_sync, request, service, site_engineer_name),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 # -----------------------------
 # Health check endpoint
 # -----------------------------
@@ -870,11 +902,14 @@ async def query_logs(request: LogsQueryRequest, service=Depends(get_sheets_servi
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/api/metrics")
+async def metrics():
+    return {"prompt_pruning": pruning_metrics.snapshot()}
+
 # -----------------------------
 # Upload DPR Template Sheet endpoint
 # -----------------------------
-@app.post("/api/upload-template-sheet")
-async def upload_template_sheet(token: str = Depends(oauth2_scheme)):
+def upload_template_sheet_sync(token):
     """
     Upload the DPR.xlsx template to user's Google Drive and convert to Google Sheets.
     Only uploads if user doesn't already have a sheet named "DPR".
@@ -903,7 +938,7 @@ async def upload_template_sheet(token: str = Depends(oauth2_scheme)):
                 )
         
         # Build Drive service
-        drive_service = build('drive', 'v3', credentials=creds)
+        drive_service = get_service('drive', 'v3', creds)
         
         # Check if user already has a sheet named "DPR"
         query = "mimeType='application/vnd.google-apps.spreadsheet' and name='DPR' and trashed=false"
@@ -969,6 +1004,10 @@ async def upload_template_sheet(token: str = Depends(oauth2_scheme)):
             detail=f"Failed to upload template sheet: {str(e)}"
         )
 
+@app.post("/api/upload-template-sheet")
+async def upload_template_sheet(token: str = Depends(oauth2_scheme)):
+    return await run_blocking(upload_template_sheet_sync, token)
+
 # -----------------------------
 # Main entry
 # -----------------------------
@@ -0,0 +1,75 @@
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+USER_QUERY_RE = re.compile(r"USER QUERY:\s*(.*?)\s*PROCESSING STEPS:", re.DOTALL)
+LOGS_QUESTION_RE = re.compile(r"User's question:\s*(.*?)\s*INSTRUCTIONS:", re.DOTALL)
+
+
+class FakeAgent:
+    """
+    Deterministic stand-in for a pooled agno Agent.
+
+    run(prompt) sleeps `latency` seconds and returns answer(prompt) as the
+    response content. Calls and prompt characters are counted on `stats`.
+    """
+
+    def __init__(self, answer, stats, latency: float = 0.0):
+        self.answer = answer
+        self.stats = stats
+        self.latency = latency
+        self.model = None
+        self.memory = None
+
+    def run(self, prompt, stream=False, **kwargs):
+        self.stats.record(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(content=self.answer(prompt))
+
+    def reset_run_state(self):
+        pass
+
+    def reset_session(self):
+        pass
+
+
+class AgentStats:
+    def __init__(self):
+        self.calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+
+    def record(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.prompt_chars = 0
+
+
+def install_fake_agents(prompt_builder, resolve_update, latency: float = 0.0) -> AgentStats:
+    """
+    Replace the Groq-backed agent factories of prompt_builder.
+
+    resolve_update(user_query) returns the SupportResult the support agent
+    answers with; the log agent answers with a fixed summary of the question.
+    """
+    stats = AgentStats()
+
+    def support_answer(prompt):
+        match = USER_QUERY_RE.search(prompt)
+        return resolve_update(match.group(1) if match else prompt)
+
+    def logs_answer(prompt):
+        match = LOGS_QUESTION_RE.search(prompt)
+        question = match.group(1) if match else ""
+        return SimpleNamespace(result=f"Summary of the log entries about: {question}")
+
+    prompt_builder.get_support_agent = lambda api_key: FakeAgent(support_answer, stats, latency)
+    prompt_builder.get_log_agent = lambda api_key: FakeAgent(logs_answer, stats, latency)
+    return stats
@@ -0,0 +1,283 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+# Part of the header row of sheet/DPR.xlsx, used when openpyxl isn't installed
+DEFAULT_HEADERS = [
+    'Location', 'Sub Location', 'Peta Location', 'Category', '',
+    'BRICKWORK', 'GYPSUM WORK', 'INTERNAL ELECTRICAL\nWALL CLADDING', 'INTERNAL ELECTRICAL\nINTERNAL WIRING',
+    'WATERPROOFING\nTOILET AREA', 'PLUMBING\nTOILET AREA\nGI PIPE', 'FLOORING\nKITCHEN AREA',
+    'GRANITE\nKITCHEN OTTA', 'ALUMINUM\nFRAME FIXING', 'PAINT\n1ST COAT PAINT', 'CP FITTINGS\nCP FIXING',
+]
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sheet", "DPR.xlsx")
+
+CELL_RE = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def column_number(letters: str) -> int:
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - 64
+    return number - 1
+
+
+def column_letters(number: int) -> str:
+    letters = ""
+    number += 1
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def parse_range(a1: str) -> tuple:
+    """(sheet, first_row, end_row, first_column, end_column), 0-based, ends exclusive or None."""
+    name, _, cells = a1.rpartition("!") if "!" in a1 else (a1, "", "")
+    name = name.strip("'").replace("''", "'")
+    if not cells:
+        return name, 0, None, 0, None
+    bounds = []
+    for part in cells.split(":"):
+        letters, digits = CELL_RE.match(part.replace("$", "")).groups()
+        bounds.append((column_number(letters) if letters else None, int(digits) - 1 if digits else None))
+    (first_column, first_row), (last_column, last_row) = bounds[0], bounds[-1]
+    return (
+        name,
+        first_row or 0,
+        None if last_row is None else last_row + 1,
+        first_column or 0,
+        None if last_column is None else last_column + 1,
+    )
+
+
+def load_template_headers(path: str = TEMPLATE_PATH) -> list:
+    """Header row (sheet row 2) of the DPR template; needs openpyxl, else DEFAULT_HEADERS."""
+    try:
+        import openpyxl
+    except ImportError:
+        return list(DEFAULT_HEADERS)
+    worksheet = openpyxl.load_workbook(path, read_only=True).worksheets[0]
+    for row_number, row in enumerate(worksheet.iter_rows(values_only=True), start=1):
+        if row_number == 2:
+            headers = ["" if value is None else str(value) for value in row]
+            while headers and headers[-1] == "":
+                headers.pop()
+            return headers
+    return list(DEFAULT_HEADERS)
+
+
+def build_dpr_grid(rows: int, headers: list, flats_per_location: int = 100) -> list:
+    """
+    A DPR sheet with `rows` sheet rows in the template's layout: title row,
+    header row, then one data row per flat followed by the empty row QNT uses.
+    Locations are "Tower 1", "Tower 2", ... with Peta Locations 101, 102, ...
+    """
+    grid = [[], list(headers)]
+    flat = 0
+    while len(grid) + 2 <= rows:
+        location = f"Tower {flat // flats_per_location + 1}"
+        peta_location = str(101 + flat % flats_per_location)
+        grid.append([location, "1ST", peta_location, "2 BHK" if flat % 3 else "1 BHK"])
+        grid.append([])
+        flat += 1
+    return grid
+
+
+def build_log_rows(count: int, grid: list, work_types: list, engineers=("Ravi", "Anita", "Suresh")) -> list:
+    """`count` LOG rows (header included) spread over the flats and work types of grid."""
+    flats = [(row_number, row) for row_number, row in enumerate(grid, start=1) if row_number > 2 and row]
+    rows = [[
+        'time', 'site_engineer_name', 'Location', 'Sub Location', 'Peta Location', 'Category',
+        'updation', 'requested_quantity', 'updated_quantity', 'user_query', 'feedback', 'updated_cell'
+    ]]
+    for i in range(max(0, count - 1)):
+        row_number, flat = flats[i % len(flats)]
+        column, work_type = work_types[i % len(work_types)]
+        day = 1 + (i * 28) // max(1, count)
+        rows.append([
+            f"2026-09-{day:02d} {8 + i % 10:02d}:{i % 60:02d}:00", engineers[i % len(engineers)],
+            flat[0], flat[1], flat[2], flat[3], work_type, "5", str(5 * (1 + i // len(flats))),
+            f"{flat[0]} {flat[2]} {work_type.lower()} done by 5", "", f"{column}{row_number + 1}"
+        ])
+    return rows
+
+
+class _Call:
+    def __init__(self, service, method, request, handler):
+        self.service, self.method, self.request, self.handler = service, method, request, handler
+
+    def execute(self, *args, **kwargs):
+        return self.service._execute(self.method, self.request, self.handler)
+
+
+class FakeSheetsService:
+    """
+    In-memory stand-in for the Sheets (and the Drive files().get) service.
+
+    Implements the calls the backend makes, and counts calls per method and
+    the JSON bytes of request bodies and responses.
+    """
+
+    def __init__(self, sheets: dict):
+        self.grids = {title: [list(row) for row in grid] for title, grid in sheets.items()}
+        self.sheet_ids = {title: i for i, title in enumerate(self.grids)}
+        self.revision = 1
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._lock = threading.RLock()
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes_sent = 0
+            self.bytes_received = 0
+
+    def _execute(self, method, request, handler):
+        with self._lock:
+            self.calls[method] += 1
+            self.bytes_sent += len(json.dumps(request, default=str))
+            response = handler()
+            self.bytes_received += len(json.dumps(response, default=str))
+            return response
+
+    # Resource chain: service.spreadsheets().values().get(...)
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return _Values(self)
+
+    def files(self):
+        return _Files(self)
+
+    def get(self, spreadsheetId=None, **kwargs):
+        def handler():
+            return {'sheets': [
+                {'properties': {
+                    'title': title, 'sheetId': self.sheet_ids[title],
+                    'gridProperties': {'rowCount': max(1000, len(grid)), 'columnCount': 26}
+                }}
+                for title, grid in self.grids.items()
+            ]}
+        return _Call(self, 'spreadsheets.get', kwargs, handler)
+
+    def batchUpdate(self, spreadsheetId=None, body=None):
+        def handler():
+            replies = [self._apply(request) for request in body['requests']]
+            self.revision += 1
+            return {'replies': replies}
+        return _Call(self, 'spreadsheets.batchUpdate', body, handler)
+
+    def _title(self, sheet_id):
+        return next(title for title, i in self.sheet_ids.items() if i == sheet_id)
+
+    def _apply(self, request):
+        if 'addSheet' in request:
+            title = request['addSheet']['properties']['title']
+            self.grids[title] = []
+            self.sheet_ids[title] = max(self.sheet_ids.values()) + 1
+            return {'addSheet': {'properties': {'sheetId': self.sheet_ids[title], 'title': title}}}
+        if 'updateCells' in request:
+            update = request['updateCells']
+            if 'range' in update:
+                sheet_id, first_row, first_column = (update['range'][key] for key in
+                                                     ('sheetId', 'startRowIndex', 'startColumnIndex'))
+            else:
+                sheet_id, first_row, first_column = (update['start'][key] for key in
+                                                     ('sheetId', 'rowIndex', 'columnIndex'))
+            if 'userEnteredValue' in update['fields']:
+                for row_offset, row in enumerate(update['rows']):
+                    for column_offset, cell in enumerate(row.get('values', [])):
+                        if 'userEnteredValue' in cell:
+                            self._set(self._title(sheet_id), first_row + row_offset,
+                                      first_column + column_offset, cell['userEnteredValue'])
+        elif 'repeatCell' in request:
+            repeat = request['repeatCell']
+            grid_range = repeat['range']
+            if 'userEnteredValue' in repeat['cell']:
+                for row in range(grid_range['startRowIndex'], grid_range['endRowIndex']):
+                    for column in range(grid_range['startColumnIndex'], grid_range['endColumnIndex']):
+                        self._set(self._title(grid_range['sheetId']), row, column, repeat['cell']['userEnteredValue'])
+        return {}
+
+    def _set(self, title, row, column, value):
+        if isinstance(value, dict):
+            value = next(iter(value.values()))
+        grid = self.grids[title]
+        while len(grid) <= row:
+            grid.append([])
+        cells = grid[row]
+        while len(cells) <= column:
+            cells.append('')
+        cells[column] = value
+
+    def _read(self, a1, render='FORMATTED_VALUE'):
+        name, first_row, end_row, first_column, end_column = parse_range(a1)
+        grid = self.grids[name]
+        end_row = len(grid) if end_row is None else min(end_row, len(grid))
+        values = []
+        for row in grid[first_row:end_row]:
+            cells = row[first_column:end_column]
+            if render != 'UNFORMATTED_VALUE':
+                cells = [value if isinstance(value, str) else str(value) for value in cells]
+            while cells and cells[-1] in ('', None):
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        response = {'range': a1}
+        if values:
+            response['values'] = values
+        return response
+
+
+class _Values:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, spreadsheetId=None, range=None, valueRenderOption='FORMATTED_VALUE', **kwargs):
+        return _Call(self.service, 'values.get', {'range': range},
+                     lambda: self.service._read(range, valueRenderOption))
+
+    def batchGet(self, spreadsheetId=None, ranges=None, valueRenderOption='FORMATTED_VALUE', **kwargs):
+        return _Call(self.service, 'values.batchGet', {'ranges': ranges},
+                     lambda: {'valueRanges': [self.service._read(a1, valueRenderOption) for a1 in ranges]})
+
+    def update(self, spreadsheetId=None, range=None, valueInputOption=None, body=None):
+        def handler():
+            name, first_row, _, first_column, _ = parse_range(range)
+            for row_offset, row in enumerate(body['values']):
+                for column_offset, value in enumerate(row):
+                    self.service._set(name, first_row + row_offset, first_column + column_offset, value)
+            self.service.revision += 1
+            return {'updatedCells': sum(len(row) for row in body['values'])}
+        return _Call(self.service, 'values.update', body, handler)
+
+    def append(self, spreadsheetId=None, range=None, valueInputOption=None, body=None, **kwargs):
+        def handler():
+            name = parse_range(range)[0]
+            grid = self.service.grids[name]
+            start = len(grid)
+            while start > 0 and not any(value not in ('', None) for value in grid[start - 1]):
+                start -= 1
+            for row_offset, row in enumerate(body['values']):
+                for column, value in enumerate(row):
+                    self.service._set(name, start + row_offset, column, value)
+            self.service.revision += 1
+            end = start + len(body['values'])
+            last_column = column_letters(len(body['values'][0]) - 1)
+            return {'updates': {'updatedRange': f"'{name}'!A{start + 1}:{last_column}{end}",
+                                'updatedRows': len(body['values'])}}
+        return _Call(self.service, 'values.append', body, handler)
+
+
+class _Files:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, fileId=None, fields=None):
+        return _Call(self.service, 'drive.files.get', {'fileId': fileId},
+                     lambda: {'modifiedTime': str(self.service.revision)})
@@ -0,0 +1,285 @@
+"""
+Offline benchmarks for the DPR backend.
+
+Runs get_sheet_info, update_sheet (single, bulk and concurrent) and query_logs
+against an in-memory Sheets service seeded from sheet/DPR.xlsx and
+deterministic stand-ins for the Groq agents, and reports wall time, Sheets /
+Drive calls and JSON bytes per request. Nothing leaves the machine.
+
+    cd backend
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 100,20000 --repeat 10 --json results.json
+
+Network latency isn't simulated (use --llm-latency-ms for the model); compare
+calls and bytes per request to see what a change saves on the wire.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .fake_agent import install_fake_agents
+from .fake_sheets import FakeSheetsService, build_dpr_grid, build_log_rows, load_template_headers
+
+SHEET_NAME = "DPR"
+API_KEY = "benchmark-key"
+TOKEN = "benchmark-token"
+# Words after the quantity that the local parser rejects, so the query goes to the (fake) agent
+LLM_SUFFIX = " as per the site visit"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,5000,20000",
+                        help="comma-separated sheet sizes in rows (default: %(default)s)")
+    parser.add_argument("--fanouts", default="1,10,50",
+                        help="flats updated by one query (default: %(default)s)")
+    parser.add_argument("--log-rows", default="1000,10000",
+                        help="LOG sheet sizes for query_logs (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="requests measured per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous requests in the concurrent scenario")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency of each agent call")
+    parser.add_argument("--write-tick-ms", type=float, default=None,
+                        help="override SHEET_WRITE_TICK_MS (how long queued writes wait to be merged)")
+    parser.add_argument("--no-mirror", action="store_true", help="read LOG from the sheet instead of the local mirror")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the backend's console logging and prints")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """Settings the backend reads at import time."""
+    os.environ["LOG_MIRROR_DIR"] = "" if args.no_mirror else tempfile.mkdtemp(prefix="dpr_benchmark_mirror_")
+    os.environ.setdefault("LLM_RESULT_CACHE_PATH", "")
+    if args.write_tick_ms is not None:
+        os.environ["SHEET_WRITE_TICK_MS"] = str(args.write_tick_ms)
+
+
+def quiet_console_logging():
+    for logger in list(logging.Logger.manager.loggerDict.values()):
+        for handler in getattr(logger, "handlers", []):
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.WARNING)
+
+
+class Bench:
+    """The imported backend plus the fakes the scenarios run against."""
+
+    def __init__(self, args):
+        import app
+        from src import prompt_builder
+        from src.query_parser import parse_update_query
+        from src.sheet_index import build_sheet_index
+
+        self.args = args
+        self.app = app
+        self.build_sheet_index = build_sheet_index
+        self.parse_update_query = parse_update_query
+        self.headers = load_template_headers()
+        self.service = None
+        self.sheet_index = None
+        self.results = []
+        self.agent_stats = install_fake_agents(
+            prompt_builder, self.resolve_update, latency=args.llm_latency_ms / 1000
+        )
+        # Drive modifiedTime comes from the fake too, so revision checks are counted
+        app.get_sheet_revision = lambda token, spreadsheet_id: \
+            self.service.files().get(fileId=spreadsheet_id).execute()["modifiedTime"]
+        if not args.verbose:
+            quiet_console_logging()
+
+    def resolve_update(self, user_query):
+        """What the fake support agent answers: the local parse of the query without LLM_SUFFIX."""
+        return self.parse_update_query(user_query.replace(LLM_SUFFIX, ""), self.sheet_index)
+
+    def seed(self, rows, log_rows=0):
+        grid = build_dpr_grid(rows, self.headers)
+        self.sheet_index = self.build_sheet_index(grid)
+        sheets = {SHEET_NAME: grid, "QNT": []}
+        if log_rows:
+            sheets["LOG"] = build_log_rows(log_rows, grid, list(self.sheet_index.columns.items()))
+        self.service = FakeSheetsService(sheets)
+        return grid
+
+    def flats_in(self, location):
+        return sum(1 for row in self.sheet_index.rows.values() if self.sheet_index.headers
+                   and row.get(self.sheet_index.headers[self.sheet_index.location_col]) == location)
+
+    def call(self, func, *args):
+        if self.args.verbose:
+            return func(*args)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args)
+
+    def measure(self, scenario, size, detail, request, requests_per_sample=1):
+        """Run request(i) `repeat` times and record per-request wall time, calls and bytes."""
+        samples = []
+        for i in range(self.args.repeat):
+            self.service.reset_stats()
+            self.agent_stats.reset()
+            start = time.perf_counter()
+            result = request(i)
+            elapsed = time.perf_counter() - start
+            for response in result if isinstance(result, list) else [result]:
+                if response.get("status") != "success":
+                    raise RuntimeError(f"{scenario} ({detail}) failed: {response.get('message')}")
+            samples.append({
+                "seconds": elapsed,
+                "calls": dict(self.service.calls),
+                "bytes_sent": self.service.bytes_sent,
+                "bytes_received": self.service.bytes_received,
+                "llm_calls": self.agent_stats.calls,
+                "prompt_chars": self.agent_stats.prompt_chars,
+            })
+
+        def per_request(key):
+            return statistics.mean(sample[key] for sample in samples) / requests_per_sample
+
+        calls = {}
+        for sample in samples:
+            for method, count in sample["calls"].items():
+                calls[method] = calls.get(method, 0) + count / (len(samples) * requests_per_sample)
+        times = sorted(sample["seconds"] * 1000 for sample in samples)
+        result = {
+            "scenario": scenario,
+            "size": size,
+            "detail": detail,
+            "p50_ms": statistics.median(times),
+            "max_ms": times[-1],
+            "api_calls": sum(calls.values()),
+            "calls": {method: round(count, 2) for method, count in sorted(calls.items())},
+            "kb_sent": per_request("bytes_sent") / 1024,
+            "kb_received": per_request("bytes_received") / 1024,
+            "llm_calls": per_request("llm_calls"),
+            "prompt_chars": per_request("prompt_chars"),
+        }
+        self.results.append(result)
+        print_result(result)
+        return result
+
+    # Scenarios
+
+    def sheet_info(self, size):
+        app = self.app
+        self.seed(size)
+        request = lambda spreadsheet_id: app.SheetInfoRequest(spreadsheet_id=spreadsheet_id, sheet_name=SHEET_NAME)
+        self.measure("get_sheet_info", size, "cold",
+                     lambda i: self.call(app.get_sheet_info_sync, request(f"info-cold-{size}-{i}"), self.service, TOKEN))
+        warm_id = f"info-warm-{size}"
+        self.call(app.get_sheet_info_sync, request(warm_id), self.service, TOKEN)
+        self.measure("get_sheet_info", size, "warm",
+                     lambda i: self.call(app.get_sheet_info_sync, request(warm_id), self.service, TOKEN))
+
+    def update(self, size, fanout, via_llm):
+        app = self.app
+        self.seed(size)
+        fanout = min(fanout, self.flats_in("Tower 1"))
+        spreadsheet_id = f"update-{size}-{fanout}-{via_llm}"
+        suffix = LLM_SUFFIX if via_llm else ""
+
+        def request(i):
+            query = f"Tower 1 from 101 to {100 + fanout} brickwork done by {i + 1}{suffix}"
+            return app.UpdateSheetRequest(spreadsheet_id=spreadsheet_id, sheet_name=SHEET_NAME, user_query=query,
+                                          site_engineer_name="Ravi", groq_api_key=API_KEY)
+
+        # The first update creates LOG and caches the sheet; measure steady state
+        self.call(app.update_sheet_sync, request(-1), self.service, TOKEN)
+        self.measure("update_sheet", size, f"{'llm' if via_llm else 'local'} fanout={fanout}",
+                     lambda i: self.call(app.update_sheet_sync, request(i), self.service, TOKEN))
+
+    def bulk_update(self, size, lines=20):
+        app = self.app
+        self.seed(size)
+        lines = min(lines, self.flats_in("Tower 1"))
+        spreadsheet_id = f"bulk-{size}"
+
+        def request(i):
+            queries = [f"Tower 1 {101 + n} gypsum work done by {i + 1}" for n in range(lines)]
+            return app.BulkUpdateRequest(spreadsheet_id=spreadsheet_id, sheet_name=SHEET_NAME, user_queries=queries,
+                                         site_engineer_name="Ravi", groq_api_key=API_KEY)
+
+        self.call(app.bulk_update_sheet_sync, request(-1), self.service, TOKEN)
+        self.measure("bulk_update", size, f"lines={lines}",
+                     lambda i: self.call(app.bulk_update_sheet_sync, request(i), self.service, TOKEN))
+
+    def concurrent_updates(self, size):
+        app = self.app
+        self.seed(size)
+        clients = self.args.concurrency
+        spreadsheet_id = f"concurrent-{size}"
+
+        def request(i, client):
+            query = f"Tower 1 {101 + client % max(1, self.flats_in('Tower 1'))} brickwork done by {i + 1}"
+            return app.UpdateSheetRequest(spreadsheet_id=spreadsheet_id, sheet_name=SHEET_NAME, user_query=query,
+                                          site_engineer_name="Ravi", groq_api_key=API_KEY)
+
+        def burst(i):
+            # redirect_stdout is process-wide, so it wraps the whole burst rather than each thread
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                return self.call(lambda: list(executor.map(
+                    lambda client: app.update_sheet_sync(request(i, client), self.service, TOKEN),
+                    range(clients)
+                )))
+
+        self.call(app.update_sheet_sync, request(-1, 0), self.service, TOKEN)
+        self.measure("update_sheet", size, f"concurrent x{clients} burst", burst, requests_per_sample=clients)
+
+    def query_logs(self, log_rows, question, kind):
+        app = self.app
+        self.seed(1000, log_rows=log_rows)
+        spreadsheet_id = f"logs-{log_rows}-{kind}"
+        request = app.LogsQueryRequest(spreadsheet_id=spreadsheet_id, query=question, groq_api_key=API_KEY)
+        # The first query mirrors LOG (when enabled); measure steady state
+        self.call(app.query_logs_sync, request, self.service, "Ravi")
+        self.measure("query_logs", log_rows, kind,
+                     lambda i: self.call(app.query_logs_sync, request, self.service, "Ravi"))
+
+
+def print_header():
+    print(f"{'scenario':<15} {'size':>6} {'detail':<22} {'p50 ms':>9} {'max ms':>9} {'calls':>6} "
+          f"{'KB sent':>9} {'KB recv':>9} {'llm':>5}  calls per request")
+
+
+def print_result(result):
+    calls = ", ".join(f"{method} {count:g}" for method, count in result["calls"].items())
+    print(f"{result['scenario']:<15} {result['size']:>6} {result['detail']:<22} {result['p50_ms']:>9.1f} "
+          f"{result['max_ms']:>9.1f} {result['api_calls']:>6.1f} {result['kb_sent']:>9.1f} "
+          f"{result['kb_received']:>9.1f} {result['llm_calls']:>5.1f}  {calls}")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    bench = Bench(args)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    fanouts = [int(fanout) for fanout in args.fanouts.split(",") if fanout]
+    log_sizes = [int(rows) for rows in args.log_rows.split(",") if rows]
+
+    print_header()
+    for size in sizes:
+        bench.sheet_info(size)
+        for fanout in fanouts:
+            bench.update(size, fanout, via_llm=False)
+        bench.update(size, 1, via_llm=True)
+        bench.bulk_update(size)
+        bench.concurrent_updates(size)
+    for log_rows in log_sizes:
+        bench.query_logs(log_rows, "how much brickwork was done in Tower 1", "aggregate")
+        bench.query_logs(log_rows, "summarize the progress of Tower 1", "llm")
+
+    bench.app.write_queue.close()
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(bench.results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _reset_agent(agent):
+    """Forget the previous run so a pooled agent starts every request clean."""
+    agent.reset_run_state()
+    agent.reset_session()
+    runs = getattr(agent.memory, "runs", None)
+    if runs:
+        runs.clear()
+
+
+def _close_agent(agent):
+    client = getattr(agent.model, "client", None)
+    try:
+        if client is not None:
+            client.close()
+    except Exception as e:
+        logger.warning(f"Could not close model client: {str(e)}")
+
+
+class AgentPool:
+    """
+    Idle agents keyed by (kind, api_key), reused across requests.
+
+    An agent is checked out by exactly one request at a time (agno agents keep
+    per-run state), reset when it is returned, and keeps its Groq client and
+    warm HTTP connections while idle. At most `max_idle` agents are kept in
+    total; agents idle for longer than `idle_timeout` seconds are closed.
+    """
+
+    def __init__(self, max_idle: int = 32, idle_timeout: float = 600.0):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self, kind: str, api_key: str, factory):
+        """Yield an idle agent for this key, or a new one from `factory(api_key)`."""
+        key = (kind, api_key)
+        agent = self._take(key)
+        if agent is None:
+            agent = factory(api_key)
+        try:
+            yield agent
+        finally:
+            self._give_back(key, agent)
+
+    def _take(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if not idle:
+                return None
+            agent, _ = idle.pop()
+            if not idle:
+                del self._idle[key]
+            return agent
+
+    def _give_back(self, key, agent):
+        try:
+            _reset_agent(agent)
+        except Exception as e:
+            logger.warning(f"Discarding agent that could not be reset: {str(e)}")
+            _close_agent(agent)
+            return
+
+        evicted = []
+        now = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(key, []).append((agent, now))
+            self._idle.move_to_end(key)
+            evicted.extend(self._evict(now))
+        for stale in evicted:
+            _close_agent(stale)
+
+    def _evict(self, now):
+        """Drop expired agents, then the least recently used ones beyond max_idle."""
+        evicted = []
+        for key in list(self._idle):
+            fresh = [(agent, released) for agent, released in self._idle[key] if now - released < self.idle_timeout]
+            evicted.extend(agent for agent, released in self._idle[key] if now - released >= self.idle_timeout)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+        while sum(len(idle) for idle in self._idle.values()) > self.max_idle:
+            key, idle = next(iter(self._idle.items()))
+            evicted.append(idle.pop(0)[0])
+            if not idle:
+                del self._idle[key]
+        return evicted
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+
+agent_pool = AgentPool(
+    max_idle=int(os.getenv("AGENT_POOL_SIZE", "32")),
+    idle_timeout=float(os.getenv("AGENT_POOL_IDLE_SECONDS", "600")),
+)
@@ -0,0 +1,145 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from utils.logger import get_logger
+from .quota import quota_scheduler, current_priority, backoff_delay, QUOTA_MAX_RETRIES
+
+logger = get_logger(__name__)
+
+# Threads available to request handlers for blocking work (Sheets/Drive I/O, LLM calls)
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+
+# Maximum in-flight calls per external dependency, across all requests of this process
+DEPENDENCY_LIMITS = {
+    "sheets": int(os.getenv("SHEETS_MAX_CONCURRENCY", "16")),
+    "drive": int(os.getenv("DRIVE_MAX_CONCURRENCY", "8")),
+    "groq": int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+}
+
+# Writes that leave the sheet in the same state when repeated, so a 5xx can be retried
+IDEMPOTENT_METHODS = {
+    "sheets.spreadsheets.values.update",
+    "sheets.spreadsheets.values.batchUpdate",
+    "sheets.spreadsheets.values.clear",
+    "sheets.spreadsheets.values.batchClear",
+}
+# spreadsheets.batchUpdate requests that overwrite cells or properties in place;
+# addSheet, insertDimension and the like would be applied twice
+IDEMPOTENT_BATCH_REQUESTS = {"updateCells", "repeatCell", "updateSheetProperties"}
+
+# Parallel calls made on behalf of one request (e.g. parsing the lines of a bulk update)
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in DEPENDENCY_LIMITS.items()}
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function on the bounded pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def map_concurrently(func, items, max_workers: int = FANOUT_CONCURRENCY) -> list:
+    """
+    Blocking map of func over items, in order, on a short-lived pool.
+
+    The caller usually already runs on the blocking pool, so the fan-out gets
+    its own threads instead of waiting on (and possibly starving) that pool.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="fanout") as executor:
+        return list(executor.map(func, items))
+
+
+@contextmanager
+def dependency_slot(dependency: str):
+    """Hold one of the dependency's concurrency slots for the duration of a call."""
+    semaphore = _semaphores[dependency]
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def dependency_for_uri(uri: str) -> str:
+    host = urlparse(uri).netloc
+    if host.startswith("sheets."):
+        return "sheets"
+    return "drive"
+
+
+def safe_to_repeat(method: str, method_id: str, body) -> bool:
+    """
+    Whether a request that failed with a 5xx may be sent again.
+
+    The server may have applied it before failing, so only reads and writes
+    that overwrite in place qualify; appends and addSheet would be duplicated.
+    """
+    if method == "GET":
+        return True
+    if method_id in IDEMPOTENT_METHODS:
+        return True
+    if method_id != "sheets.spreadsheets.batchUpdate":
+        return False
+    try:
+        requests = json.loads(body or "{}").get("requests") or []
+    except (TypeError, ValueError):
+        return False
+    return bool(requests) and all(set(request) <= IDEMPOTENT_BATCH_REQUESTS for request in requests)
+
+
+class LimitedHttpRequest(HttpRequest):
+    """
+    googleapiclient request that executes under the per-dependency limit and
+    the quota scheduler.
+
+    Passed as `requestBuilder` to build(), so every `.execute()` on a Sheets or
+    Drive service is capped without changing the call sites. `quota_user`
+    identifies the caller for per-user quota buckets. Calls rejected with 429
+    are retried with jittered exponential backoff, as are 5xx failures of calls
+    that are safe to repeat (see safe_to_repeat). `retry_server_errors`
+    overrides that decision for a single request.
+    """
+
+    def __init__(self, *args, quota_user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.quota_user = quota_user
+        self.retry_server_errors = safe_to_repeat(self.method, self.methodId, self.body)
+
+    def execute(self, http=None, num_retries=0):
+        dependency = dependency_for_uri(self.uri)
+        kind = "read" if self.method == "GET" else "write"
+        priority = current_priority()
+        for attempt in range(QUOTA_MAX_RETRIES + 1):
+            quota_scheduler.acquire(dependency, kind, self.quota_user, priority)
+            try:
+                with dependency_slot(dependency):
+                    return super().execute(http=http, num_retries=num_retries)
+            except HttpError as e:
+                status = e.resp.status
+                retryable = status == 429 or (status >= 500 and self.retry_server_errors)
+                if not retryable or attempt == QUOTA_MAX_RETRIES:
+                    raise
+                if status == 429:
+                    quota_scheduler.throttle(dependency, kind, self.quota_user)
+                delay = backoff_delay(attempt, e.resp.get("retry-after"))
+                logger.warning(f"{self.methodId} failed with {status}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+def shutdown():
+    _executor.shutdown(wait=False)
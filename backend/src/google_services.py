@@ -0,0 +1,130 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import build_http
+
+from utils.logger import get_logger
+from .concurrency import LimitedHttpRequest
+
+logger = get_logger(__name__)
+
+# Access tokens issued by Google live for an hour; drop service handles a bit earlier
+SERVICE_TTL_SECONDS = float(os.getenv("GOOGLE_SERVICE_TTL_SECONDS", "3300"))
+SERVICE_CACHE_SIZE = int(os.getenv("GOOGLE_SERVICE_CACHE_SIZE", "256"))
+
+
+@lru_cache(maxsize=None)
+def discovery_document(api: str, version: str):
+    """Parsed discovery document shipped with googleapiclient, or None if not bundled."""
+    document = get_static_doc(api, version)
+    return json.loads(document) if document else None
+
+
+class ThreadLocalHttp:
+    """
+    Keep-alive transport shared by every service handle.
+
+    httplib2.Http is not thread-safe, so each worker thread gets its own Http
+    (and with it its own pool of open TLS connections to googleapis.com).
+    Authorization headers are added per request by AuthorizedHttp, so the
+    connections are safely shared across users.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = build_http()
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._http(), name)
+
+
+_transport = ThreadLocalHttp()
+
+
+def _seconds_until_expiry(credentials):
+    if credentials.expiry is None:
+        return SERVICE_TTL_SECONDS
+    # google-auth keeps expiry as a naive UTC datetime
+    remaining = (credentials.expiry - datetime.utcnow()).total_seconds()
+    return max(0.0, min(SERVICE_TTL_SECONDS, remaining))
+
+
+def token_key(token) -> str:
+    """Opaque per-user key for an access token (the token itself is not kept)."""
+    return hashlib.sha256((token or "").encode()).hexdigest()[:16]
+
+
+def quota_user(credentials) -> str:
+    """Per-user key for quota buckets."""
+    return token_key(credentials.token)
+
+
+def _build_service(api, version, credentials):
+    http = AuthorizedHttp(credentials, http=_transport)
+    request_builder = functools.partial(LimitedHttpRequest, quota_user=quota_user(credentials))
+    document = discovery_document(api, version)
+    if document is None:
+        return build(api, version, http=http, requestBuilder=request_builder, cache_discovery=False)
+    return build_from_document(document, http=http, requestBuilder=request_builder)
+
+
+class ServiceCache:
+    """
+    LRU of built service handles keyed by (api, version, token, scopes).
+
+    Entries expire with the access token (or after SERVICE_TTL_SECONDS when the
+    expiry is unknown), so a handle is never reused with stale credentials.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api, version, credentials):
+        key = (api, version, credentials.token, tuple(sorted(credentials.scopes or ())))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        service = _build_service(api, version, credentials)
+        expires_at = time.monotonic() + _seconds_until_expiry(credentials)
+        with self._lock:
+            self._entries[key] = (service, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return service
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+service_cache = ServiceCache(max_entries=SERVICE_CACHE_SIZE)
+
+
+def get_service(api: str, version: str, credentials):
+    """Cached googleapiclient service for these credentials (e.g. ('sheets', 'v4'))."""
+    return service_cache.get(api, version, credentials)
@@ -0,0 +1,184 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from agno.exceptions import ModelProviderError
+
+from utils.logger import get_logger
+from .concurrency import dependency_slot
+from .quota import backoff_delay
+
+logger = get_logger(__name__)
+
+# In-flight calls per Groq API key (the process-wide cap is GROQ_MAX_CONCURRENCY)
+GROQ_KEY_MAX_CONCURRENCY = int(os.getenv("GROQ_KEY_MAX_CONCURRENCY", "4"))
+# Total time one request may spend on an LLM call, including waits and retries
+LLM_LATENCY_BUDGET_SECONDS = float(os.getenv("LLM_LATENCY_BUDGET_SECONDS", "30"))
+# Timeout of a single Groq HTTP call
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "20"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+# Consecutive provider failures that open the circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+
+class LLMUnavailable(Exception):
+    """The LLM can't answer within the latency budget; callers use their fallback."""
+
+
+def provider_status(error: Exception) -> int:
+    """HTTP status behind an agno provider error (502 for timeouts and connection errors)."""
+    return getattr(error, "status_code", 0) if isinstance(error, ModelProviderError) else 0
+
+
+def retry_after(error: Exception):
+    """Retry-After header of the Groq response behind an agno provider error, if any."""
+    response = getattr(error.__cause__, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    return headers.get("retry-after")
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive provider failures and rejects
+    calls for `cooldown` seconds; then one trial call is let through, which
+    closes the circuit again on success and reopens it on failure.
+
+    Every admitted call must be settled with exactly one of record_success,
+    record_failure or release (no verdict on the provider, e.g. a 4xx for one
+    user's key or a cancelled call), or a trial would keep the circuit open.
+    """
+
+    CLOSED = "closed"
+    TRIAL = "trial"
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[str]:
+        """CLOSED or TRIAL (the one call let through a half-open circuit) if a call may go ahead, else None."""
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if self._trial_running or time.monotonic() - self._opened_at < self.cooldown:
+                return None
+            self._trial_running = True
+            return self.TRIAL
+
+    def release(self, admission: Optional[str]):
+        """Settle a call without a verdict; a trial frees the way for the next one."""
+        if admission == self.TRIAL:
+            with self._lock:
+                self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("LLM provider recovered, closing the circuit")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(f"LLM provider failed {self._failures} times in a row, opening the circuit")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class LLMScheduler:
+    """
+    Runs LLM calls under a per-key concurrency limit, the process-wide Groq
+    limit and a latency budget.
+
+    Rate-limited (429) and failed (5xx, timeout) calls are retried with
+    jittered backoff that honours Retry-After, as long as the retry fits in the
+    budget. Provider failures feed a circuit breaker; while it is open calls
+    fail fast with LLMUnavailable instead of piling up retries.
+    """
+
+    def __init__(self, per_key_limit: int = GROQ_KEY_MAX_CONCURRENCY, budget: float = LLM_LATENCY_BUDGET_SECONDS,
+                 max_attempts: int = LLM_MAX_ATTEMPTS, breaker: CircuitBreaker = None):
+        self.per_key_limit = per_key_limit
+        self.budget = budget
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, api_key) -> threading.BoundedSemaphore:
+        with self._lock:
+            return self._semaphores.setdefault(api_key, threading.BoundedSemaphore(self.per_key_limit))
+
+    @contextmanager
+    def slot(self, api_key: str, deadline: float):
+        """
+        Hold a per-key and a Groq slot for the call in the block; raises
+        LLMUnavailable if the circuit is open or no slot frees up before the
+        deadline. The block's outcome settles the circuit breaker: success,
+        failure for 5xx / timeouts, no verdict for anything else (4xx,
+        rate limits, other errors, a closed stream).
+        """
+        admission = self.breaker.allow()
+        if admission is None:
+            raise LLMUnavailable("The LLM provider is unavailable right now")
+        settle = functools.partial(self.breaker.release, admission)
+        try:
+            semaphore = self._semaphore(api_key)
+            if not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                raise LLMUnavailable("Too many LLM calls are in flight for this API key")
+            try:
+                with dependency_slot("groq"):
+                    yield
+            finally:
+                semaphore.release()
+            settle = self.breaker.record_success
+        except Exception as e:
+            if provider_status(e) >= 500:
+                settle = self.breaker.record_failure
+            raise
+        finally:
+            settle()
+
+    def run(self, api_key: str, call):
+        """Return call() (an agent.run), retried within the latency budget."""
+        deadline = time.monotonic() + self.budget
+        for attempt in range(self.max_attempts):
+            try:
+                with self.slot(api_key, deadline):
+                    result = call()
+            except LLMUnavailable:
+                raise
+            except Exception as e:
+                status = provider_status(e)
+                if status != 429 and status < 500:
+                    raise
+                delay = backoff_delay(attempt, retry_after(e))
+                if attempt == self.max_attempts - 1 or time.monotonic() + delay >= deadline:
+                    raise LLMUnavailable(f"LLM call failed: {str(e)}") from e
+                logger.warning(f"LLM call failed with {status}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            return result
+
+    @contextmanager
+    def stream(self, api_key: str):
+        """
+        Slot for a streaming call, which can't be retried once output has been
+        sent; provider failures inside the block still count against the circuit.
+        """
+        with self.slot(api_key, time.monotonic() + self.budget):
+            yield
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,402 @@
+import math
+import os
+import re
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+from utils.logger import get_logger
+from .text_utils import tokenize, normalize_text, display_name
+
+logger = get_logger(__name__)
+
+# Most LOG rows loaded to answer an aggregate question over the whole history
+AGGREGATE_MAX_ROWS = int(os.getenv("LOG_AGGREGATE_MAX_ROWS", "200000"))
+
+LOG_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%m/%d/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+)
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+
+# Dictionary-encoded LOG columns, in the order used to resolve a phrase that
+# names values in more than one of them
+DIMENSIONS = {
+    "location": "Location",
+    "work_type": "updation",
+    "engineer": "site_engineer_name",
+    "peta_location": "Peta Location",
+    "sub_location": "Sub Location",
+    "category": "Category",
+}
+DIMENSION_LABELS = {
+    "location": "location",
+    "work_type": "work type",
+    "engineer": "engineer",
+    "peta_location": "peta location",
+    "sub_location": "sub location",
+    "category": "category",
+    "day": "day",
+}
+GROUP_BY_WORDS = {"by", "per", "each", "wise"}
+GROUP_BY_NOUNS = {
+    "engineer": "engineer", "engineers": "engineer", "person": "engineer",
+    "location": "location", "locations": "location", "building": "location", "buildings": "location",
+    "peta": "peta_location", "flat": "peta_location", "flats": "peta_location",
+    "work": "work_type", "type": "work_type", "types": "work_type", "activity": "work_type", "item": "work_type",
+    "category": "category", "categories": "category",
+    "day": "day", "days": "day", "date": "day", "dates": "day",
+}
+SUM_WORDS = {"total", "sum", "overall", "cumulative"}
+COUNT_WORDS = {"count", "many"}
+LATEST_WORDS = {"latest", "last", "recent", "recently", "current", "newest"}
+TRAILING_WORDS = {"work", "works"}
+
+# Words that may remain once entities, dates and the aggregate are recognised;
+# any other word means the question needs the LLM
+FILLER_WORDS = {
+    "what", "whats", "is", "was", "are", "were", "the", "of", "at", "in", "on", "for", "a", "an",
+    "to", "from", "and", ",", "quantity", "quantities", "qty", "amount", "updated", "update",
+    "updates", "updation", "updations", "entries", "entry", "logs", "log", "done", "work", "been",
+    "has", "have", "had", "did", "do", "does", "made", "make", "there", "so", "far", "till", "all", "me",
+    "show", "tell", "give", "please", "location", "peta", "flat", "much", "how", "number", "times",
+    "most", "wise", "item", "items", "units", "unit", "now",
+}
+
+
+def parse_log_time(value) -> float:
+    """Epoch seconds of a LOG time cell (as formatted by Sheets), or NaN."""
+    text = " ".join(str(value or "").split())
+    for time_format in LOG_TIME_FORMATS:
+        try:
+            return datetime.strptime(text, time_format).timestamp()
+        except ValueError:
+            continue
+    return math.nan
+
+
+def parse_log_number(value) -> float:
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.2f}"
+
+
+class DictionaryColumn:
+    """String column stored as integer codes into a list of distinct values."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = array("i")
+        self._code_of = {}
+
+    def append(self, value):
+        value = display_name(value or "")
+        code = self._code_of.get(value)
+        if code is None:
+            code = self._code_of[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def value(self, row: int) -> str:
+        return self.values[self.codes[row]]
+
+
+class LogTable:
+    """
+    Columnar copy of LOG rows: times and quantities in typed arrays, text
+    columns dictionary-encoded, so filters compare integers instead of strings.
+    """
+
+    def __init__(self):
+        self.times = array("d")
+        self.requested = array("d")
+        self.updated = array("d")
+        self.columns = {dimension: DictionaryColumn() for dimension in DIMENSIONS}
+        self.cells = DictionaryColumn()
+        self._phrases = None
+        self._postings = {}
+
+    @classmethod
+    def from_logs(cls, logs: list) -> "LogTable":
+        table = cls()
+        for log in logs:
+            table.append(log)
+        return table
+
+    def append(self, log: dict):
+        self.times.append(parse_log_time(log.get("time")))
+        self.requested.append(parse_log_number(log.get("requested_quantity")))
+        self.updated.append(parse_log_number(log.get("updated_quantity")))
+        for dimension, header in DIMENSIONS.items():
+            self.columns[dimension].append(log.get(header))
+        self.cells.append(log.get("updated_cell"))
+        self._phrases = None
+        self._postings = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def value(self, dimension: str, row: int) -> str:
+        if dimension == "day":
+            return datetime.fromtimestamp(self.times[row]).strftime("%Y-%m-%d") if not math.isnan(self.times[row]) else "unknown date"
+        return self.columns[dimension].value(row)
+
+    def phrases(self) -> dict:
+        """{normalized token tuple: {dimension: {codes}}} for every distinct value."""
+        if self._phrases is None:
+            phrases = {}
+            for dimension, column in self.columns.items():
+                for code, value in enumerate(column.values):
+                    tokens = tuple(normalize_text(value).split())
+                    if not tokens:
+                        continue
+                    variants = [tokens]
+                    if dimension == "work_type" and len(tokens) > 1 and tokens[-1] in TRAILING_WORDS:
+                        variants.append(tokens[:-1])
+                    for variant in variants:
+                        phrases.setdefault(variant, {}).setdefault(dimension, set()).add(code)
+            self._phrases = phrases
+        return self._phrases
+
+    def postings(self, dimension: str) -> dict:
+        """Inverted index {code: [row positions]} of a dimension, built on first use."""
+        if dimension not in self._postings:
+            postings = {}
+            for row, code in enumerate(self.columns[dimension].codes):
+                postings.setdefault(code, []).append(row)
+            self._postings[dimension] = postings
+        return self._postings[dimension]
+
+    def rows_where(self, filters: dict, since: Optional[float] = None, until: Optional[float] = None) -> list:
+        """Row positions matching every dimension filter ({dimension: {codes}}) and the time window."""
+        rows = range(len(self))
+        for dimension, codes in filters.items():
+            column_codes = self.columns[dimension].codes
+            rows = [row for row in rows if column_codes[row] in codes]
+        if since is not None or until is not None:
+            low = since if since is not None else -math.inf
+            high = until if until is not None else math.inf
+            rows = [row for row in rows if low <= self.times[row] < high]
+        return list(rows)
+
+
+@dataclass
+class LogEntities:
+    """Entities and date window recognised in a logs question."""
+    filters: dict = field(default_factory=dict)
+    since: Optional[float] = None
+    until: Optional[float] = None
+    window: str = ""
+    tokens: list = field(default_factory=list)
+    leftover: list = field(default_factory=list)
+
+
+def _day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _match_date_window(tokens, i, now) -> Optional[tuple]:
+    """(length, since, until, label) for a relative date phrase at tokens[i]."""
+    today = _day_start(now)
+    token = tokens[i]
+    following = tokens[i + 1] if i + 1 < len(tokens) else None
+    if token == "today":
+        return 1, today, today + timedelta(days=1), "today"
+    if token == "yesterday":
+        return 1, today - timedelta(days=1), today, "yesterday"
+    if token in ("this", "current") and following in ("week", "month"):
+        start = today - timedelta(days=today.weekday()) if following == "week" else today.replace(day=1)
+        return 2, start, None, f"this {following}"
+    if token in ("last", "previous") and following == "week":
+        end = today - timedelta(days=today.weekday())
+        return 2, end - timedelta(days=7), end, "last week"
+    if token in ("last", "previous") and following == "month":
+        end = today.replace(day=1)
+        return 2, (end - timedelta(days=1)).replace(day=1), end, "last month"
+    if token in ("last", "past") and following is not None and following.isdigit() and i + 2 < len(tokens):
+        unit = tokens[i + 2]
+        days = {"day": 1, "days": 1, "week": 7, "weeks": 7}.get(unit)
+        if days:
+            return 3, today - timedelta(days=int(following) * days - 1), None, f"in the last {following} {unit}"
+    return None
+
+
+def extract_log_entities(query: str, table: LogTable, now: Optional[datetime] = None) -> LogEntities:
+    """
+    Recognise LOG values (locations, work types, engineers, peta locations, ...)
+    and a date window in a question. Values are matched as whole phrases against
+    the distinct values present in the table; tokens that match nothing are
+    returned in `leftover`.
+    """
+    now = now or datetime.now()
+    entities = LogEntities()
+
+    # Explicit dates first: the tokenizer would read "2024-05-01" as a range
+    dates = []
+    for match in ISO_DATE_RE.finditer(query):
+        try:
+            dates.append(datetime(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+        except ValueError:
+            continue
+    if dates:
+        start, end = min(dates), max(dates)
+        entities.since = start.timestamp()
+        entities.until = (end + timedelta(days=1)).timestamp()
+        entities.window = f"on {start:%Y-%m-%d}" if start == end else f"from {start:%Y-%m-%d} to {end:%Y-%m-%d}"
+    tokens = tokenize(ISO_DATE_RE.sub(" ", query))
+    entities.tokens = tokens
+
+    phrases = table.phrases()
+    longest = max((len(phrase) for phrase in phrases), default=0)
+    i = 0
+    while i < len(tokens):
+        window = _match_date_window(tokens, i, now) if not dates else None
+        if window is not None:
+            length, since, until, label = window
+            entities.since = since.timestamp()
+            entities.until = until.timestamp() if until is not None else None
+            entities.window = label
+            i += length
+            continue
+
+        for length in range(min(longest, len(tokens) - i), 0, -1):
+            matched = phrases.get(tuple(tokens[i:i + length]))
+            if matched:
+                dimension = next(d for d in DIMENSIONS if d in matched)
+                entities.filters.setdefault(dimension, set()).update(matched[dimension])
+                i += length
+                break
+        else:
+            entities.leftover.append(tokens[i])
+            i += 1
+    return entities
+
+
+@dataclass
+class LogQueryPlan:
+    aggregate: str
+    entities: LogEntities
+    group_by: Optional[str] = None
+
+
+def plan_logs_query(query: str, table: LogTable, now: Optional[datetime] = None) -> Optional[LogQueryPlan]:
+    """
+    Map a question to filter + group-by + sum/count/latest, or None when any part
+    of it is not understood (the caller then asks the LLM).
+    """
+    entities = extract_log_entities(query, table, now)
+    words = entities.leftover
+
+    aggregate = None
+    if any(word in SUM_WORDS for word in words) or ("how" in words and "much" in words):
+        aggregate = "sum"
+    if any(word in COUNT_WORDS for word in words) or ("number" in words and "of" in words):
+        aggregate = "count" if aggregate is None else None
+    if any(word in LATEST_WORDS for word in words):
+        aggregate = "latest" if aggregate is None else None
+    if aggregate is None:
+        return None
+
+    group_by = None
+    unexplained = []
+    for position, word in enumerate(words):
+        if word in SUM_WORDS | COUNT_WORDS | LATEST_WORDS:
+            continue
+        previous = words[position - 1] if position else None
+        if word in GROUP_BY_NOUNS and (previous in GROUP_BY_WORDS or (position + 1 < len(words) and words[position + 1] == "wise")):
+            if group_by not in (None, GROUP_BY_NOUNS[word]):
+                return None
+            group_by = GROUP_BY_NOUNS[word]
+            continue
+        # A group-by noun elsewhere ("how many flats have ...") asks for distinct
+        # values, which the planner doesn't count; filler ones ("at location") are fine
+        if word in GROUP_BY_WORDS or word in FILLER_WORDS:
+            continue
+        unexplained.append(word)
+    if unexplained:
+        return None
+    return LogQueryPlan(aggregate=aggregate, entities=entities, group_by=group_by)
+
+
+def _describe_scope(plan: LogQueryPlan, table: LogTable) -> str:
+    parts = []
+    filters = plan.entities.filters
+    for dimension, prefix in (("work_type", "for"), ("location", "at"), ("sub_location", "on"),
+                              ("peta_location", "peta location"), ("category", "category"), ("engineer", "by")):
+        if dimension in filters:
+            values = sorted(table.columns[dimension].values[code] for code in filters[dimension])
+            parts.append(f"{prefix} {', '.join(values)}")
+    if plan.entities.window:
+        parts.append(plan.entities.window)
+    return (" " + " ".join(parts)) if parts else ""
+
+
+def _describe_row(table: LogTable, row: int) -> str:
+    when = "" if math.isnan(table.times[row]) else f" on {datetime.fromtimestamp(table.times[row]):%Y-%m-%d %H:%M:%S}"
+    return (
+        f"{table.value('work_type', row)} at {table.value('location', row)} {table.value('peta_location', row)} "
+        f"updated by {table.value('engineer', row)}{when} with quantity {format_number(table.requested[row])} "
+        f"(total {format_number(table.updated[row])})"
+    )
+
+
+def _latest(table: LogTable, rows: list) -> int:
+    # Rows are appended in time order; the time only breaks ties across formats
+    return max(rows, key=lambda row: (table.times[row] if not math.isnan(table.times[row]) else -math.inf, row))
+
+
+def execute_plan(plan: LogQueryPlan, table: LogTable) -> str:
+    entities = plan.entities
+    rows = table.rows_where(entities.filters, entities.since, entities.until)
+    scope = _describe_scope(plan, table)
+    if not rows:
+        return f"No updates found{scope}"
+
+    if plan.group_by is not None:
+        groups = {}
+        for row in rows:
+            groups.setdefault(table.value(plan.group_by, row), []).append(row)
+        label = DIMENSION_LABELS[plan.group_by]
+        if plan.aggregate == "sum":
+            items = [f"{key}: {format_number(sum(table.requested[r] for r in group))}" for key, group in sorted(groups.items())]
+            return f"Total quantity{scope} by {label}: " + "; ".join(items)
+        if plan.aggregate == "count":
+            items = [f"{key}: {len(group)}" for key, group in sorted(groups.items())]
+            return f"Number of updates{scope} by {label}: " + "; ".join(items)
+        items = [f"{key}: {_describe_row(table, _latest(table, group))}" for key, group in sorted(groups.items())]
+        return f"Latest update{scope} by {label}: " + "; ".join(items)
+
+    if plan.aggregate == "sum":
+        total = sum(table.requested[row] for row in rows)
+        return f"Total quantity{scope} is {format_number(total)} from {len(rows)} update{'s' if len(rows) != 1 else ''}"
+    if plan.aggregate == "count":
+        return f"{len(rows)} update{'s' if len(rows) != 1 else ''} found{scope}"
+    return f"Latest update{scope}: {_describe_row(table, _latest(table, rows))}"
+
+
+def answer_logs_query(table: LogTable, query: str, now: Optional[datetime] = None,
+                      partial: bool = False) -> Optional[str]:
+    """
+    Exact answer for aggregate questions about LOG rows, or None if the LLM is needed.
+
+    `partial` means the table holds only the most recent rows (of the history
+    or of the date window); the answer then says how many it covers.
+    """
+    plan = plan_logs_query(query, table, now)
+    if plan is None:
+        return None
+    logger.info(f"Answering logs query locally ({plan.aggregate}, group by {plan.group_by}): {query!r}")
+    answer = execute_plan(plan, table)
+    if partial:
+        answer += f" (from the last {len(table)} log entries only)"
+    return answer
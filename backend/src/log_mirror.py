@@ -0,0 +1,208 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Optional
+
+from utils.logger import get_logger
+from .log_analytics import parse_log_time
+
+logger = get_logger(__name__)
+
+LOG_HEADERS = [
+    'time', 'site_engineer_name', 'Location', 'Sub Location',
+    'Peta Location', 'Category', 'updation', 'requested_quantity',
+    'updated_quantity', 'user_query', 'feedback', 'updated_cell'
+]
+MIRROR_COLUMNS = [re.sub(r"\W+", "_", header.lower()) for header in LOG_HEADERS]
+# Columns written verbatim (not re-formatted by Sheets), used to check that the
+# last mirrored row still matches the sheet
+KEY_COLUMNS = [LOG_HEADERS.index('site_engineer_name'), LOG_HEADERS.index('updated_cell')]
+UPDATED_RANGE_RE = re.compile(r"!\$?[A-Z]+\$?(\d+)(?::\$?[A-Z]+\$?(\d+))?")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS log_rows (
+    row_number INTEGER PRIMARY KEY,
+    {", ".join(f"{column} TEXT" for column in MIRROR_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+
+def _cell_text(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return "" if value is None else str(value)
+
+
+def _pad(row) -> list:
+    return ([_cell_text(value) for value in row] + [''] * len(LOG_HEADERS))[:len(LOG_HEADERS)]
+
+
+def _row_key(row) -> tuple:
+    return tuple(" ".join(row[i].split()) for i in KEY_COLUMNS)
+
+
+def updated_row_span(updated_range: Optional[str]) -> Optional[tuple]:
+    """(first, last) sheet rows of an A1 range such as "'LOG'!A12:L14"."""
+    match = UPDATED_RANGE_RE.search(updated_range or "")
+    if not match:
+        return None
+    first_row = int(match.group(1))
+    return first_row, int(match.group(2) or first_row)
+
+
+def in_time_window(time: float, since: Optional[float], until: Optional[float]) -> bool:
+    """Rows with an unreadable time are kept rather than silently dropped."""
+    if math.isnan(time):
+        return True
+    return (since is None or time >= since) and (until is None or time < until)
+
+
+class LogMirror:
+    """
+    Local SQLite copy of each spreadsheet's LOG sheet.
+
+    `synced_row` is the last sheet row mirrored (1 = header only). sync()
+    re-reads that row to check the mirror still matches the sheet (a full
+    resync follows if LOG was edited by hand) and downloads only the rows
+    appended after it. Appends made by this server are applied directly from
+    the values().append response.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, spreadsheet_id) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(spreadsheet_id, threading.Lock())
+
+    def _connect(self, spreadsheet_id) -> sqlite3.Connection:
+        filename = re.sub(r"[^A-Za-z0-9_-]", "_", spreadsheet_id) + ".sqlite"
+        connection = sqlite3.connect(os.path.join(self.directory, filename))
+        connection.executescript(SCHEMA)
+        return connection
+
+    @staticmethod
+    def _synced_row(connection) -> int:
+        row = connection.execute("SELECT value FROM sync_state WHERE key = 'synced_row'").fetchone()
+        return row[0] if row else 1
+
+    @staticmethod
+    def _insert(connection, first_row: int, rows: list):
+        placeholders = ", ".join("?" * (len(MIRROR_COLUMNS) + 1))
+        connection.executemany(
+            f"INSERT OR REPLACE INTO log_rows (row_number, {', '.join(MIRROR_COLUMNS)}) VALUES ({placeholders})",
+            [(first_row + offset, *_pad(row)) for offset, row in enumerate(rows)]
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('synced_row', ?)",
+            (first_row + len(rows) - 1,)
+        )
+
+    def _stored_row(self, connection, row_number) -> Optional[list]:
+        row = connection.execute(
+            f"SELECT {', '.join(MIRROR_COLUMNS)} FROM log_rows WHERE row_number = ?", (row_number,)
+        ).fetchone()
+        return list(row) if row else None
+
+    def sync(self, service, spreadsheet_id) -> int:
+        """Download LOG rows appended since the last sync; returns the number of new rows."""
+        with self._lock(spreadsheet_id), closing(self._connect(spreadsheet_id)) as connection:
+            synced_row = self._synced_row(connection)
+            start_row = max(synced_row, 2)
+            result = service.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=f"'LOG'!A{start_row}:L",
+                valueRenderOption='FORMATTED_VALUE'
+            ).execute()
+            rows = result.get('values', [])
+
+            if synced_row > 1:
+                stored = self._stored_row(connection, synced_row)
+                if not rows or stored is None or _row_key(_pad(rows[0])) != _row_key(stored):
+                    logger.warning(f"LOG mirror of {spreadsheet_id} no longer matches the sheet, resyncing")
+                    connection.execute("DELETE FROM log_rows")
+                    connection.execute("DELETE FROM sync_state")
+                    connection.commit()
+                    return self._full_sync(service, spreadsheet_id, connection)
+                rows = rows[1:]
+
+            if rows:
+                self._insert(connection, synced_row + 1, rows)
+                connection.commit()
+            return len(rows)
+
+    def _full_sync(self, service, spreadsheet_id, connection) -> int:
+        result = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range="'LOG'!A2:L",
+            valueRenderOption='FORMATTED_VALUE'
+        ).execute()
+        rows = result.get('values', [])
+        if rows:
+            self._insert(connection, 2, rows)
+            connection.commit()
+        return len(rows)
+
+    def apply_append(self, spreadsheet_id, entries: list, updated_range: Optional[str]):
+        """Mirror rows we appended, when they directly follow the synced rows."""
+        span = updated_row_span(updated_range)
+        if span is None or not entries:
+            return
+        first_row = span[0]
+        with self._lock(spreadsheet_id), closing(self._connect(spreadsheet_id)) as connection:
+            synced_row = self._synced_row(connection)
+            if synced_row <= 1 or first_row != synced_row + 1:
+                # Not synced yet, or rows appended by someone else in between:
+                # the next sync() downloads them
+                return
+            self._insert(connection, first_row, entries)
+            connection.commit()
+
+    def recent_logs(self, spreadsheet_id, limit: int, since: Optional[float] = None,
+                    until: Optional[float] = None) -> list:
+        """
+        The last `limit` mirrored LOG rows, oldest first, as {header: value} dicts.
+
+        With `since` / `until` (epoch seconds), only rows in that window count;
+        rows are scanned newest first and the scan stops at the first row older
+        than `since`.
+        """
+        logs = []
+        with self._lock(spreadsheet_id), closing(self._connect(spreadsheet_id)) as connection:
+            cursor = connection.execute(
+                f"SELECT {', '.join(MIRROR_COLUMNS)} FROM log_rows ORDER BY row_number DESC"
+            )
+            for row in cursor:
+                if len(logs) >= limit:
+                    break
+                time = parse_log_time(row[0])
+                if since is not None and not math.isnan(time) and time < since:
+                    break
+                if in_time_window(time, since, until):
+                    logs.append(dict(zip(LOG_HEADERS, row)))
+        return list(reversed(logs))
+
+
+def create_log_mirror() -> Optional[LogMirror]:
+    """
+    Mirror under LOG_MIRROR_DIR; mirroring is off when it is unset or empty.
+
+    The mirror keeps a local copy of every queried spreadsheet's LOG, so only
+    enable it on a host whose disk may hold that data. Reads still go through
+    sync() with the caller's credentials first.
+    """
+    directory = os.getenv("LOG_MIRROR_DIR", "")
+    return LogMirror(directory) if directory else None
+
+
+log_mirror = create_log_mirror()
@@ -0,0 +1,50 @@
+import math
+import os
+from datetime import datetime
+from typing import Optional
+
+from utils.logger import get_logger
+from .log_analytics import LogTable, extract_log_entities
+
+logger = get_logger(__name__)
+
+# Most LOG entries formatted into a logs prompt
+MAX_PROMPT_LOGS = int(os.getenv("LOGS_PROMPT_MAX_ENTRIES", "200"))
+
+
+def select_relevant_logs(logs: list, query: str, table: LogTable, limit: int = MAX_PROMPT_LOGS,
+                         now: Optional[datetime] = None) -> list:
+    """
+    The LOG entries a question is about, most relevant first.
+
+    Engineers, locations, peta locations, work types and a date window are
+    detected in the query. Rows outside the date window are dropped; the rest
+    are ranked by how many of the detected entities they match (looked up in
+    the table's inverted indexes), then by recency. Without any entity, or when
+    nothing matches, the most recent `limit` entries are used.
+    """
+    entities = extract_log_entities(query, table, now)
+
+    def in_window(row):
+        if entities.since is None and entities.until is None:
+            return True
+        time = table.times[row]
+        return not math.isnan(time) and (entities.since or -math.inf) <= time < (entities.until or math.inf)
+
+    scores = {}
+    for dimension, codes in entities.filters.items():
+        postings = table.postings(dimension)
+        for code in codes:
+            for row in postings.get(code, ()):
+                scores[row] = scores.get(row, 0) + 1
+
+    if entities.filters:
+        ranked = sorted((row for row in scores if in_window(row)), key=lambda row: (-scores[row], -row))
+    else:
+        ranked = [row for row in range(len(table) - 1, -1, -1) if in_window(row)]
+    if not ranked:
+        ranked = list(range(len(table) - 1, -1, -1))
+
+    selected = [logs[row] for row in ranked[:limit]]
+    logger.info(f"Selected {len(selected)} of {len(logs)} LOG entries for the logs prompt")
+    return selected
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+
+from utils.logger import get_logger
+from .quota import background_priority
+from .log_mirror import log_mirror, updated_row_span
+from .sheet_metadata import metadata_cache
+
+logger = get_logger(__name__)
+
+LOG_APPEND_RANGE = "'LOG'!A1"
+
+
+def append_log_entries(service, spreadsheet_id, entries) -> dict:
+    """
+    Append rows after the last LOG row with values().append.
+
+    Sheets picks the next row server-side, so no read of the LOG column is needed
+    and concurrent appends never overwrite each other.
+    """
+    response = service.spreadsheets().values().append(
+        spreadsheetId=spreadsheet_id,
+        range=LOG_APPEND_RANGE,
+        valueInputOption='USER_ENTERED',
+        body={'values': entries}
+    ).execute()
+    updated_range = response.get('updates', {}).get('updatedRange')
+    span = updated_row_span(updated_range)
+    if span is not None:
+        metadata_cache.record_log_rows(spreadsheet_id, span[1])
+    if log_mirror is not None:
+        try:
+            log_mirror.apply_append(spreadsheet_id, entries, updated_range)
+        except Exception as e:
+            logger.warning(f"Could not apply LOG append to the mirror of {spreadsheet_id}: {str(e)}")
+    return response
+
+
+class LogWriter:
+    """Writes LOG entries synchronously, one append per request."""
+
+    def write(self, service, spreadsheet_id, entries, user=None) -> bool:
+        """Write entries with service; True once appended, False if only queued."""
+        if entries:
+            append_log_entries(service, spreadsheet_id, entries)
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BufferedLogWriter(LogWriter):
+    """
+    Coalesces LOG entries from concurrent requests into one append per
+    spreadsheet and user.
+
+    Entries are buffered for up to `flush_interval` seconds after the first one
+    arrives and written from a background thread with the most recent service
+    handle of the user (an opaque per-credentials key) who wrote them, so rows
+    are never appended under someone else's credentials. close() flushes
+    whatever is still pending.
+    """
+
+    def __init__(self, flush_interval: float = 0.3):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, service, spreadsheet_id, entries, user=None) -> bool:
+        if not entries:
+            return True
+        with self._condition:
+            if self._closed:
+                append_log_entries(service, spreadsheet_id, entries)
+                return True
+            _, pending = self._pending.get((spreadsheet_id, user), (None, []))
+            self._pending[(spreadsheet_id, user)] = (service, pending + entries)
+            self._condition.notify()
+        return False
+
+    def _take_pending(self):
+        with self._condition:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def flush(self):
+        for (spreadsheet_id, _), (service, entries) in self._take_pending().items():
+            try:
+                # Nobody waits on buffered entries; interactive calls take quota first
+                with background_priority():
+                    append_log_entries(service, spreadsheet_id, entries)
+                logger.info(f"Appended {len(entries)} LOG entries to {spreadsheet_id}")
+            except Exception as e:
+                logger.error(f"Could not write {len(entries)} LOG entries to {spreadsheet_id}: {str(e)}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            # Let entries from concurrent requests accumulate before writing
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+def create_log_writer() -> LogWriter:
+    """Buffered writer when LOG_WRITE_BUFFER_MS > 0, otherwise direct appends."""
+    buffer_ms = float(os.getenv("LOG_WRITE_BUFFER_MS", "0"))
+    if buffer_ms > 0:
+        return BufferedLogWriter(flush_interval=buffer_ms / 1000)
+    return LogWriter()
+
+
+log_writer = create_log_writer()
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+
+
+class SupportResult(BaseModel):
+    row_index: list[str]
+    columns_index: list[str] 
+    updations: list[str]
+    quantities: list[int]
+    feedbacks: list[str]
+
+class LogQueryResult(BaseModel):
+    result: str = Field(description="Answer of the given Query based on the provide logs data") 
@@ -1,73 +1,276 @@
 from agno.agent import Agent
 from agno.models.groq import Groq
 from utils.logger import get_logger
-from pydantic import BaseModel, Field
 from dotenv import load_dotenv 
 from .config import SYSTEM_PROMPT, LOGS_SYSTEM_PROMPT
+from .models import SupportResult, LogQueryResult
+from .query_parser import parse_update_query
+from .result_validator import coerce_support_result, repair_support_result, unresolved_result
+from .prompt_pruning import prune_sheet_info, ROW_MARGIN
+from .llm_scheduler import llm_scheduler, LLMUnavailable, LLM_REQUEST_TIMEOUT_SECONDS
+from .agent_pool import agent_pool
+from .result_cache import result_cache, result_key
+from .work_type_matcher import SHORTLIST_SIZE
+from .log_analytics import LogTable
+from .log_retrieval import select_relevant_logs
+from .streaming import JsonFieldStreamer
+from agno.run.response import RunEvent
+from typing import Optional
+import hashlib
 import os
 
 load_dotenv()
 
 logger = get_logger(__name__)
 
+GROQ_MODEL_ID = "meta-llama/llama-4-scout-17b-16e-instruct"
 
-class SupportResult(BaseModel):
-    row_index: list[str]
-    columns_index: list[str] 
-    updations: list[str]
-    quantities: list[int]
-    feedbacks: list[str]
 
-class LogQueryResult(BaseModel):
-    result: str = Field(description="Answer of the given Query based on the provide logs data") 
+def groq_model(api_key: str) -> Groq:
+    # Retries are left to llm_scheduler, which keeps them within the latency budget
+    return Groq(id=GROQ_MODEL_ID, api_key=api_key, timeout=LLM_REQUEST_TIMEOUT_SECONDS, max_retries=0)
 
 
 def get_support_agent(api_key: str) -> Agent:
     return Agent(
-        model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct", api_key=api_key),
+        model=groq_model(api_key),
         system_message=SYSTEM_PROMPT,
         markdown=False,
         response_model=SupportResult,
-        retries=10,
         add_datetime_to_instructions=True,
     )
 
 def get_log_agent(api_key: str) -> Agent:
     return Agent(
-        model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct", api_key=api_key),
+        model=groq_model(api_key),
         system_message=LOGS_SYSTEM_PROMPT,
         markdown=False,  
         response_model=LogQueryResult,
-        retries=4,  
+        add_datetime_to_instructions=False,
+    )
+
+def run_support_agent(user_query: str, groq_api_key: str) -> SupportResult:
+    with agent_pool.checkout("support", groq_api_key, get_support_agent) as agent:
+        output = llm_scheduler.run(groq_api_key, lambda: agent.run(user_query))
+    result = coerce_support_result(output.content)
+    if result is None:
+        raise ValueError("The agent returned output that isn't a SupportResult")
+    return result
+
+
+def get_log_stream_agent(api_key: str) -> Agent:
+    # No response_model: structured output is only parsed once the run completes
+    return Agent(
+        model=groq_model(api_key),
+        system_message=LOGS_SYSTEM_PROMPT,
+        markdown=False,
+        stream=True,
         add_datetime_to_instructions=False,
     )
 
 def process_user_query(user_query: str, groq_api_key: str):
-    agent = get_support_agent(groq_api_key)
-    output = agent.run(user_query)
-    return ( 
-        output.content.row_index,
-        output.content.columns_index,
-        output.content.updations,
-        output.content.quantities,
-        output.content.feedbacks
+    return unpack_support_result(run_support_agent(user_query, groq_api_key))
+
+
+def llm_unavailable_result(user_query: str) -> SupportResult:
+    """No updates, with feedback asking for a query the local parser can resolve."""
+    return SupportResult(
+        row_index=[], columns_index=[], updations=[], quantities=[],
+        feedbacks=[
+            f"I couldn't process '{user_query}' right now. Please write the update as "
+            "location, peta location, work type and quantity, e.g. 'A Building 101 brickwork done by 40'."
+        ]
+    )
+
+
+def unpack_support_result(result: SupportResult):
+    return (
+        result.row_index,
+        result.columns_index,
+        result.updations,
+        result.quantities,
+        result.feedbacks
     )
 
 
-def process_logs_query(logs_data: list[dict], user_query: str, site_engineer_name: str, groq_api_key: str) -> str:
+def build_action_prompt(sheet_info: dict, user_query: str) -> str:
+    return f"""
+        You are given
+        SHEET DATA: 
+        {sheet_info}
+
+        USER QUERY:
+        {user_query}
+
+        PROCESSING STEPS:
+
+        1. PARSE QUERY:
+        - Identify Location, Peta Location(s), work type, status, quantity
+        - Handle ranges (e.g., "101 to 105" becomes ["101", "102", "103", "104", "105"])
+
+        2. FIND ROWS:
+        - For each Peta Location, look for exact match in ROW_INDEX
+        - Keep track of found and missing Peta Locations
+
+        3. MATCH COLUMN:
+        - Compare work type against COLUMN_INDEX values using flexible matching
+        - Handle common typos and variations
+        - Pick best match or provide helpful feedback if none found
+
+        4. GENERATE RESULTS:
+        - Create lists for each successful match
+        - Include appropriate feedback for each case
+        - Ensure lists are same length and correspond to each other
+
+        5. VALIDATION:
+        - Verify output format is correct
+        - Ensure feedback is always provided, even for failures
+        - Double-check that no empty results are returned without explanation
+
+        Remember: 
+        - NEVER return completely empty lists without feedback
+        - Handle typos and variations in work types gracefully  
+        - Provide specific, actionable feedback messages
+        - Process partial matches when possible
+        
+        Important:
+        - Do NOT attempt fuzzy matching for Location or Peta Location
+        - Do NOT try to correct spelling or infer missing values
+        - Do NOT output any extra keys or change the order of keys in the response
+        - If there's any ambiguity or missing information, provide clear feedback in the feedbacks list
+        
+        Now process the query and return the response in the exact format expected by the SupportResult model.
+        """
+
+
+# Changes whenever the prompt, model or pruning settings change, invalidating cached parses
+PROMPT_VERSION = hashlib.sha256("\0".join((
+    GROQ_MODEL_ID,
+    SYSTEM_PROMPT,
+    build_action_prompt("{sheet_info}", "{user_query}"),
+    str(ROW_MARGIN),
+    str(SHORTLIST_SIZE),
+)).encode("utf-8")).hexdigest()[:16]
+
+
+def process_update_query(user_query: str, sheet_index, sheet_info: dict, groq_api_key: str):
     """
-    Process a query about the logs data.
+    Resolve an update query into (row_index, columns_index, updations, quantities, feedbacks).
+
+    Well-formed queries are parsed locally by the grammar fast path; anything the
+    parser considers ambiguous falls back to the support agent, which only sees
+    the rows of the mentioned locations and the top-k candidate work-type columns.
+    """
+    result = parse_update_query(user_query, sheet_index)
+    if result is not None:
+        logger.info(f"Resolved update query locally: {user_query!r}")
+        return unpack_support_result(result)
+
+    # Resends of the same text against the same layout reuse the earlier parse
+    cache_key = result_key(user_query, sheet_index.fingerprint, PROMPT_VERSION)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Reusing cached parse for update query: {user_query!r}")
+        return unpack_support_result(cached)
+
+    # Only send the rows and work-type columns the query plausibly refers to
+    sheet_info = prune_sheet_info(sheet_info, user_query, sheet_index)
+
+    try:
+        result = run_support_agent(build_action_prompt(sheet_info, user_query), groq_api_key)
+    except LLMUnavailable as e:
+        logger.warning(f"Update query not resolved, LLM unavailable: {str(e)}")
+        return unpack_support_result(llm_unavailable_result(user_query))
+    except ValueError as e:
+        # Malformed output is rejected locally instead of asking the model again
+        logger.warning(f"Update query not resolved: {str(e)}")
+        return unpack_support_result(unresolved_result(user_query))
+
+    result = repair_support_result(result, sheet_index, user_query)
+    if result.row_index:
+        result_cache.put(cache_key, result)
+    return unpack_support_result(result)
+
+
+def build_logs_prompt(logs_data: list[dict], user_query: str, table: Optional[LogTable] = None) -> str:
+    """
+    Build the log agent prompt for a question.
     
     Optimized to reduce token usage by:
+    - Only including the entries the question is about (see select_relevant_logs)
     - Only including essential fields (date, site_engineer, location, peta_location, updation, update_quantity)
     - Removing newlines and tabs from data
     - Using compact single-line format for each log entry
+    """
+    # Only send the entries the question is about
+    if table is None:
+        table = LogTable.from_logs(logs_data)
+    logs_data = select_relevant_logs(logs_data, user_query, table)
+    
+    # Format the logs data in compact tuple format
+    # Clean data by removing newlines and tabs before formatting
+    logs_entries = []
+    for log in logs_data:
+        # Clean each field and handle None values
+        date = str(log.get('time', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
+        engineer = str(log.get('site_engineer_name', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
+        location = str(log.get('Location', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
+        peta_location = str(log.get('Peta Location', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
+        updation = str(log.get('updation', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
+        quantity = str(log.get('updated_quantity', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
+        
+        # Format as tuple
+        log_entry = f"({date} | {engineer} | {location} | {peta_location} | {updation} | {quantity})"
+        logs_entries.append(log_entry)
+    
+    logs_context = "\n".join(logs_entries)
+    
+    print(logs_context) 
+    print("\n")
+    print("\n")
+    
+    # Create the prompt with clear JSON format instruction
+    return f"""Here are the log entries from the construction site:
+        {logs_context}
+        
+        User's question: {user_query}
+
+        INSTRUCTIONS:
+        - Analyze the log data above
+        - Provide a factual answer based only on the given data
+        - Respond in this EXACT JSON format: {{"result": "your answer"}}
+        - Keep the answer concise and precise
+        - If question is unrelated to logs, respond: {{"result": "You can ask about all construction site updates from the log data"}}
+        """ 
+
+
+def generate_fallback_response(logs_data: list[dict], user_query: str, table: Optional[LogTable] = None,
+                               limit: int = 5) -> str:
+    """Answer without the LLM: the LOG entries most relevant to the question."""
+    if table is None:
+        table = LogTable.from_logs(logs_data)
+    entries = select_relevant_logs(logs_data, user_query, table, limit=limit)
+    if not entries:
+        return "No log entries found to analyze."
+    lines = [
+        f"- {log.get('time', '')}: {log.get('site_engineer_name', '')} updated {log.get('updation', '')} "
+        f"at {log.get('Location', '')} {log.get('Peta Location', '')} (total {log.get('updated_quantity', '')})"
+        for log in entries
+    ]
+    return "I couldn't analyze the logs right now. The most relevant entries are:\n" + "\n".join(lines)
+
+
+def process_logs_query(logs_data: list[dict], user_query: str, site_engineer_name: str, groq_api_key: str,
+                       table: Optional[LogTable] = None) -> str:
+    """
+    Process a query about the logs data.
     
     Args:
         logs_data: List of log entries as dictionaries
         user_query: The user's query about the logs
         site_engineer_name: Name of the user making the query
         groq_api_key: API key for Groq
+        table: Columnar copy of logs_data, built here if not given
         
     Returns:
         str: The response to the user's query
@@ -77,63 +280,61 @@ def process_logs_query(logs_data: list[dict], user_query: str, site_engineer_nam
         if not logs_data:
             return "No log entries found to analyze."
         
-        # Format the logs data in compact tuple format
-        # Clean data by removing newlines and tabs before formatting
-        logs_entries = []
-        for log in logs_data:
-            # Clean each field and handle None values
-            date = str(log.get('time', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
-            engineer = str(log.get('site_engineer_name', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
-            location = str(log.get('Location', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
-            peta_location = str(log.get('Peta Location', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
-            updation = str(log.get('updation', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
-            quantity = str(log.get('updated_quantity', 'N/A') or 'N/A').replace('\n', ' ').replace('\t', ' ').strip()
-            
-            # Format as tuple
-            log_entry = f"({date} | {engineer} | {location} | {peta_location} | {updation} | {quantity})"
-            logs_entries.append(log_entry)
-        
-        # Limit the number of log entries to prevent token overflow
-        # if len(logs_entries) > 50:
-        #     logs_entries = logs_entries[:50]
-        #     logger.info(f"Limited logs to 50 entries for token efficiency")
-        
-        logs_context = "\n".join(logs_entries)
-        
-        print(logs_context) 
-        print("\n")
-        print("\n")
-        
-        # Create the prompt with clear JSON format instruction
-        prompt = f"""Here are the log entries from the construction site:
-        {logs_context}
-        
-        User's question: {user_query}
-
-        INSTRUCTIONS:
-        - Analyze the log data above
-        - Provide a factual answer based only on the given data
-        - Respond in this EXACT JSON format: {{"result": "your answer"}}
-        - Keep the answer concise and precise
-        - If question is unrelated to logs, respond: {{"result": "You can ask about all construction site updates from the log data"}}
-        """ 
-        
-        # Get the response from the agent with error handling
-        agent = get_log_agent(groq_api_key)
+        prompt = build_logs_prompt(logs_data, user_query, table)
         
         # Try to get response with fallback
         try:
-            response = agent.run(prompt)
+            # Get the response from a pooled agent with error handling
+            with agent_pool.checkout("logs", groq_api_key, get_log_agent) as agent:
+                response = llm_scheduler.run(groq_api_key, lambda: agent.run(prompt))
             if response and hasattr(response, 'content') and hasattr(response.content, 'result'):
                 return response.content.result
             # else:
             #     logger.warning("Response structure is invalid, using fallback")
-            #     return generate_fallback_response(logs_data, user_query, site_engineer_name)
+            #     return generate_fallback_response(logs_data, user_query, table)
                 
         except Exception as agent_error:
             logger.error(f"Agent processing failed: {str(agent_error)}")
-            return generate_fallback_response(logs_data, user_query, site_engineer_name)
+            return generate_fallback_response(logs_data, user_query, table)
         
     except Exception as e:
         logger.error(f"Error processing logs query: {str(e)}")
         return "I'm sorry, I encountered an error while processing your request. Please try again later."
+
+
+def stream_logs_query(logs_data: list[dict], user_query: str, groq_api_key: str,
+                      table: Optional[LogTable] = None):
+    """
+    Like process_logs_query, but yields the answer text as the model produces it.
+
+    The streaming agent returns the same {"result": "..."} JSON; the text of
+    "result" is decoded incrementally. If the model doesn't answer in that
+    format, its raw output is yielded once it is complete.
+    """
+    if not logs_data:
+        yield "No log entries found to analyze."
+        return
+
+    streamer = JsonFieldStreamer("result")
+    try:
+        prompt = build_logs_prompt(logs_data, user_query, table)
+        raw_output = []
+        with agent_pool.checkout("logs_stream", groq_api_key, get_log_stream_agent) as agent, \
+                llm_scheduler.stream(groq_api_key):
+            for event in agent.run(prompt, stream=True):
+                if getattr(event, "event", None) == RunEvent.run_error.value:
+                    raise RuntimeError(f"LLM stream failed: {event.content}")
+                if getattr(event, "event", None) != RunEvent.run_response_content.value or not event.content:
+                    continue
+                raw_output.append(str(event.content))
+                text = streamer.feed(str(event.content))
+                if text:
+                    yield text
+        if not streamer.text:
+            yield "".join(raw_output).strip()
+    except Exception as e:
+        logger.error(f"Error streaming logs query: {str(e)}")
+        if not streamer.text:
+            yield generate_fallback_response(logs_data, user_query, table)
+            return
+        yield "I'm sorry, I encountered an error while processing your request. Please try again later."
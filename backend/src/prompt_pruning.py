@@ -0,0 +1,122 @@
+import os
+import threading
+
+from utils.logger import get_logger
+from .sheet_index import SheetIndex
+from .text_utils import tokenize, normalize_text
+
+logger = get_logger(__name__)
+
+# Neighbouring rows (per Location) kept around every matched row, so that a
+# slightly different Peta Location in the query still reaches the model
+ROW_MARGIN = int(os.getenv("PROMPT_ROW_MARGIN", "2"))
+MAX_EXPANDED_RANGE = 500
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text) -> int:
+    """Rough token count for Llama-style tokenizers (~4 characters per token)."""
+    return len(str(text)) // CHARS_PER_TOKEN
+
+
+class PruningMetrics:
+    """Running totals of prompt tokens saved by pruning, shared across requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def record(self, tokens_before: int, tokens_after: int):
+        with self._lock:
+            self.prompts += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+            }
+
+
+pruning_metrics = PruningMetrics()
+
+
+def extract_location_mentions(user_query: str, sheet_index: SheetIndex) -> tuple:
+    """
+    Locations and Peta Locations mentioned in a query.
+
+    Locations are matched exactly (case, punctuation and spacing ignored) against
+    the sheet's known Locations; Peta Locations are every number in the query,
+    with "101 to 105" style ranges expanded.
+    """
+    tokens = [token for token in tokenize(user_query) if token != ","]
+    padded_query = f" {' '.join(tokens)} "
+    locations = {
+        normalize_text(location) for location in sheet_index.locations
+        if f" {normalize_text(location)} " in padded_query
+    }
+
+    peta_locations = set()
+    for i, token in enumerate(tokens):
+        if not token.isdigit():
+            continue
+        peta_locations.add(str(int(token)))
+        if i + 2 < len(tokens) and tokens[i + 1] in ("to", "till", "until", "upto") and tokens[i + 2].isdigit():
+            start, end = int(token), int(tokens[i + 2])
+            if 0 <= end - start <= MAX_EXPANDED_RANGE:
+                peta_locations.update(str(n) for n in range(start, end + 1))
+    return locations, peta_locations
+
+
+def prune_row_index(row_index: dict, user_query: str, sheet_index: SheetIndex, margin: int = ROW_MARGIN) -> dict:
+    """
+    Slice of a {row: (Location, Peta Location)} ROW_INDEX relevant to the query.
+
+    Falls back to the full index when nothing in the query matches, so pruning
+    never hides rows the model would otherwise have found.
+    """
+    locations, peta_locations = extract_location_mentions(user_query, sheet_index)
+    if not peta_locations:
+        return row_index
+
+    rows = list(row_index.items())
+    keep = set()
+    for position, (row, (location, peta_location)) in enumerate(rows):
+        if locations and normalize_text(location) not in locations:
+            continue
+        if normalize_text(peta_location) not in peta_locations:
+            continue
+        # Keep the neighbours within the same Location
+        for neighbour in range(max(0, position - margin), min(len(rows), position + margin + 1)):
+            if normalize_text(rows[neighbour][1][0]) == normalize_text(location):
+                keep.add(neighbour)
+
+    if not keep:
+        return row_index
+    return dict(rows[position] for position in sorted(keep))
+
+
+def prune_sheet_info(sheet_info: dict, user_query: str, sheet_index: SheetIndex) -> dict:
+    """Restrict an update prompt's SHEET DATA to the rows and work-type columns the query refers to."""
+    pruned = dict(sheet_info)
+    pruned["ROW_INDEX"] = prune_row_index(sheet_info["ROW_INDEX"], user_query, sheet_index)
+
+    candidate_columns = sheet_index.work_types.shortlist(user_query)
+    if candidate_columns:
+        pruned["COLUMN_INDEX"] = candidate_columns
+
+    tokens_before = estimate_tokens(sheet_info)
+    tokens_after = estimate_tokens(pruned)
+    pruning_metrics.record(tokens_before, tokens_after)
+    logger.info(
+        f"Pruned prompt sheet data: rows {len(sheet_info['ROW_INDEX'])} -> {len(pruned['ROW_INDEX'])}, "
+        f"columns {len(sheet_info['COLUMN_INDEX'])} -> {len(pruned['COLUMN_INDEX'])}, "
+        f"~{tokens_before - tokens_after} tokens saved"
+    )
+    return pruned
@@ -0,0 +1,198 @@
+import re
+from typing import Optional
+
+from .models import SupportResult
+from .sheet_index import SheetIndex
+from .text_utils import tokenize, normalize_text, display_name
+
+# Longest Peta Location range we expand locally ("101 to 105" -> 5 flats)
+MAX_RANGE_SIZE = 500
+
+NUMBER_RE = re.compile(r"^\d+(?:\.\d+)?$")
+
+RANGE_WORDS = {"to", "till", "until", "through", "upto"}
+LIST_WORDS = {",", "and"}
+FILLER_WORDS = {"from", "peta", "location", "flat", "flats"}
+STATUS_WORDS = {
+    "has", "have", "been", "is", "are", "was", "were", "in", "progress",
+    "done", "completed", "complete", "finished", "ongoing", "started",
+}
+STATUS_VERBS = {"done", "completed", "complete", "finished", "progress", "ongoing", "started"}
+NEGATION_WORDS = {"not", "no", "incomplete", "partially", "partial", "half", "pending"}
+MAX_UNIT_WORDS = 3
+
+
+def _split_list(tokens) -> list:
+    parts, current = [], []
+    for token in tokens:
+        if token in LIST_WORDS:
+            parts.append(current)
+            current = []
+        else:
+            current.append(token)
+    parts.append(current)
+    return parts
+
+
+def _parse_quantities(tokens) -> Optional[list]:
+    """Parse "40, 30 and 50 cubic meter" (the tokens after "by") into integer quantities."""
+    quantities = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if NUMBER_RE.match(token):
+            if "." in token and not float(token).is_integer():
+                return None
+            quantities.append(int(float(token)))
+            i += 1
+            if i < len(tokens) and tokens[i] in LIST_WORDS:
+                i += 1
+                continue
+        break
+    units = tokens[i:]
+    if not quantities or len(units) > MAX_UNIT_WORDS or any(any(c.isdigit() for c in t) and t not in ("m3", "m2") for t in units):
+        return None
+    return quantities
+
+
+def _parse_peta_locations(tokens) -> tuple:
+    """Parse "101 to 105" / "101, 103 and 104" at the start of tokens; returns (peta_locations, rest)."""
+    peta_locations = []
+    i = 0
+    while i < len(tokens) and tokens[i].isdigit():
+        start = int(tokens[i])
+        if i + 2 < len(tokens) and tokens[i + 1] in RANGE_WORDS and tokens[i + 2].isdigit():
+            end = int(tokens[i + 2])
+            if end < start or end - start >= MAX_RANGE_SIZE:
+                return None, tokens
+            peta_locations.extend(str(n) for n in range(start, end + 1))
+            i += 3
+        else:
+            peta_locations.append(tokens[i])
+            i += 1
+        if i + 1 < len(tokens) and tokens[i] in LIST_WORDS and tokens[i + 1].isdigit():
+            i += 1
+    return peta_locations, tokens[i:]
+
+
+def _match_location(tokens, sheet_index: SheetIndex) -> tuple:
+    """Longest known Location at the start of tokens; returns (location, rest)."""
+    best = None
+    for location in sheet_index.locations:
+        location_tokens = normalize_text(location).split()
+        if location_tokens and tokens[:len(location_tokens)] == location_tokens:
+            if best is None or len(location_tokens) > len(best[1]):
+                best = (location, location_tokens)
+    if best is None:
+        return None, tokens
+    return best[0], tokens[len(best[1]):]
+
+
+def _column_error_result(failed, sheet_index: SheetIndex) -> SupportResult:
+    """Empty lists plus the SYSTEM_PROMPT feedback for unknown or ambiguous work types."""
+    feedbacks = []
+    for match in failed:
+        work_type = match.phrase.upper()
+        if match.status == "not_found":
+            feedbacks.append(f"Work type '{work_type}' not found in available columns")
+        else:
+            options = sheet_index.work_types.names(match.columns)
+            feedbacks.append(f"Found {len(options)} matches for '{work_type}'. Please specify which one: {', '.join(options)}")
+    return SupportResult(row_index=[], columns_index=[], updations=[], quantities=[], feedbacks=feedbacks)
+
+
+def parse_update_query(user_query: str, sheet_index: SheetIndex) -> Optional[SupportResult]:
+    """
+    Resolve a well-formed update query without the LLM.
+
+    Handles the shape documented in SYSTEM_PROMPT, e.g.
+    "A building from 101 to 105 Granite kitchen OTTA, Gypsum work completed by 40, 30".
+    Work types are resolved through the sheet's fuzzy WorkTypeMatcher, which also
+    produces the "not found" / "multiple matches" feedback. Only exact headers and
+    confident fuzzy matches are written locally. Returns None whenever the query
+    is outside that grammar or a work type is uncertain (multiple locations,
+    missing quantities, a weak fuzzy match, ...) so the caller can fall back to
+    the agent.
+    """
+    tokens = tokenize(user_query)
+    if not tokens or NEGATION_WORDS.intersection(tokens):
+        return None
+
+    # Quantities: numbers after the first "by" followed by a number, then at most a unit
+    by_positions = [i for i, token in enumerate(tokens[:-1]) if token == "by" and NUMBER_RE.match(tokens[i + 1])]
+    if len(by_positions) != 1:
+        return None
+    head, tail = tokens[:by_positions[0]], tokens[by_positions[0] + 1:]
+    quantities = _parse_quantities(tail)
+    if quantities is None:
+        return None
+
+    # Status: only the exact word "completed" means COM, everything else is WIP
+    status = "COM" if "completed" in tokens else "WIP"
+    status_start = len(head)
+    while status_start > 0 and head[status_start - 1] in STATUS_WORDS:
+        status_start -= 1
+    if STATUS_VERBS.intersection(head[status_start:]):
+        head = head[:status_start]
+
+    # Location, then Peta Location(s)
+    if head[:1] == ["location"]:
+        head = head[1:]
+    location, head = _match_location(head, sheet_index)
+    if location is None:
+        return None
+    while head and head[0] in FILLER_WORDS:
+        head = head[1:]
+    peta_locations, head = _parse_peta_locations(head)
+    if not peta_locations:
+        return None
+    if head[:1] == [","]:
+        head = head[1:]
+
+    # Work types: comma / "and" separated, each resolving to exactly one column
+    work_types = _split_list(head)
+    if not work_types or any(not work_type for work_type in work_types):
+        return None
+    # A second Location means several updates in one message; leave those to the agent
+    padded_head = f" {' '.join(head)} "
+    if any(f" {normalize_text(other)} " in padded_head for other in sheet_index.locations if other != location):
+        return None
+    matches = [sheet_index.work_types.match(" ".join(work_type)) for work_type in work_types]
+    if any(match.status == "uncertain" or (match.resolved and not match.confident) for match in matches):
+        return None
+    failed = [match for match in matches if not match.resolved]
+    if failed:
+        return _column_error_result(failed, sheet_index)
+    columns = [match.columns[0] for match in matches]
+
+    # Quantity distribution per SYSTEM_PROMPT scenarios A-D
+    if len(columns) > 1 and len(quantities) not in (1, len(columns)):
+        return None
+
+    result = SupportResult(row_index=[], columns_index=[], updations=[], quantities=[], feedbacks=[])
+    valid_rows = 0
+    for peta_location in peta_locations:
+        row = sheet_index.find_row(location, peta_location)
+        if row is None:
+            result.feedbacks.append(f"Peta Location {peta_location} not found for Location {location}")
+            continue
+
+        for position, column in enumerate(columns):
+            if len(columns) == 1:
+                quantity = quantities[min(valid_rows, len(quantities) - 1)]
+            elif len(quantities) == 1:
+                quantity = quantities[0]
+            else:
+                quantity = quantities[position]
+
+            work_type_name = display_name(sheet_index.columns[column])
+            result.row_index.append(str(row))
+            result.columns_index.append(column)
+            result.updations.append(status)
+            result.quantities.append(quantity)
+            result.feedbacks.append(
+                f"Location {location}, Peta Location {peta_location} has been updated to {status} for {work_type_name}"
+            )
+        valid_rows += 1
+
+    return result
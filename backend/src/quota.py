@@ -0,0 +1,160 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Requests per minute as (per project, per user); 0 disables that bucket.
+# Defaults are Google's standard Sheets quotas; Drive has no read/write split.
+QUOTA_LIMITS = {
+    ("sheets", "read"): (
+        float(os.getenv("SHEETS_READS_PER_MINUTE", "300")),
+        float(os.getenv("SHEETS_USER_READS_PER_MINUTE", "60")),
+    ),
+    ("sheets", "write"): (
+        float(os.getenv("SHEETS_WRITES_PER_MINUTE", "300")),
+        float(os.getenv("SHEETS_USER_WRITES_PER_MINUTE", "60")),
+    ),
+    ("drive", "read"): (
+        float(os.getenv("DRIVE_REQUESTS_PER_MINUTE", "12000")),
+        float(os.getenv("DRIVE_USER_REQUESTS_PER_MINUTE", "12000")),
+    ),
+}
+QUOTA_LIMITS[("drive", "write")] = QUOTA_LIMITS[("drive", "read")]
+# Seconds of quota a bucket can spend at once
+QUOTA_BURST_SECONDS = float(os.getenv("QUOTA_BURST_SECONDS", "10"))
+
+# Retries of a request rejected with 429 (or 5xx, when it is safe to repeat)
+QUOTA_MAX_RETRIES = int(os.getenv("GOOGLE_API_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 32.0
+
+_priority = threading.local()
+
+
+@contextmanager
+def background_priority():
+    """Calls made inside the block yield quota to interactive requests."""
+    previous = getattr(_priority, "value", INTERACTIVE)
+    _priority.value = BACKGROUND
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+
+def current_priority() -> int:
+    return getattr(_priority, "value", INTERACTIVE)
+
+
+class TokenBucket:
+    """Refills at `per_minute / 60` tokens per second up to `burst_seconds` worth of tokens."""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self, now):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class QuotaScheduler:
+    """
+    Token buckets for Google API quotas, per project (this server's OAuth
+    client) and per user, with separate read and write buckets.
+
+    acquire() waits until every bucket the call counts against has a token.
+    Background callers only take a token when no interactive caller is waiting,
+    so queued interactive requests go first. throttle() empties the buckets of
+    a call rejected with 429, so concurrent callers back off with it instead of
+    tripping the quota again.
+    """
+
+    def __init__(self, limits: dict, burst_seconds: float = QUOTA_BURST_SECONDS, max_users: int = 4096):
+        self.limits = limits
+        self.burst_seconds = burst_seconds
+        self.max_users = max_users
+        self._buckets = {}
+        self._condition = threading.Condition()
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def _bucket(self, key, per_minute):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                # Full buckets carry no state worth keeping
+                now = time.monotonic()
+                for stale in [k for k, b in self._buckets.items() if b.wait_time(now) == 0 and b.tokens >= b.capacity]:
+                    del self._buckets[stale]
+            bucket = self._buckets[key] = TokenBucket(per_minute, self.burst_seconds)
+        return bucket
+
+    def _buckets_for(self, dependency, kind, user) -> list:
+        project_limit, user_limit = self.limits.get((dependency, kind), (0, 0))
+        buckets = []
+        if project_limit > 0:
+            buckets.append(self._bucket((dependency, kind, None), project_limit))
+        if user_limit > 0 and user is not None:
+            buckets.append(self._bucket((dependency, kind, user), user_limit))
+        return buckets
+
+    def acquire(self, dependency: str, kind: str, user: Optional[str] = None, priority: int = INTERACTIVE):
+        with self._condition:
+            buckets = self._buckets_for(dependency, kind, user)
+            if not buckets:
+                return
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(bucket.wait_time(now) for bucket in buckets)
+                    yield_to_interactive = priority == BACKGROUND and self._waiting[INTERACTIVE] > 0
+                    if wait == 0 and not yield_to_interactive:
+                        for bucket in buckets:
+                            bucket.take()
+                        return
+                    self._condition.wait(timeout=wait or 0.05)
+            finally:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def throttle(self, dependency: str, kind: str, user: Optional[str] = None):
+        with self._condition:
+            now = time.monotonic()
+            for bucket in self._buckets_for(dependency, kind, user):
+                bucket.drain(now)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+quota_scheduler = QuotaScheduler(QUOTA_LIMITS)
@@ -0,0 +1,146 @@
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Rows a sparse block may skip between two of its rows; DPR sheets put one
+# empty spacer row under every data row
+MAX_SPACER_ROWS = 3
+
+
+def _runs(cells) -> list:
+    """
+    Split cell coordinates into runs of adjacent cells: consecutive rows of one
+    column first, then the remaining single cells by consecutive columns of one row.
+    """
+    def split(keys, along):
+        runs, run = [], []
+        for key in sorted(keys, key=lambda key: (key[1 - along], key[along])):
+            if run and key[1 - along] == run[-1][1 - along] and key[along] == run[-1][along] + 1:
+                run.append(key)
+            else:
+                if run:
+                    runs.append(run)
+                run = [key]
+        if run:
+            runs.append(run)
+        return runs
+
+    column_runs = split(cells, along=0)
+    runs = [run for run in column_runs if len(run) > 1]
+    singles = [run[0] for run in column_runs if len(run) == 1]
+    return runs + split(singles, along=1)
+
+
+def _sparse_blocks(runs) -> list:
+    """
+    Group row runs (single cells included) that cover the same columns and are
+    at most MAX_SPACER_ROWS apart, so a run per data row of a DPR sheet can be
+    written with one request. Column runs stay on their own.
+    """
+    blocks, open_blocks = [], {}
+    for run in sorted(runs, key=lambda run: (run[0][1], run[-1][1], run[0][0])):
+        span = (run[0][1], run[-1][1])
+        block = open_blocks.get(span)
+        if run[0][0] == run[-1][0] and block and run[0][0] - block[-1][0][0] <= MAX_SPACER_ROWS + 1:
+            block.append(run)
+            continue
+        block = [run]
+        blocks.append(block)
+        if run[0][0] == run[-1][0]:
+            open_blocks[span] = block
+    return blocks
+
+
+def _grid_range(sheet_id, run) -> dict:
+    return {
+        'sheetId': sheet_id,
+        'startRowIndex': run[0][0],
+        'endRowIndex': run[-1][0] + 1,
+        'startColumnIndex': run[0][1],
+        'endColumnIndex': run[-1][1] + 1
+    }
+
+
+def _format_segments(cells, run) -> list:
+    """Split a run wherever the cell format changes."""
+    segments = [[run[0]]]
+    for key in run[1:]:
+        if cells[key][1] == cells[segments[-1][-1]][1]:
+            segments[-1].append(key)
+        else:
+            segments.append([key])
+    return segments
+
+
+def compact_cell_requests(sheet_id, cells: dict, format_fields: str) -> list:
+    """
+    batchUpdate requests writing `cells` ({(row, column): (userEnteredValue,
+    userEnteredFormat)}, 0-based) with as few and as small requests as possible.
+
+    Adjacent cells sharing a format are grouped into runs. A run of identical
+    cells becomes one repeatCell; otherwise the run gets one repeatCell for the
+    shared format and one updateCells carrying only the values. Runs over the
+    same columns of nearby rows (the same work types of several flats, with
+    spacer rows in between) are written together by one updateCells that
+    skips the rows in between. Each cell appears once, so repeated writes are
+    deduplicated by the caller's dict (last write wins).
+    """
+    requests = []
+    runs = []
+    for block in _sparse_blocks(_runs(cells)):
+        if len(block) == 1:
+            runs.extend(_format_segments(cells, block[0]))
+            continue
+        # Rows of one block are separated by rows we must not touch: write from
+        # a start cell with empty RowData for those rows, each cell carrying its
+        # own format
+        rows = {run[0][0]: run for run in block}
+        first_row, last_row = block[0][0][0], block[-1][0][0]
+        requests.append({
+            'updateCells': {
+                'start': {'sheetId': sheet_id, 'rowIndex': first_row, 'columnIndex': block[0][0][1]},
+                'rows': [
+                    {'values': [{'userEnteredValue': cells[key][0], 'userEnteredFormat': cells[key][1]}
+                                for key in rows[row]]} if row in rows else {}
+                    for row in range(first_row, last_row + 1)
+                ],
+                'fields': f'userEnteredValue,{format_fields}'
+            }
+        })
+
+    for run in runs:
+        values = [cells[key][0] for key in run]
+        cell_format = cells[run[0]][1]
+        grid_range = _grid_range(sheet_id, run)
+
+        if all(value == values[0] for value in values):
+            requests.append({
+                'repeatCell': {
+                    'range': grid_range,
+                    'cell': {'userEnteredValue': values[0], 'userEnteredFormat': cell_format},
+                    'fields': f'userEnteredValue,{format_fields}'
+                }
+            })
+            continue
+
+        vertical = run[0][1] == run[1][1]
+        cell_data = [{'userEnteredValue': value} for value in values]
+        requests.extend([
+            {
+                'repeatCell': {
+                    'range': grid_range,
+                    'cell': {'userEnteredFormat': cell_format},
+                    'fields': format_fields
+                }
+            },
+            {
+                'updateCells': {
+                    'range': grid_range,
+                    'rows': [{'values': [cell]} for cell in cell_data] if vertical else [{'values': cell_data}],
+                    'fields': 'userEnteredValue'
+                }
+            }
+        ])
+
+    logger.debug(f"Compacted {len(cells)} cell writes into {len(requests)} requests")
+    return requests
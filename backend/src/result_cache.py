@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utils.logger import get_logger
+from .models import SupportResult
+from .sheet_index import normalize_key
+
+logger = get_logger(__name__)
+
+
+def result_key(user_query: str, fingerprint: str, prompt_version: str) -> str:
+    """Cache key for an update query against a sheet layout and prompt version."""
+    raw = "\0".join((prompt_version, fingerprint, normalize_key(user_query)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU/TTL cache of parsed update queries (SupportResult) from the support agent.
+
+    When `path` is set, entries are also persisted as JSON so a restart (or a
+    resend on the next day) doesn't pay the LLM round trip again. Expiry uses
+    wall-clock time for that reason.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 7 * 86400, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def get(self, key: str) -> Optional[SupportResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return result.model_copy(deep=True)
+
+    def put(self, key: str, result: SupportResult):
+        with self._lock:
+            self._entries[key] = (time.time(), result.model_copy(deep=True))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.path:
+                self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable result cache {self.path}: {str(e)}")
+            return
+
+        now = time.time()
+        for key, entry in stored.items():
+            if now - entry["stored_at"] < self.ttl:
+                self._entries[key] = (entry["stored_at"], SupportResult.model_validate(entry["result"]))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self):
+        stored = {
+            key: {"stored_at": stored_at, "result": result.model_dump()}
+            for key, (stored_at, result) in self._entries.items()
+        }
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not persist result cache to {self.path}: {str(e)}")
+
+
+result_cache = ResultCache(
+    max_entries=int(os.getenv("LLM_RESULT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("LLM_RESULT_CACHE_TTL_SECONDS", str(7 * 86400))),
+    path=os.getenv("LLM_RESULT_CACHE_PATH") or None,
+)
@@ -0,0 +1,169 @@
+import json
+import re
+from typing import Optional
+
+from utils.logger import get_logger
+from .models import SupportResult
+from .sheet_index import SheetIndex
+from .text_utils import display_name
+
+logger = get_logger(__name__)
+
+JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _quantity(value) -> int:
+    number = float(str(value).strip())
+    if not number.is_integer() or number < 0:
+        raise ValueError(f"Invalid quantity {value!r}")
+    return int(number)
+
+
+def coerce_support_result(content) -> Optional[SupportResult]:
+    """
+    SupportResult from agent output that may already be one, a dict, or JSON
+    text around it (when structured output parsing failed); None if unusable.
+    """
+    if isinstance(content, SupportResult):
+        return content
+    if isinstance(content, str):
+        match = JSON_OBJECT_RE.search(content)
+        if match is None:
+            return None
+        try:
+            content = json.loads(match.group(0))
+        except ValueError:
+            return None
+    if not isinstance(content, dict):
+        return None
+    try:
+        return SupportResult(
+            row_index=[str(value).strip() for value in _as_list(content.get("row_index"))],
+            columns_index=[str(value).strip() for value in _as_list(content.get("columns_index"))],
+            updations=[str(value).strip() for value in _as_list(content.get("updations"))],
+            quantities=[_quantity(value) for value in _as_list(content.get("quantities"))],
+            feedbacks=[str(value) for value in _as_list(content.get("feedbacks"))],
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+def unresolved_result(user_query: str, feedbacks: Optional[list] = None) -> SupportResult:
+    """No updates; keeps the agent's feedback when it gave any."""
+    return SupportResult(
+        row_index=[], columns_index=[], updations=[], quantities=[],
+        feedbacks=feedbacks or [
+            f"I couldn't match '{user_query}' to the sheet. "
+            "Please check the location, peta location and work type."
+        ]
+    )
+
+
+def _column_letter(value: str, sheet_index: SheetIndex) -> Optional[str]:
+    """A COLUMN_INDEX letter, also accepting the column's header in its place."""
+    letter = value.strip().upper()
+    if letter in sheet_index.columns:
+        return letter
+    return sheet_index.column_letter(value)
+
+
+def _per_item(values: list, columns: list, work_types: Optional[list]) -> Optional[list]:
+    """
+    Spread updations / quantities over the items per SYSTEM_PROMPT scenarios A-D;
+    None when they can't be matched up.
+    """
+    size = len(columns)
+    if len(values) == size:
+        return values
+    if len(values) == 1:
+        # A / C: one value for every row and work type
+        return values * size
+    if work_types and len(values) == len(work_types):
+        # D: matched with the work types by position
+        position = {column: i for i, column in enumerate(work_types)}
+        return [values[position[column]] for column in columns]
+    if values and len(set(columns)) == 1:
+        # B: one work type, quantities in row order; repeat the last, drop extras
+        return (values + [values[-1]] * size)[:size]
+    return None
+
+
+def repair_support_result(result: SupportResult, sheet_index: SheetIndex, user_query: str) -> SupportResult:
+    """
+    Check agent output against the sheet and fix what can be fixed locally.
+
+    Lists of unequal length are broadcast per the SYSTEM_PROMPT scenarios (a
+    single row, work type, status or quantity applies to every item; several
+    distinct rows and work types combine as rows x work types). Rows missing
+    from the sheet and unknown columns are dropped with feedback, headers given
+    in place of column letters are mapped to their letters, and repeated
+    (row, column) items are kept once. Output that can't be matched up is
+    rejected: no updates, and the agent's feedback (or ours) for the user.
+    """
+    rows = [row.strip() for row in result.row_index]
+    columns = list(result.columns_index)
+    if not rows and not columns:
+        return unresolved_result(user_query, result.feedbacks)
+
+    work_types = None
+    if len(rows) == len(columns) or len(rows) == 1 or len(columns) == 1:
+        size = max(len(rows), len(columns))
+        rows = rows * size if len(rows) == 1 else rows
+        columns = columns * size if len(columns) == 1 else columns
+    elif len(set(rows)) == len(rows) and len(set(columns)) == len(columns):
+        # C / D: every row gets every work type
+        work_types = columns
+        rows, columns = [row for row in rows for _ in work_types], work_types * len(rows)
+    if not rows or len(rows) != len(columns):
+        logger.warning(f"Rejected agent output with {len(result.row_index)} rows and {len(result.columns_index)} columns")
+        return unresolved_result(user_query, result.feedbacks)
+
+    updations = _per_item(
+        ["COM" if update.strip().upper() in ("COM", "COMPLETED") else "WIP" for update in result.updations] or ["WIP"],
+        columns, work_types
+    )
+    quantities = _per_item(list(result.quantities), columns, work_types)
+    if updations is None or quantities is None:
+        logger.warning(f"Rejected agent output: {len(result.updations)} updations / {len(result.quantities)} "
+                       f"quantities for {len(rows)} items")
+        return unresolved_result(user_query, result.feedbacks)
+
+    repaired = SupportResult(row_index=[], columns_index=[], updations=[], quantities=[], feedbacks=[])
+    problems = []
+    seen = set()
+    for row, column, update, quantity in zip(rows, columns, updations, quantities):
+        if not row.isdigit() or int(row) not in sheet_index.rows:
+            problems.append(f"Row {row} not found in the sheet")
+            continue
+        letter = _column_letter(column, sheet_index)
+        if letter is None:
+            problems.append(f"Work type '{column}' not found in available columns")
+            continue
+        if (row, letter) in seen:
+            continue
+        seen.add((row, letter))
+        repaired.row_index.append(row)
+        repaired.columns_index.append(letter)
+        repaired.updations.append(update)
+        repaired.quantities.append(quantity)
+
+    if result.feedbacks:
+        repaired.feedbacks = list(result.feedbacks)
+    else:
+        for row, letter, update in zip(repaired.row_index, repaired.columns_index, repaired.updations):
+            location, peta_location = sheet_index.location_of(row)
+            work_type = display_name(sheet_index.columns[letter])
+            repaired.feedbacks.append(
+                f"Location {location}, Peta Location {peta_location} has been updated to {update} for {work_type}"
+            )
+    repaired.feedbacks.extend(dict.fromkeys(problems))
+
+    if repaired != result:
+        logger.info(f"Repaired agent output for {user_query!r}: {len(result.row_index)} -> {len(repaired.row_index)} items")
+    return repaired
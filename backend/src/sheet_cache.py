@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from utils.logger import get_logger
+from .sheet_index import SheetIndex, build_sheet_index
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class SheetSnapshot:
+    """The compiled index of a fetched sheet plus the revision marker it was fetched at."""
+    spreadsheet_id: str
+    sheet_name: str
+    index: SheetIndex
+    revision: Optional[str]
+    fetched_at: float
+    # Last time each user's credentials confirmed the snapshot (user key -> monotonic time)
+    validated_at: dict = field(default_factory=dict)
+    derived: dict = field(default_factory=dict)
+
+    def derive(self, key: str, builder: Callable[[SheetIndex], Any]) -> Any:
+        """Return `builder(index)`, computed once per snapshot."""
+        if key not in self.derived:
+            self.derived[key] = builder(self.index)
+        return self.derived[key]
+
+
+class SheetSnapshotCache:
+    """
+    In-process cache of sheet snapshots keyed by (spreadsheet_id, sheet_name).
+
+    Snapshots are shared, but each user is only served one after a call made
+    with their own credentials confirmed it:
+    - Within `revalidate_after` seconds of that, it is served without any API call
+    - After that, `fetch_revision` (e.g. Drive modifiedTime) is compared with the
+      stored marker; when it changed or can't be read, `fetch_layout` (a narrow
+      read of the header row and row descriptor columns) decides whether the
+      index still holds, and the full grid is only refetched when it doesn't
+    - Snapshots older than `max_age` are always refetched
+    """
+
+    def __init__(self, revalidate_after: float = 5.0, max_age: float = 600.0, max_entries: int = 64):
+        self.revalidate_after = revalidate_after
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, SheetSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _validated(self, snapshot: SheetSnapshot, user: str) -> SheetSnapshot:
+        now = time.monotonic()
+        for other, validated_at in list(snapshot.validated_at.items()):
+            if now - validated_at >= self.revalidate_after:
+                snapshot.validated_at.pop(other, None)
+        snapshot.validated_at[user] = now
+        return snapshot
+
+    def get(
+        self,
+        spreadsheet_id: str,
+        sheet_name: str,
+        user: str,
+        fetch_values: Callable[[], list],
+        fetch_revision: Callable[[], Optional[str]],
+        fetch_layout: Callable[[SheetIndex], Optional[str]],
+    ) -> SheetSnapshot:
+        """
+        Snapshot of the sheet for `user` (an opaque per-credentials key).
+
+        fetch_layout(index) returns the fingerprint of the sheet's current
+        layout read the way `index` was laid out, or None if it can't tell.
+        """
+        key = (spreadsheet_id, sheet_name)
+        now = time.monotonic()
+
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+
+        if snapshot is not None and now - snapshot.fetched_at < self.max_age:
+            if now - snapshot.validated_at.get(user, float("-inf")) < self.revalidate_after:
+                return snapshot
+
+            revision = fetch_revision()
+            if revision is not None and revision == snapshot.revision:
+                return self._validated(snapshot, user)
+            # Changed (e.g. by our own cell writes) or unreadable revision:
+            # keep the snapshot if the layout it was built from is unchanged
+            if fetch_layout(snapshot.index) == snapshot.index.fingerprint:
+                snapshot.revision = revision
+                return self._validated(snapshot, user)
+        else:
+            revision = fetch_revision()
+
+        logger.info(f"Fetching sheet grid for {spreadsheet_id}/{sheet_name} (revision {revision})")
+        index = build_sheet_index(fetch_values())
+        fetched_at = time.monotonic()
+        snapshot = SheetSnapshot(
+            spreadsheet_id=spreadsheet_id,
+            sheet_name=sheet_name,
+            index=index,
+            revision=revision,
+            fetched_at=fetched_at,
+            validated_at={user: fetched_at},
+        )
+
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return snapshot
+
+    def invalidate(self, spreadsheet_id: str, sheet_name: Optional[str] = None):
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == spreadsheet_id and (sheet_name is None or key[1] == sheet_name):
+                    del self._entries[key]
+
+
+snapshot_cache = SheetSnapshotCache(
+    revalidate_after=float(os.getenv("SHEET_SNAPSHOT_REVALIDATE_SECONDS", "5")),
+    max_age=float(os.getenv("SHEET_SNAPSHOT_MAX_AGE_SECONDS", "600")),
+)
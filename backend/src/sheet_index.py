@@ -0,0 +1,170 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Optional
+
+from .work_type_matcher import WorkTypeMatcher
+
+MAX_CONSECUTIVE_EMPTY_ROWS = 4
+
+
+def column_letter_to_number(col_letter):
+    """Convert column letter(s) to 0-based column number.
+
+    Examples:
+    A -> 0, B -> 1, Z -> 25, AA -> 26, AB -> 27, etc.
+    """
+    col_letter = col_letter.upper()
+    result = 0
+    for char in col_letter:
+        result = result * 26 + (ord(char) - ord('A') + 1)
+    return result - 1
+
+
+def column_number_to_letter(col_number):
+    """Convert a 0-based column number to column letter(s) (inverse of column_letter_to_number)."""
+    letters = ""
+    col_number += 1
+    while col_number > 0:
+        col_number, remainder = divmod(col_number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def normalize_key(value) -> str:
+    """Normalize a Location / Peta Location cell for exact lookups (case and spacing only)."""
+    return " ".join(str(value).split()).casefold()
+
+
+def _cell(row, idx):
+    if idx is None or idx >= len(row):
+        return ""
+    value = row[idx]
+    return value if isinstance(value, str) else str(value)
+
+
+@dataclass
+class SheetIndex:
+    """
+    Compiled view of a DPR sheet layout, built once per snapshot.
+
+    Row 2 is the header row. Headers up to the first empty cell describe a row
+    (Location, Sub Location, Peta Location, Category); the non-empty headers after
+    it are the work-type columns. Data rows start at sheet row 3 and end after
+    MAX_CONSECUTIVE_EMPTY_ROWS empty rows.
+    """
+    headers: list = field(default_factory=list)
+    rows: dict = field(default_factory=dict)
+    columns: dict = field(default_factory=dict)
+    locations: list = field(default_factory=list)
+    location_col: Optional[int] = None
+    peta_location_col: Optional[int] = None
+    has_data: bool = False
+    _row_lookup: dict = field(default_factory=dict, repr=False)
+    _header_lookup: dict = field(default_factory=dict, repr=False)
+
+    def find_row(self, location, peta_location) -> Optional[int]:
+        """Sheet row number for an exact (Location, Peta Location) pair, ignoring case and spacing."""
+        return self._row_lookup.get((normalize_key(location), normalize_key(peta_location)))
+
+    def column_header(self, col_letter) -> Optional[str]:
+        return self.columns.get(col_letter.upper())
+
+    def column_letter(self, header) -> Optional[str]:
+        return self._header_lookup.get(normalize_key(header))
+
+    @cached_property
+    def work_types(self) -> WorkTypeMatcher:
+        """Fuzzy work-type index over COLUMN_INDEX, built on first use."""
+        return WorkTypeMatcher(self.columns)
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Hash of the layout (row descriptors and work-type columns); cell values don't affect it."""
+        layout = json.dumps([self.headers, self.rows, self.columns], sort_keys=True, default=str)
+        return hashlib.sha256(layout.encode("utf-8")).hexdigest()
+
+    def row_cells(self, row_number) -> list:
+        """Cells before the breakpoint for a data row, padded to the header width."""
+        row = self.rows.get(int(row_number))
+        if row is None:
+            return [""] * len(self.headers)
+        return [row.get(header, "") for header in self.headers]
+
+    def location_of(self, row_number) -> tuple:
+        row = self.rows.get(int(row_number), {})
+        return (
+            row.get(self.headers[self.location_col], "").strip() if self.location_col is not None else "",
+            row.get(self.headers[self.peta_location_col], "").strip() if self.peta_location_col is not None else "",
+        )
+
+    def to_sheet_info(self) -> dict:
+        """ROW_INDEX / COLUMN_INDEX in the shape returned by /api/get-sheet-info."""
+        return {
+            "status": "success",
+            "ROW_INDEX": self.rows,
+            "COLUMN_INDEX": self.columns
+        }
+
+    def to_location_index(self) -> dict:
+        """ROW_INDEX as {row: (Location, Peta Location)}, the compact shape used in update prompts."""
+        return {str(row): self.location_of(row) for row in self.rows
+                if any(self.location_of(row))}
+
+
+def build_sheet_index(values) -> SheetIndex:
+    """Parse a sheet grid (as returned by values().get) into a SheetIndex."""
+    index = SheetIndex()
+    if not values or len(values) < 2:
+        return index
+    index.has_data = True
+
+    # Step 1: Header row (second row in the sheet), detect breakpoint (first empty cell)
+    header_row = [_cell(values[1], i) for i in range(len(values[1]))]
+    breakpoint_index = len(header_row)
+    for i, col in enumerate(header_row):
+        if col.strip() == "":
+            breakpoint_index = i
+            break
+
+    index.headers = header_row[:breakpoint_index]
+    for idx, header in enumerate(index.headers):
+        if header.strip().lower() == 'location':
+            index.location_col = idx
+        elif header.strip().lower() == 'peta location':
+            index.peta_location_col = idx
+
+    # Step 2: ROW_INDEX data, stopping at consecutive empty rows
+    empty_row_count = 0
+    for row_number, row in enumerate(values[2:], start=3):  # start=3 to match sheet row numbers
+        cells = [_cell(row, i) for i in range(breakpoint_index)]
+        if all(cell.strip() == "" for cell in cells):
+            empty_row_count += 1
+            if empty_row_count >= MAX_CONSECUTIVE_EMPTY_ROWS:
+                break
+            continue
+        empty_row_count = 0
+
+        index.rows[row_number] = dict(zip(index.headers, cells))
+        location, peta_location = index.location_of(row_number)
+        if location or peta_location:
+            # First occurrence wins, matching a top-down scan of the sheet
+            index._row_lookup.setdefault((normalize_key(location), normalize_key(peta_location)), row_number)
+        if location and location not in index.locations:
+            index.locations.append(location)
+
+    # Step 3: COLUMN_INDEX data (after breakpoint until empty after non-empty found)
+    found_non_empty = False
+    for i in range(breakpoint_index, len(header_row)):
+        col_name = header_row[i]
+        if col_name.strip() != "":
+            found_non_empty = True
+            letter = column_number_to_letter(i)
+            index.columns[letter] = col_name
+            index._header_lookup.setdefault(normalize_key(col_name), letter)
+        elif found_non_empty:
+            # Stop only if we already started collecting column headers
+            break
+
+    return index
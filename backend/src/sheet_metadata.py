@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+METADATA_FIELDS = "sheets(properties(sheetId,title,gridProperties(rowCount,columnCount)))"
+
+
+@dataclass
+class SheetProperties:
+    sheet_id: int
+    title: str
+    row_count: int = 0
+    column_count: int = 0
+
+
+@dataclass
+class SpreadsheetMetadata:
+    sheets: dict
+    fetched_at: float
+    # Per-spreadsheet facts verified while this entry is valid (e.g. LOG headers present)
+    flags: set = field(default_factory=set)
+    # Last non-empty LOG row, when known from a read or our own appends
+    log_last_row: Optional[int] = None
+
+    @property
+    def titles(self) -> list:
+        return list(self.sheets)
+
+
+def _parse_sheets(response) -> dict:
+    sheets = {}
+    for sheet in response.get('sheets', []):
+        properties = sheet.get('properties', {})
+        grid = properties.get('gridProperties', {})
+        sheets[properties['title']] = SheetProperties(
+            sheet_id=properties['sheetId'],
+            title=properties['title'],
+            row_count=grid.get('rowCount', 0),
+            column_count=grid.get('columnCount', 0),
+        )
+    return sheets
+
+
+class SpreadsheetMetadataCache:
+    """
+    TTL cache of {title -> sheetId, grid size} per spreadsheet.
+
+    Populated with a single spreadsheets().get restricted by a fields mask and
+    updated in place when we add sheets (QNT, LOG) ourselves.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, service, spreadsheet_id) -> SpreadsheetMetadata:
+        with self._lock:
+            entry = self._entries.get(spreadsheet_id)
+        if entry is not None and time.monotonic() - entry.fetched_at < self.ttl:
+            return entry
+
+        response = service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields=METADATA_FIELDS
+        ).execute()
+        entry = SpreadsheetMetadata(sheets=_parse_sheets(response), fetched_at=time.monotonic())
+        with self._lock:
+            self._entries[spreadsheet_id] = entry
+        return entry
+
+    def sheet(self, service, spreadsheet_id, title) -> Optional[SheetProperties]:
+        return self.get(service, spreadsheet_id).sheets.get(title)
+
+    def record_sheet(self, spreadsheet_id, properties: dict):
+        """Add a sheet from an addSheet reply to the cached entry, if any."""
+        with self._lock:
+            entry = self._entries.get(spreadsheet_id)
+            if entry is None:
+                return
+            grid = properties.get('gridProperties', {})
+            entry.sheets[properties['title']] = SheetProperties(
+                sheet_id=properties['sheetId'],
+                title=properties['title'],
+                row_count=grid.get('rowCount', 0),
+                column_count=grid.get('columnCount', 0),
+            )
+
+    def record_log_rows(self, spreadsheet_id, last_row: int):
+        """Remember the last LOG row after an append (rows only ever grow)."""
+        with self._lock:
+            entry = self._entries.get(spreadsheet_id)
+            if entry is not None and entry.log_last_row is not None:
+                entry.log_last_row = max(entry.log_last_row, last_row)
+
+    def invalidate(self, spreadsheet_id):
+        with self._lock:
+            self._entries.pop(spreadsheet_id, None)
+
+
+metadata_cache = SpreadsheetMetadataCache(
+    ttl=float(os.getenv("SPREADSHEET_METADATA_TTL_SECONDS", "300"))
+)
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import re
+
+from .concurrency import run_blocking
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Keep proxies (nginx, Cloud Run front ends) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_blocking(func, *args, **kwargs):
+    """
+    Run `func(*args, emit=emit, **kwargs)` on the blocking pool and yield
+    server-sent events: one per `emit(event, data)` call made by func, then a
+    final "result" event with its return value (or "error" if it raised).
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def emit(event, data=None):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data if data is not None else {}))
+
+    async def produce():
+        try:
+            result = await run_blocking(func, *args, emit=emit, **kwargs)
+            queue.put_nowait(("result", result))
+        except Exception as e:
+            queue.put_nowait(("error", {"detail": f"An error occurred: {str(e)}"}))
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield sse_event(*item)
+    finally:
+        await task
+
+
+class JsonFieldStreamer:
+    """
+    Extracts the text of one string field from JSON that arrives in pieces,
+    e.g. the "result" of {"result": "..."} while the model is still producing it.
+    """
+
+    def __init__(self, field: str = "result"):
+        self._start_re = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._position = None
+        self.done = False
+        self.text = ""
+
+    def feed(self, chunk: str) -> str:
+        """Add raw model output; returns the newly decoded part of the field."""
+        self._buffer += chunk
+        if self._position is None:
+            match = self._start_re.search(self._buffer)
+            if match is None:
+                return ""
+            self._position = match.end()
+
+        decoded = []
+        buffer, i = self._buffer, self._position
+        while i < len(buffer) and not self.done:
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+            elif char == "\\":
+                if i + 1 >= len(buffer):
+                    break
+                if buffer[i + 1] == "u":
+                    if i + 6 > len(buffer):
+                        break
+                    try:
+                        decoded.append(chr(int(buffer[i + 2:i + 6], 16)))
+                    except ValueError:
+                        decoded.append(buffer[i:i + 6])
+                    i += 6
+                    continue
+                decoded.append({"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+            else:
+                decoded.append(char)
+            i += 1
+        self._position = i
+        text = "".join(decoded)
+        self.text += text
+        return text
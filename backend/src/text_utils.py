@@ -0,0 +1,20 @@
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|,")
+DIGIT_RANGE_RE = re.compile(r"(\d)\s*-\s*(\d)")
+
+
+def tokenize(text) -> list:
+    """Lowercase word/number tokens; commas are kept as list separators, other punctuation is dropped."""
+    text = DIGIT_RANGE_RE.sub(r"\1 to \2", str(text).lower())
+    return TOKEN_RE.findall(text)
+
+
+def normalize_text(text) -> str:
+    """Canonical form used to compare work types and locations (case, punctuation and spacing ignored)."""
+    return " ".join(token for token in tokenize(text) if token != ",")
+
+
+def display_name(header) -> str:
+    """Single-line form of a multi-line sheet header."""
+    return " ".join(str(header).split())
@@ -0,0 +1,202 @@
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from .text_utils import normalize_text, display_name
+
+# A fuzzy match is accepted when it scores at least ACCEPT_SCORE and beats the
+# runner-up by AMBIGUITY_MARGIN; candidates within the margin are ambiguous.
+# Below REJECT_SCORE the work type is reported as not found. Scores measure how
+# well the phrase's words are found in a header; how much of the header they
+# cover only orders candidates, so a phrase shared by several headers (e.g.
+# "granite") is never resolved to the shortest of them.
+ACCEPT_SCORE = 0.78
+# Fuzzy matches written without asking the LLM or the user must score this much
+CONFIDENT_SCORE = 0.85
+REJECT_SCORE = 0.45
+AMBIGUITY_MARGIN = 0.08
+TOKEN_MATCH_SCORE = 0.6
+SHORTLIST_SIZE = int(os.getenv("WORK_TYPE_SHORTLIST_SIZE", "12"))
+TRAILING_WORDS = {"work", "works"}
+
+
+@lru_cache(maxsize=65536)
+def token_similarity(a: str, b: str) -> float:
+    """1 - normalized optimal-string-alignment distance (typos and transpositions cost 1)."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    longest = max(len(a), len(b))
+    if abs(len(a) - len(b)) > longest // 2:
+        return 0.0
+
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return 1.0 - previous[len(b)] / longest
+
+
+def _ngrams(text: str, n: int = 3) -> set:
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+@dataclass
+class WorkTypeColumn:
+    letter: str
+    header: str
+    name: str
+    normalized: str
+    tokens: list
+    ngrams: set
+
+
+@dataclass
+class WorkTypeMatch:
+    """
+    Outcome of matching one work type phrase.
+
+    status is "exact" or "fuzzy" (columns holds the single resolved letter),
+    "ambiguous" (columns holds every tied candidate), "not_found", or
+    "uncertain" when only the LLM can decide; candidates is the ranked shortlist.
+    """
+    phrase: str
+    status: str
+    columns: list = field(default_factory=list)
+    candidates: list = field(default_factory=list)
+
+    @property
+    def resolved(self) -> bool:
+        return self.status in ("exact", "fuzzy")
+
+    @property
+    def confident(self) -> bool:
+        """Safe to write without confirmation: an exact header, or a fuzzy match scoring CONFIDENT_SCORE."""
+        return self.status == "exact" or (self.status == "fuzzy" and self.candidates[0][1] >= CONFIDENT_SCORE)
+
+
+class WorkTypeMatcher:
+    """In-memory fuzzy index over a sheet's COLUMN_INDEX, built once per sheet snapshot."""
+
+    def __init__(self, columns: dict):
+        self.columns = []
+        self._exact = {}
+        self._ngram_postings = {}
+        for letter, header in columns.items():
+            normalized = normalize_text(header)
+            column = WorkTypeColumn(
+                letter=letter,
+                header=header,
+                name=display_name(header),
+                normalized=normalized,
+                tokens=normalized.split(),
+                ngrams=_ngrams(normalized.replace(" ", "")),
+            )
+            position = len(self.columns)
+            self.columns.append(column)
+            self._exact.setdefault(normalized, []).append(position)
+            for gram in column.ngrams:
+                self._ngram_postings.setdefault(gram, []).append(position)
+
+    def _score(self, query_tokens: list, column: WorkTypeColumn) -> tuple:
+        """(score, header coverage): the second only breaks ties in the ranking."""
+        query_side = sum(max(token_similarity(q, h) for h in column.tokens) for q in query_tokens) / len(query_tokens)
+        header_side = sum(max(token_similarity(q, h) for q in query_tokens) for h in column.tokens) / len(column.tokens)
+        concat_score = token_similarity("".join(query_tokens), column.normalized.replace(" ", ""))
+        return max(query_side, concat_score), header_side
+
+    def _rank(self, query_tokens: list, limit: int) -> list:
+        grams = _ngrams("".join(query_tokens))
+        overlap = {}
+        for gram in grams:
+            for position in self._ngram_postings.get(gram, ()):
+                overlap[position] = overlap.get(position, 0) + 1
+        # Score only the columns sharing the most character n-grams with the phrase
+        shortlisted = sorted(overlap, key=lambda p: -overlap[p])[:max(limit, 25)]
+        scored = [(*self._score(query_tokens, self.columns[p]), p) for p in shortlisted]
+        scored.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [(score, p) for score, _, p in scored]
+
+    def _containing(self, query_tokens: list) -> list:
+        """Positions of the columns whose header has every word of the phrase."""
+        return [p for p, column in enumerate(self.columns) if set(query_tokens) <= set(column.tokens)]
+
+    def match(self, phrase) -> WorkTypeMatch:
+        """Resolve a work type phrase such as "Grante kitecen OTTA work" to a column."""
+        normalized = normalize_text(phrase)
+        tokens = normalized.split()
+        if not tokens:
+            return WorkTypeMatch(phrase=phrase, status="not_found")
+
+        # Exact match, allowing a trailing "work" on either side
+        variants = [normalized, f"{normalized} work"]
+        if len(tokens) > 1 and tokens[-1] in TRAILING_WORDS:
+            variants.append(" ".join(tokens[:-1]))
+        exact = sorted({p for variant in variants for p in self._exact.get(variant, ())})
+        if len(exact) == 1:
+            return WorkTypeMatch(phrase=phrase, status="exact", columns=[self.columns[exact[0]].letter])
+        if len(exact) > 1:
+            return WorkTypeMatch(phrase=phrase, status="ambiguous", columns=[self.columns[p].letter for p in exact])
+
+        # A phrase found word for word in several headers (e.g. "granite" in
+        # GRANITE COUNTER and GRANITE KITCHEN OTTA) can't be decided locally
+        trimmed_tokens = tokens[:-1] if len(tokens) > 1 and tokens[-1] in TRAILING_WORDS else None
+        containing = self._containing(tokens)
+        if len(containing) < 2 and trimmed_tokens:
+            containing = self._containing(trimmed_tokens)
+        if len(containing) > 1:
+            return WorkTypeMatch(phrase=phrase, status="ambiguous", columns=[self.columns[p].letter for p in containing],
+                                 candidates=[(self.columns[p].letter, 1.0) for p in containing])
+
+        ranked = self._rank(tokens, SHORTLIST_SIZE)
+        if trimmed_tokens:
+            trimmed = self._rank(trimmed_tokens, SHORTLIST_SIZE)
+            best = {}
+            for score, position in ranked + trimmed:
+                best[position] = max(score, best.get(position, 0.0))
+            ranked = sorted(((score, p) for p, score in best.items()), key=lambda item: (-item[0], item[1]))
+
+        candidates = [(self.columns[p].letter, round(score, 3)) for score, p in ranked[:SHORTLIST_SIZE]]
+        if not ranked or ranked[0][0] < REJECT_SCORE:
+            return WorkTypeMatch(phrase=phrase, status="not_found", candidates=candidates)
+
+        top_score = ranked[0][0]
+        tied = sorted(p for score, p in ranked if top_score - score < AMBIGUITY_MARGIN)
+        if top_score >= ACCEPT_SCORE and len(tied) == 1:
+            return WorkTypeMatch(phrase=phrase, status="fuzzy", columns=[self.columns[tied[0]].letter], candidates=candidates)
+        if top_score >= ACCEPT_SCORE:
+            return WorkTypeMatch(phrase=phrase, status="ambiguous", columns=[self.columns[p].letter for p in tied], candidates=candidates)
+        return WorkTypeMatch(phrase=phrase, status="uncertain", candidates=candidates)
+
+    def shortlist(self, text, k: int = SHORTLIST_SIZE) -> dict:
+        """
+        Top-k columns relevant to a free-form query, as a COLUMN_INDEX subset.
+
+        Used to shrink the LLM prompt when the query could not be resolved
+        locally: a column ranks high when its header words appear (possibly
+        misspelt) in the query.
+        """
+        query_tokens = [token for token in normalize_text(text).split() if not token.isdigit()]
+        if not query_tokens:
+            return {}
+
+        scored = []
+        for position, column in enumerate(self.columns):
+            similarities = [max(token_similarity(q, h) for q in query_tokens) for h in column.tokens]
+            score = sum(s for s in similarities if s >= TOKEN_MATCH_SCORE) / len(column.tokens)
+            if score > 0:
+                scored.append((score, position))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return {self.columns[p].letter: self.columns[p].header for _, p in scored[:k]}
+
+    def names(self, letters) -> list:
+        by_letter = {column.letter: column.name for column in self.columns}
+        return [by_letter[letter] for letter in letters]
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from utils.logger import get_logger
+from .concurrency import map_concurrently
+from .request_compactor import compact_cell_requests
+
+logger = get_logger(__name__)
+
+# Formats written with each cell; the field masks passed to compact_cell_requests
+MAIN_CELL_FORMAT_FIELDS = 'userEnteredFormat(backgroundColor,textFormat,horizontalAlignment,verticalAlignment)'
+QNT_CELL_FORMAT_FIELDS = 'userEnteredFormat(numberFormat,horizontalAlignment,verticalAlignment)'
+
+
+def main_cell(update, today):
+    """Date and WIP/COM colour for a work-type cell of the main sheet."""
+    bg_color = {
+        'red': 1.0, 'green': 0.9, 'blue': 0.0, 'alpha': 1.0  # Yellow for WIP
+    } if update == 'WIP' else {
+        'red': 0.0, 'green': 0.8, 'blue': 0.0, 'alpha': 1.0  # Green for COM
+    }
+    return {'stringValue': today}, {
+        'backgroundColor': bg_color,
+        'textFormat': {'bold': True},
+        'horizontalAlignment': 'CENTER',
+        'verticalAlignment': 'MIDDLE'
+    }
+
+
+def qnt_cell(total_value):
+    """Running quantity total for a cell of the QNT sheet."""
+    return {'numberValue': total_value}, {
+        'numberFormat': {
+            'type': 'NUMBER',
+            'pattern': '0.00'
+        },
+        'horizontalAlignment': 'CENTER',
+        'verticalAlignment': 'MIDDLE'
+    }
+
+
+def read_qnt_values(service, spreadsheet_id, cells):
+    """Read QNT cells (A1 notation) with one batchGet; empty or non-numeric cells read as 0."""
+    values = {cell: 0.0 for cell in cells}
+    if not cells:
+        return values
+
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=[f"QNT!{cell}" for cell in cells],
+        valueRenderOption='UNFORMATTED_VALUE'
+    ).execute()
+
+    for cell, value_range in zip(cells, result.get('valueRanges', [])):
+        try:
+            values[cell] = float(str(value_range['values'][0][0]))
+        except (ValueError, IndexError, KeyError):
+            values[cell] = 0.0
+    return values
+
+
+class WriteQueueFull(Exception):
+    """Too many writes are already waiting for the spreadsheet."""
+
+
+@dataclass
+class CellWrite:
+    """One request's cell writes, waiting to be flushed."""
+    service: object
+    user: str  # Opaque key of the credentials behind `service`; only writes of one user are merged
+    main_sheet_id: int
+    qnt_sheet_id: int
+    main_cells: dict  # {(row, column): (userEnteredValue, userEnteredFormat)}, 0-based
+    increments: list  # [(QNT cell in A1 notation, (row, column), quantity)] in request order
+    future: Future = field(default_factory=Future)
+
+
+def apply_cell_writes(spreadsheet_id, writes) -> list:
+    """
+    Apply writes of one user with one QNT batchGet and one batchUpdate.
+
+    Increments to the same QNT cell add up in submission order and the last
+    status per main-sheet cell wins. Returns, per write, the running QNT total
+    after each of its increments.
+    """
+    service = writes[-1].service
+    names = list(dict.fromkeys(name for write in writes for name, _, _ in write.increments))
+    totals = read_qnt_values(service, spreadsheet_id, names)
+
+    main_cells = {}
+    qnt_cells = {}
+    write_totals = []
+    for write in writes:
+        main_cells.setdefault(write.main_sheet_id, {}).update(write.main_cells)
+        item_totals = []
+        for name, cell, quantity in write.increments:
+            totals[name] += quantity
+            item_totals.append(totals[name])
+            qnt_cells.setdefault(write.qnt_sheet_id, {})[cell] = qnt_cell(totals[name])
+        write_totals.append(item_totals)
+
+    # Adjacent cells are merged into range requests with a shared format
+    requests = [
+        request for sheet_id, cells in main_cells.items()
+        for request in compact_cell_requests(sheet_id, cells, MAIN_CELL_FORMAT_FIELDS)
+    ] + [
+        request for sheet_id, cells in qnt_cells.items()
+        for request in compact_cell_requests(sheet_id, cells, QNT_CELL_FORMAT_FIELDS)
+    ]
+    if requests:
+        service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={'requests': requests}
+        ).execute()
+    return write_totals
+
+
+class SheetWriteQueue:
+    """
+    Serializes cell writes per spreadsheet and merges concurrent ones.
+
+    Requests submit their writes and wait for the result. A write to a
+    spreadsheet with nothing pending or in flight is applied right away by the
+    submitting thread. Writes arriving while one is in flight are queued; a
+    background thread flushes them `tick` seconds after the first one arrives
+    (once the spreadsheet is free), spreadsheets in parallel. A flush applies a
+    spreadsheet's writes one user at a time, each user's writes merged into
+    one batchUpdate sent with that user's own service handle. Only one flush
+    per spreadsheet runs at a time, so QNT totals are read and written by one
+    flush at a time and concurrent increments are not lost within this process.
+
+    submit() blocks while `max_pending` writes are waiting for the spreadsheet
+    and raises WriteQueueFull after `wait_timeout` seconds. close() flushes
+    whatever is still pending.
+    """
+
+    def __init__(self, tick: float = 0.05, max_pending: int = 64, wait_timeout: float = 30):
+        self.tick = tick
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self._pending = {}
+        # Spreadsheets with a flush in flight
+        self._busy = set()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, spreadsheet_id, write: CellWrite) -> list:
+        """Queue a write and wait until it is applied; returns its QNT totals."""
+        with self._condition:
+            has_room = self._condition.wait_for(
+                lambda: self._closed or len(self._pending.get(spreadsheet_id, ())) < self.max_pending,
+                timeout=self.wait_timeout
+            )
+            if has_room and self._closed:
+                # No background thread anymore: wait for the spreadsheet and write here
+                has_room = self._condition.wait_for(lambda: spreadsheet_id not in self._busy,
+                                                    timeout=self.wait_timeout)
+            if not has_room:
+                raise WriteQueueFull("Too many updates are waiting for this spreadsheet; please retry shortly")
+            direct = spreadsheet_id not in self._busy and not self._pending.get(spreadsheet_id)
+            if direct:
+                self._busy.add(spreadsheet_id)
+            else:
+                self._pending.setdefault(spreadsheet_id, []).append(write)
+                self._condition.notify_all()
+        if direct:
+            self._flush_owned(spreadsheet_id, [write])
+        return write.future.result()
+
+    def _flush_owned(self, spreadsheet_id, writes):
+        """Flush writes of a spreadsheet this thread marked busy, then release it."""
+        try:
+            self._flush(spreadsheet_id, writes)
+        finally:
+            with self._condition:
+                self._busy.discard(spreadsheet_id)
+                self._condition.notify_all()
+
+    def _flush(self, spreadsheet_id, writes):
+        by_user = {}
+        for write in writes:
+            by_user.setdefault(write.user, []).append(write)
+        for user_writes in by_user.values():
+            self._apply(spreadsheet_id, user_writes)
+
+    def _apply(self, spreadsheet_id, writes):
+        try:
+            results = apply_cell_writes(spreadsheet_id, writes)
+        except Exception as e:
+            if len(writes) > 1:
+                # batchUpdate is atomic, so nothing was written; one bad write
+                # (e.g. a stale sheet ID) shouldn't fail the others
+                logger.warning(f"Merged write to {spreadsheet_id} failed, retrying writes one by one: {str(e)}")
+                for write in writes:
+                    self._apply(spreadsheet_id, [write])
+                return
+            writes[0].future.set_exception(e)
+            return
+        for write, totals in zip(writes, results):
+            write.future.set_result(totals)
+        if len(writes) > 1:
+            logger.info(f"Merged {len(writes)} writes to {spreadsheet_id} into one batchUpdate")
+
+    def _ready(self) -> list:
+        return [spreadsheet_id for spreadsheet_id in self._pending if spreadsheet_id not in self._busy]
+
+    def flush(self):
+        """Flush the pending writes of every spreadsheet without a flush in flight."""
+        with self._condition:
+            pending = {spreadsheet_id: self._pending.pop(spreadsheet_id) for spreadsheet_id in self._ready()}
+            self._busy.update(pending)
+            self._condition.notify_all()
+        map_concurrently(lambda item: self._flush_owned(*item), list(pending.items()))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._ready() and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            # Let writes from concurrent requests accumulate before flushing
+            time.sleep(self.tick)
+            self.flush()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout=5)
+        with self._condition:
+            self._condition.wait_for(lambda: not self._busy, timeout=self.wait_timeout)
+        self.flush()
+
+
+def create_write_queue() -> SheetWriteQueue:
+    return SheetWriteQueue(
+        tick=float(os.getenv("SHEET_WRITE_TICK_MS", "50")) / 1000,
+        max_pending=int(os.getenv("SHEET_WRITE_MAX_PENDING", "64")),
+        wait_timeout=float(os.getenv("SHEET_WRITE_WAIT_SECONDS", "30"))
+    )
+
+
+write_queue = create_write_queue()
@@ -0,0 +1,52 @@
+import pytest
+
+import app
+from benchmarks.fake_sheets import DEFAULT_HEADERS, FakeSheetsService, build_dpr_grid
+from src import prompt_builder
+from src.llm_scheduler import LLMUnavailable
+
+LINES = [
+    "Tower 1 101 gypsum work done by 5",
+    "Tower 1 102 brickwork done by 7",
+    "Tower 1 103 gypsum work needs a look",  # outside the grammar, goes to the LLM
+]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FakeSheetsService({"DPR": build_dpr_grid(20, DEFAULT_HEADERS), "QNT": []})
+    monkeypatch.setattr(app, "get_sheet_revision",
+                        lambda token, spreadsheet_id: service.files().get(fileId=spreadsheet_id).execute()["modifiedTime"])
+    return service
+
+
+def bulk_update(service, spreadsheet_id, lines):
+    request = app.BulkUpdateRequest(spreadsheet_id=spreadsheet_id, sheet_name="DPR", user_queries=lines,
+                                    site_engineer_name="Ravi", groq_api_key="test-key")
+    return app.bulk_update_sheet_sync(request, service, "bulk-token")
+
+
+def test_line_without_updates_is_skipped(service, monkeypatch):
+    def unavailable(prompt, api_key):
+        raise LLMUnavailable("circuit open")
+
+    monkeypatch.setattr(prompt_builder, "run_support_agent", unavailable)
+    response = bulk_update(service, "bulk-skipped", LINES)
+
+    assert response["status"] == "success"
+    assert response["message"] == "Applied 2 updates from 2 of 3 lines"
+    assert [result["status"] for result in response["results"]] == ["success", "success", "skipped"]
+    assert response["results"][2]["updates_applied"] == 0
+    assert "couldn't process" in response["results"][2]["feedback"]
+
+
+def test_no_line_applied_is_an_error(service, monkeypatch):
+    def unavailable(prompt, api_key):
+        raise LLMUnavailable("circuit open")
+
+    monkeypatch.setattr(prompt_builder, "run_support_agent", unavailable)
+    response = bulk_update(service, "bulk-none", LINES[2:])
+
+    assert response["status"] == "error"
+    assert response["message"] == "Applied 0 updates from 0 of 1 lines"
+    assert response["updated_cells"] == 0
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+from googleapiclient.model import JsonModel
+
+from src import concurrency
+from src.concurrency import LimitedHttpRequest
+
+SHEETS = "https://sheets.googleapis.com/v4/spreadsheets/retry"
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    """Retries go out at once; quota pacing is covered by the scheduler itself."""
+    monkeypatch.setattr(concurrency.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(concurrency.quota_scheduler, "acquire", lambda *args: None)
+    monkeypatch.setattr(concurrency.quota_scheduler, "throttle", lambda *args: None)
+
+
+def request(method_id, http_method="POST", body=None):
+    return LimitedHttpRequest(
+        None, JsonModel().response, SHEETS, method=http_method,
+        body=None if body is None else json.dumps(body), methodId=method_id, quota_user="retry-user"
+    )
+
+
+def execute(req, *statuses):
+    """Run req against responses with the given statuses, then a 200; returns the requests sent."""
+    http = HttpMockSequence([({"status": str(status)}, "{}") for status in statuses] + [({"status": "200"}, "{}")])
+    try:
+        req.execute(http=http)
+    except HttpError as e:
+        return len(statuses) + 1 - len(http._iterable), e.resp.status
+    return len(statuses) + 1 - len(http._iterable), 200
+
+
+def add_sheet():
+    return {"requests": [{"addSheet": {"properties": {"title": "LOG"}}}]}
+
+
+def update_cells():
+    return {"requests": [{"updateCells": {"rows": [], "fields": "userEnteredValue"}}]}
+
+
+def test_reads_and_overwrites_retry_server_errors():
+    assert execute(request("sheets.spreadsheets.values.get", "GET"), 503) == (2, 200)
+    assert execute(request("sheets.spreadsheets.values.update", "PUT", {"values": [[1]]}), 500) == (2, 200)
+    assert execute(request("sheets.spreadsheets.batchUpdate", body=update_cells()), 502) == (2, 200)
+
+
+def test_appends_and_add_sheet_are_not_repeated_on_server_errors():
+    assert execute(request("sheets.spreadsheets.values.append", body={"values": [[1]]}), 503) == (1, 503)
+    assert execute(request("sheets.spreadsheets.batchUpdate", body=add_sheet()), 500) == (1, 500)
+    mixed = {"requests": update_cells()["requests"] + add_sheet()["requests"]}
+    assert execute(request("sheets.spreadsheets.batchUpdate", body=mixed), 500) == (1, 500)
+
+
+def test_rate_limits_are_always_retried():
+    assert execute(request("sheets.spreadsheets.values.append", body={"values": [[1]]}), 429) == (2, 200)
+    assert execute(request("sheets.spreadsheets.batchUpdate", body=add_sheet()), 429) == (2, 200)
+
+
+def test_flag_overrides_the_inferred_policy():
+    req = request("sheets.spreadsheets.values.update", "PUT", {"values": [[1]]})
+    req.retry_server_errors = False
+    assert execute(req, 503) == (1, 503)
@@ -0,0 +1,66 @@
+import pytest
+from agno.exceptions import ModelProviderError
+
+from src.llm_scheduler import CircuitBreaker, LLMScheduler, LLMUnavailable
+
+
+def open_scheduler(**kwargs) -> LLMScheduler:
+    """A scheduler whose circuit is open and lets a trial through right away."""
+    scheduler = LLMScheduler(per_key_limit=1, budget=1, max_attempts=1,
+                             breaker=CircuitBreaker(failure_threshold=1, cooldown=0), **kwargs)
+
+    def outage():
+        raise ModelProviderError("Service unavailable", status_code=503)
+
+    with pytest.raises(LLMUnavailable):
+        scheduler.run("key", outage)
+    return scheduler
+
+
+def test_trial_failing_with_client_error_does_not_keep_circuit_open():
+    scheduler = open_scheduler()
+
+    def bad_key():
+        raise ModelProviderError("Invalid API key", status_code=401)
+
+    with pytest.raises(ModelProviderError):
+        scheduler.run("other-key", bad_key)
+    assert scheduler.run("key", lambda: "ok") == "ok"
+
+
+def test_trial_timing_out_on_slot_does_not_keep_circuit_open():
+    scheduler = open_scheduler()
+    semaphore = scheduler._semaphore("key")
+    semaphore.acquire()
+    with pytest.raises(LLMUnavailable):
+        with scheduler.slot("key", deadline=0):
+            pass
+    semaphore.release()
+    assert scheduler.run("key", lambda: "ok") == "ok"
+
+
+def test_closed_stream_does_not_keep_circuit_open():
+    scheduler = open_scheduler()
+
+    def tokens():
+        with scheduler.stream("key"):
+            yield "first"
+            yield "second"
+
+    stream = tokens()
+    assert next(stream) == "first"
+    stream.close()
+    assert scheduler.run("key", lambda: "ok") == "ok"
+
+
+def test_trial_failing_with_server_error_reopens_circuit():
+    scheduler = open_scheduler()
+
+    def outage():
+        raise ModelProviderError("Service unavailable", status_code=503)
+
+    with pytest.raises(LLMUnavailable, match="LLM call failed"):
+        scheduler.run("key", outage)
+    scheduler.breaker.cooldown = 60
+    with pytest.raises(LLMUnavailable, match="unavailable right now"):
+        scheduler.run("key", lambda: "ok")
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from src.log_analytics import LogTable, answer_logs_query, plan_logs_query
+
+NOW = datetime(2026, 9, 10, 18, 0)
+
+
+def log(time, engineer, location, peta_location, work_type, quantity):
+    return {
+        "time": time, "site_engineer_name": engineer, "Location": location, "Sub Location": "1ST",
+        "Peta Location": peta_location, "Category": "2 BHK", "updation": work_type,
+        "requested_quantity": str(quantity), "updated_quantity": str(quantity), "user_query": "",
+        "feedback": "", "updated_cell": "F4",
+    }
+
+
+def table():
+    """8 BRICKWORK updates on 2 flats by 2 engineers over 2 days, plus 2 GYPSUM WORK updates."""
+    logs = []
+    for i in range(8):
+        logs.append(log(f"2026-09-0{8 + i % 2} 10:0{i}:00", ("Ravi", "Anita")[i % 2],
+                        "Tower 1", ("101", "102")[i // 4], "BRICKWORK", 5))
+    logs.append(log("2026-09-09 11:00:00", "Ravi", "Tower 2", "201", "GYPSUM WORK", 3))
+    logs.append(log("2026-09-09 12:00:00", "Suresh", "Tower 2", "202", "GYPSUM WORK", 4))
+    return LogTable.from_logs(logs)
+
+
+def answer(query):
+    return answer_logs_query(table(), query, now=NOW)
+
+
+def test_sum_and_count():
+    assert answer("total brickwork") == "Total quantity for BRICKWORK is 40 from 8 updates"
+    assert answer("how many updates for gypsum work") == "2 updates found for GYPSUM WORK"
+    assert answer("total quantity at location Tower 2") == "Total quantity at Tower 2 is 7 from 2 updates"
+
+
+def test_group_by():
+    assert answer("how many brickwork updates by engineer") == \
+        "Number of updates for BRICKWORK by engineer: Anita: 4; Ravi: 4"
+    assert answer("total quantity per day") == "Total quantity by day: 2026-09-08: 20; 2026-09-09: 27"
+    assert answer("engineer wise count") == "Number of updates by engineer: Anita: 4; Ravi: 5; Suresh: 1"
+
+
+def test_latest():
+    assert answer("latest gypsum work update").startswith(
+        "Latest update for GYPSUM WORK: GYPSUM WORK at Tower 2 202 updated by Suresh"
+    )
+
+
+def test_date_window():
+    assert answer("total brickwork yesterday") == "Total quantity for BRICKWORK yesterday is 20 from 4 updates"
+
+
+def test_distinct_value_questions_go_to_the_llm():
+    for query in ("how many flats have brickwork", "how many engineers updated brickwork",
+                  "how many locations", "how many days brickwork was done"):
+        assert plan_logs_query(query, table(), NOW) is None, query
+
+
+def test_open_questions_go_to_the_llm():
+    assert answer("why was brickwork delayed") is None
+    assert answer("summarize the progress") is None
@@ -0,0 +1,90 @@
+from src.query_parser import parse_update_query
+from src.sheet_index import build_sheet_index
+
+HEADERS = ['Location', 'Sub Location', 'Peta Location', 'Category', '',
+           'BRICKWORK', 'GYPSUM WORK', 'GRANITE\nKITCHEN OTTA', 'GRANITE\nCOUNTER', 'ALUMINUM\nFRAME FIXING']
+COLUMNS = {'BRICKWORK': 'F', 'GYPSUM WORK': 'G', 'GRANITE KITCHEN OTTA': 'H', 'GRANITE COUNTER': 'I'}
+
+
+def dpr_index():
+    """A building 101, 103, 104 and B building 101, each data row followed by a spacer row."""
+    grid = [['DPR'], HEADERS]
+    for location, peta_location in (("A building", "101"), ("A building", "103"),
+                                    ("A building", "104"), ("B building", "101")):
+        grid.append([location, "1ST", peta_location, "2 BHK"])
+        grid.append([])
+    return build_sheet_index(grid)
+
+
+def parse(query):
+    return parse_update_query(query, dpr_index())
+
+
+def test_single_work_type_single_quantity_skips_missing_peta_locations():
+    result = parse("A building from 101 to 105 brickwork has been done by 40 cubic meter")
+    assert result.row_index == ["3", "5", "7"]
+    assert result.columns_index == ["F"] * 3
+    assert result.updations == ["WIP"] * 3
+    assert result.quantities == [40] * 3
+    assert result.feedbacks == [
+        "Location A building, Peta Location 101 has been updated to WIP for BRICKWORK",
+        "Peta Location 102 not found for Location A building",
+        "Location A building, Peta Location 103 has been updated to WIP for BRICKWORK",
+        "Location A building, Peta Location 104 has been updated to WIP for BRICKWORK",
+        "Peta Location 105 not found for Location A building",
+    ]
+
+
+def test_single_work_type_quantities_are_distributed_over_rows():
+    assert parse("A building 101 to 104 gypsum work done by 40, 30").quantities == [40, 30, 30]
+    assert parse("A building 101 to 104 gypsum work done by 40, 30, 50, 60").quantities == [40, 30, 50]
+
+
+def test_work_types_multiply_rows():
+    result = parse("A building 101 and 103 brickwork, gypsum work completed by 30")
+    assert result.row_index == ["3", "3", "5", "5"]
+    assert result.columns_index == ["F", "G", "F", "G"]
+    assert result.updations == ["COM"] * 4
+    assert result.quantities == [30] * 4
+
+
+def test_work_type_quantities_match_by_position():
+    result = parse("A building 101 and 103 brickwork, gypsum work done by 10, 20")
+    assert result.columns_index == ["F", "G", "F", "G"]
+    assert result.quantities == [10, 20, 10, 20]
+
+
+def test_no_valid_rows():
+    result = parse("A building 110 brickwork done by 5")
+    assert result.row_index == []
+    assert result.feedbacks == ["Peta Location 110 not found for Location A building"]
+
+
+def test_ambiguous_work_type_is_not_written():
+    result = parse("A building 101 granite done by 5")
+    assert (result.row_index, result.columns_index, result.quantities) == ([], [], [])
+    assert result.feedbacks == [
+        "Found 2 matches for 'GRANITE'. Please specify which one: GRANITE KITCHEN OTTA, GRANITE COUNTER"
+    ]
+
+
+def test_unknown_work_type_is_not_written():
+    result = parse("A building 101 lift installation done by 5")
+    assert result.row_index == []
+    assert result.feedbacks == ["Work type 'LIFT INSTALLATION' not found in available columns"]
+
+
+def test_typo_resolves_when_confident():
+    assert parse("A building 101 Grante kitecen OTTA work done by 5").columns_index == ["H"]
+    assert parse("A building 101 granit kichen done by 5").columns_index == ["H"]
+
+
+def test_weak_fuzzy_match_goes_to_the_agent():
+    assert parse("A building 101 gypsun done by 5") is None
+
+
+def test_queries_outside_the_grammar_go_to_the_agent():
+    assert parse("A building 101 brickwork not done by 5") is None
+    assert parse("A building 101 brickwork done") is None
+    assert parse("A building 101 brickwork, B building 101 gypsum work done by 5") is None
+    assert parse("C building 101 brickwork done by 5") is None
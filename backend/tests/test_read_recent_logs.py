@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+from benchmarks.fake_sheets import FakeSheetsService
+from src.log_mirror import LOG_HEADERS
+
+START = datetime(2026, 9, 1, 8, 0)
+
+
+def log_rows(count, first=0):
+    """LOG rows an hour apart, engineer named after the row's position."""
+    return [
+        [(START + timedelta(hours=first + i)).strftime("%Y-%m-%d %H:%M:%S"), f"engineer {first + i}"]
+        + [""] * (len(LOG_HEADERS) - 2)
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def service():
+    return FakeSheetsService({"DPR": [], "LOG": [LOG_HEADERS] + log_rows(1000)})
+
+
+def engineers(logs):
+    return [entry["site_engineer_name"] for entry in logs]
+
+
+def test_latest_rows_in_one_request(service):
+    logs = app.read_recent_logs(service, "recent-logs", 30)
+    assert engineers(logs) == [f"engineer {i}" for i in range(970, 1000)]
+    assert service.calls["values.get"] == 2  # column A once, then the rows
+
+
+def test_walk_back_to_a_date_window(service):
+    since = (START + timedelta(hours=100)).timestamp()
+    until = (START + timedelta(hours=110)).timestamp()
+    logs = app.read_recent_logs(service, "walk-back", 30, since, until)
+    assert engineers(logs) == [f"engineer {i}" for i in range(100, 110)]
+    assert service.calls["values.get"] <= 4
+
+
+def test_rows_appended_after_the_last_row_was_cached(service):
+    app.read_recent_logs(service, "appended", 30)
+    service.grids["LOG"].extend(log_rows(5, first=1000))
+    logs = app.read_recent_logs(service, "appended", 30)
+    assert engineers(logs)[-5:] == [f"engineer {i}" for i in range(1000, 1005)]
+    assert len(logs) == 30
+
+
+def test_log_shorter_than_the_cached_last_row(service):
+    app.read_recent_logs(service, "shrunk", 30)
+    del service.grids["LOG"][501:]
+    logs = app.read_recent_logs(service, "shrunk", 30)
+    assert engineers(logs) == [f"engineer {i}" for i in range(470, 500)]
@@ -0,0 +1,73 @@
+from src.request_compactor import compact_cell_requests
+
+SHEET_ID = 7
+FIELDS = "userEnteredFormat.backgroundColor"
+WIP = {"backgroundColor": {"red": 1.0, "green": 0.9, "blue": 0.0}}
+COM = {"backgroundColor": {"red": 0.0, "green": 0.8, "blue": 0.0}}
+
+
+def apply(requests):
+    """What the requests leave in each cell they touch: {(row, column): [value, format]}."""
+    written = {}
+
+    def write(row, column, cell):
+        current = written.setdefault((row, column), [None, None])
+        if "userEnteredValue" in cell:
+            current[0] = cell["userEnteredValue"]
+        if "userEnteredFormat" in cell:
+            current[1] = cell["userEnteredFormat"]
+
+    for request in requests:
+        if "repeatCell" in request:
+            grid_range, cell = request["repeatCell"]["range"], request["repeatCell"]["cell"]
+            for row in range(grid_range["startRowIndex"], grid_range["endRowIndex"]):
+                for column in range(grid_range["startColumnIndex"], grid_range["endColumnIndex"]):
+                    write(row, column, cell)
+            continue
+        update = request["updateCells"]
+        if "range" in update:
+            row, column = update["range"]["startRowIndex"], update["range"]["startColumnIndex"]
+        else:
+            row, column = update["start"]["rowIndex"], update["start"]["columnIndex"]
+        for row_offset, row_data in enumerate(update["rows"]):
+            for column_offset, cell in enumerate(row_data.get("values", [])):
+                write(row + row_offset, column + column_offset, cell)
+    return {key: tuple(value) for key, value in written.items()}
+
+
+def cell(text, cell_format=WIP):
+    return ({"stringValue": text}, cell_format)
+
+
+def test_every_cell_written_once_and_nothing_else():
+    cells = {
+        (2, 5): cell("WIP"), (2, 6): cell("COM", COM), (2, 7): cell("WIP"),
+        (4, 5): cell("WIP"), (4, 6): cell("WIP"), (4, 7): cell("WIP"),
+        (10, 1): cell("A"), (11, 1): cell("B"), (12, 1): cell("C"),
+        (20, 3): cell("WIP"),
+    }
+    assert apply(compact_cell_requests(SHEET_ID, cells, FIELDS)) == cells
+
+
+def test_identical_run_is_one_repeat_cell():
+    cells = {(row, 4): cell("WIP") for row in range(3, 9)}
+    requests = compact_cell_requests(SHEET_ID, cells, FIELDS)
+    assert len(requests) == 1 and "repeatCell" in requests[0]
+    assert apply(requests) == cells
+
+
+def test_flats_across_spacer_rows_share_one_request():
+    # The same work types of three flats, each followed by the DPR spacer row
+    cells = {(row, column): cell("WIP" if column % 2 else "COM", WIP if column % 2 else COM)
+             for row in (2, 4, 6) for column in (5, 6, 7)}
+    requests = compact_cell_requests(SHEET_ID, cells, FIELDS)
+    assert len(requests) == 1
+    assert requests[0]["updateCells"]["rows"][1] == {}  # the spacer row stays untouched
+    assert apply(requests) == cells
+
+
+def test_rows_too_far_apart_stay_separate():
+    cells = {(2, 5): cell("WIP"), (2, 6): cell("COM", COM), (40, 5): cell("WIP"), (40, 6): cell("COM", COM)}
+    requests = compact_cell_requests(SHEET_ID, cells, FIELDS)
+    assert all("start" not in request.get("updateCells", {}) for request in requests)
+    assert apply(requests) == cells
@@ -0,0 +1,85 @@
+from src.models import SupportResult
+from src.result_validator import coerce_support_result, repair_support_result
+from src.sheet_index import build_sheet_index
+
+HEADERS = ['Location', 'Sub Location', 'Peta Location', 'Category', '',
+           'BRICKWORK', 'GYPSUM WORK', 'GRANITE\nKITCHEN OTTA']
+QUERY = "A building 101 and 103 brickwork done by 40"
+
+
+def dpr_index():
+    """A building 101 and 103 on rows 3 and 5, each followed by a spacer row."""
+    grid = [['DPR'], HEADERS]
+    for peta_location in ("101", "103"):
+        grid.append(["A building", "1ST", peta_location, "2 BHK"])
+        grid.append([])
+    return build_sheet_index(grid)
+
+
+def result(rows, columns, updations=(), quantities=(), feedbacks=()):
+    return SupportResult(row_index=list(rows), columns_index=list(columns), updations=list(updations),
+                         quantities=list(quantities), feedbacks=list(feedbacks))
+
+
+def repair(agent_result):
+    return repair_support_result(agent_result, dpr_index(), QUERY)
+
+
+def items(repaired):
+    return list(zip(repaired.row_index, repaired.columns_index, repaired.updations, repaired.quantities))
+
+
+def test_coerce_accepts_json_wrapped_in_text():
+    text = ('Here you go: {"row_index": [3], "columns_index": "F", "updations": ["WIP"], '
+            '"quantities": ["40.0"], "feedbacks": []} hope that helps')
+    assert coerce_support_result(text) == result(["3"], ["F"], ["WIP"], [40])
+
+
+def test_coerce_rejects_unusable_output():
+    assert coerce_support_result("no json here") is None
+    assert coerce_support_result('{"row_index": [3], "quantities": [-4]}') is None
+    assert coerce_support_result('{"row_index": [3], "quantities": [2.5]}') is None
+    assert coerce_support_result(["not", "a", "dict"]) is None
+
+
+def test_single_values_are_broadcast_over_rows():
+    repaired = repair(result(["3", "5"], ["F"], ["completed"], [40]))
+    assert items(repaired) == [("3", "F", "COM", 40), ("5", "F", "COM", 40)]
+    assert repaired.feedbacks == [
+        "Location A building, Peta Location 101 has been updated to COM for BRICKWORK",
+        "Location A building, Peta Location 103 has been updated to COM for BRICKWORK",
+    ]
+
+
+def test_rows_times_work_types_with_quantities_per_work_type():
+    repaired = repair(result(["3", "5"], ["F", "G", "H"], ["WIP"], [40, 10, 5]))
+    assert items(repaired) == [("3", "F", "WIP", 40), ("3", "G", "WIP", 10), ("3", "H", "WIP", 5),
+                               ("5", "F", "WIP", 40), ("5", "G", "WIP", 10), ("5", "H", "WIP", 5)]
+
+
+def test_equal_lists_pair_up_item_by_item():
+    repaired = repair(result(["3", "5"], ["F", "G"], ["WIP", "COM"], [40, 10]))
+    assert items(repaired) == [("3", "F", "WIP", 40), ("5", "G", "COM", 10)]
+
+
+def test_headers_map_to_letters_and_duplicates_are_kept_once():
+    repaired = repair(result(["3", "3"], ["GRANITE KITCHEN OTTA", "H"], ["WIP", "WIP"], [5, 5]))
+    assert items(repaired) == [("3", "H", "WIP", 5)]
+
+
+def test_unknown_rows_and_columns_are_dropped_with_feedback():
+    repaired = repair(result(["3", "4", "9"], ["F", "F", "Z"], ["WIP"], [40], ["Done"]))
+    assert items(repaired) == [("3", "F", "WIP", 40)]
+    assert repaired.feedbacks == ["Done", "Row 4 not found in the sheet", "Row 9 not found in the sheet"]
+
+
+def test_output_that_cannot_be_matched_up_is_rejected():
+    # Three rows against two work types is neither broadcast nor rows x work types
+    repaired = repair(result(["3", "3", "5"], ["F", "G"], ["WIP"], [40], ["Updated"]))
+    assert items(repaired) == []
+    assert repaired.feedbacks == ["Updated"]
+
+    # Three quantities for two items of different work types
+    repaired = repair(result(["3", "5"], ["F", "G"], ["WIP"], [40, 10, 5]))
+    assert items(repaired) == []
+    assert "couldn't match" in repaired.feedbacks[0]
@@ -0,0 +1,58 @@
+from src.work_type_matcher import WorkTypeMatcher
+
+# Headers as they appear in sheet/DPR.xlsx
+COLUMNS = {
+    'F': 'BRICKWORK',
+    'G': 'GYPSUM WORK',
+    'H': 'INTERNAL ELECTRICAL\nWALL CLADDING',
+    'I': 'INTERNAL ELECTRICAL\nINTERNAL WIRING',
+    'J': 'INTERNAL ELECTRICAL\nACCESSORIES FIXING',
+    'K': 'WATERPROOFING\nTOILET AREA',
+    'AA': 'GRANITE\nKITCHEN OTTA',
+    'AB': 'GRANITE\nCOUNTER',
+    'AC': 'GRANITE\nWINDOW SILL',
+    'AM': 'ALUMINUM\nFRAME FIXING',
+}
+
+
+def match(phrase):
+    return WorkTypeMatcher(COLUMNS).match(phrase)
+
+
+def test_phrase_shared_by_several_headers_is_ambiguous():
+    result = match("granite")
+    assert result.status == "ambiguous"
+    assert result.columns == ['AA', 'AB', 'AC']
+
+
+def test_multi_word_prefix_is_ambiguous():
+    for phrase in ("internal electrical", "internal electrical work"):
+        result = match(phrase)
+        assert result.status == "ambiguous"
+        assert result.columns == ['H', 'I', 'J']
+
+
+def test_misspelt_prefix_is_not_resolved():
+    assert not match("granit").resolved
+
+
+def test_exact_header():
+    assert (match("Granite kitchen otta").status, match("Granite kitchen otta").columns) == ("exact", ['AA'])
+    assert (match("gypsum").status, match("gypsum").columns) == ("exact", ['G'])
+    assert (match("brickwork work").status, match("brickwork work").columns) == ("exact", ['F'])
+
+
+def test_words_found_in_one_header_only():
+    result = match("waterproofing toilet")
+    assert (result.status, result.columns) == ("fuzzy", ['K'])
+
+
+def test_typos():
+    result = match("Grante kitecen OTTA work")
+    assert (result.status, result.columns) == ("fuzzy", ['AA'])
+    result = match("aluminium frame")
+    assert (result.status, result.columns) == ("fuzzy", ['AM'])
+
+
+def test_unknown_work_type():
+    assert match("lift installation").status == "not_found"
@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_sheets import FakeSheetsService
+from src.write_queue import CellWrite, SheetWriteQueue, WriteQueueFull, main_cell
+
+SPREADSHEET = "write-queue"
+MAIN, QNT = 0, 1
+
+
+class GatedSheetsService(FakeSheetsService):
+    """Holds batchUpdates until `gate` is set and rejects ones naming unknown sheets, atomically."""
+
+    def __init__(self, sheets):
+        super().__init__(sheets)
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def _execute(self, method, request, handler):
+        if method == "spreadsheets.batchUpdate":
+            self.gate.wait(timeout=5)
+            for item in request["requests"]:
+                target = next(iter(item.values()))
+                sheet_id = (target.get("range") or target.get("start"))["sheetId"]
+                if sheet_id not in self.sheet_ids.values():
+                    raise ValueError(f"No grid with id: {sheet_id}")
+        return super()._execute(method, request, handler)
+
+
+@pytest.fixture
+def service():
+    return GatedSheetsService({"DPR": [[], ["Location"], ["A Building"]], "QNT": []})
+
+
+@pytest.fixture
+def queue():
+    queue = SheetWriteQueue(tick=0.01, max_pending=8, wait_timeout=2)
+    yield queue
+    queue.close()
+
+
+def write(service, user, quantity, qnt_sheet_id=QNT):
+    return CellWrite(
+        service=service, user=user, main_sheet_id=MAIN, qnt_sheet_id=qnt_sheet_id,
+        main_cells={(2, 5): main_cell("WIP", "2026-10-17")},
+        increments=[("F3", (2, 5), quantity)]
+    )
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 2
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+class Submitter:
+    """Submits writes from background threads and collects their results (or errors)."""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.results = {}
+        self.threads = []
+
+    def submit(self, item):
+        def run():
+            try:
+                self.results[id(item)] = self.queue.submit(SPREADSHEET, item)
+            except Exception as e:
+                self.results[id(item)] = e
+
+        thread = threading.Thread(target=run)
+        self.threads.append(thread)
+        thread.start()
+
+    def hold(self, item):
+        """Submit item as the flush in flight; the gate keeps it there."""
+        self.submit(item)
+        wait_until(lambda: SPREADSHEET in self.queue._busy)
+
+    def queue_behind(self, *items):
+        """Submit items one after another so they are pending in this order."""
+        for item in items:
+            pending = len(self.queue._pending.get(SPREADSHEET, ()))
+            self.submit(item)
+            wait_until(lambda: len(self.queue._pending.get(SPREADSHEET, ())) == pending + 1)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    def __getitem__(self, item):
+        return self.results[id(item)]
+
+
+def test_idle_spreadsheet_is_written_right_away(service, queue):
+    assert queue.submit(SPREADSHEET, write(service, "ravi", 5)) == [5.0]
+    assert service.calls["spreadsheets.batchUpdate"] == 1
+    assert service.grids["QNT"][2][5] == 5.0
+    assert service.grids["DPR"][2][5] == "2026-10-17"
+
+
+def test_writes_waiting_behind_a_flush_are_merged_per_user(service, queue):
+    submitter = Submitter(queue)
+    service.gate.clear()
+    first = write(service, "ravi", 5)
+    submitter.hold(first)
+    waiting = [write(service, "ravi", 3), write(service, "anita", 1), write(service, "ravi", 2)]
+    submitter.queue_behind(*waiting)
+    service.gate.set()
+    submitter.join()
+
+    # Increments to the same QNT cell add up in submission order, user by user
+    assert submitter[first] == [5.0]
+    assert [submitter[item] for item in waiting] == [[8.0], [11.0], [10.0]]
+    assert service.grids["QNT"][2][5] == 11.0
+    # One batchUpdate for the first write, then one per user of the merged ones
+    assert service.calls["spreadsheets.batchUpdate"] == 3
+
+
+def test_a_failing_write_does_not_fail_the_writes_merged_with_it(service, queue):
+    submitter = Submitter(queue)
+    service.gate.clear()
+    submitter.hold(write(service, "ravi", 5))
+    good, bad = write(service, "ravi", 3), write(service, "ravi", 4, qnt_sheet_id=99)
+    submitter.queue_behind(good, bad)
+    service.gate.set()
+    submitter.join()
+
+    assert submitter[good] == [8.0]
+    assert isinstance(submitter[bad], ValueError)
+    assert service.grids["QNT"][2][5] == 8.0
+
+
+def test_full_queue_rejects_new_writes(service):
+    queue = SheetWriteQueue(tick=0.01, max_pending=1, wait_timeout=0.05)
+    submitter = Submitter(queue)
+    service.gate.clear()
+    try:
+        submitter.hold(write(service, "ravi", 5))
+        submitter.queue_behind(write(service, "ravi", 3))
+        with pytest.raises(WriteQueueFull):
+            queue.submit(SPREADSHEET, write(service, "ravi", 2))
+    finally:
+        service.gate.set()
+        submitter.join()
+        queue.close()
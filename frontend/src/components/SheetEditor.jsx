@@ -5,6 +5,17 @@ import googleAuthService from '../services/googleAuth';
 import Sidebar from './Sidebar';
 import { saveChatHistory, getTodaysChat } from '../utils/chatStorage';
 import { API_BASE_URL } from '../config';
+import { postEventStream } from '../utils/eventStream';
+
+// Progress text for the phase events of the streaming endpoints
+const STREAM_PHASE_LABELS = {
+  logs_loaded: ({ count }) => `Reading ${count} log entries...`,
+  parsed: ({ updates }) => `Understood ${updates} update${updates === 1 ? '' : 's'}...`,
+  rows_matched: ({ cells }) => `Updating ${cells.map(cell => `${cell.location} ${cell.work_type}`).join(', ')}...`,
+  written: () => 'Sheet updated, saving to LOG...',
+  logged: () => 'Saved to LOG',
+  queued: () => 'Sheet updated, LOG entry queued'
+};
 
 // Chat message component
 const ChatMessage = ({ message, isUser, isLoading, isError }) => {
@@ -396,21 +407,33 @@ const SheetEditor = ({ user, onLogout }) => {
         };
       }
 
-      // Make the API call
-      const response = await fetch(apiUrl, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'Authorization': `Bearer ${accessToken}`
-        },
-        body: JSON.stringify(requestBody)
+      // Show progress in place of the loading message while the response streams in
+      const showProgress = (text) => setMessages(prev => prev.map(msg =>
+        msg.id === loadingMessage.id ? { ...msg, text, isLoading: false } : msg
+      ));
+
+      // Make the API call, streaming phase events and answer text
+      let data = null;
+      let answer = '';
+      await postEventStream(`${apiUrl}/stream`, {
+        headers: { 'Authorization': `Bearer ${accessToken}` },
+        body: requestBody
+      }, (event, payload) => {
+        if (event === 'token') {
+          answer += payload.text;
+          showProgress(answer);
+        } else if (event === 'result') {
+          data = payload;
+        } else if (event === 'error') {
+          throw new Error(payload.detail);
+        } else if (STREAM_PHASE_LABELS[event]) {
+          showProgress(STREAM_PHASE_LABELS[event](payload));
+        }
       });
 
-      if (!response.ok) {
-        throw new Error(`API request failed with status ${response.status}`);
+      if (!data) {
+        throw new Error('No response from server');
       }
-
-      const data = await response.json();
       console.log('API Response:', data);
 
       // Create response message
@@ -437,7 +460,7 @@ const SheetEditor = ({ user, onLogout }) => {
       
       // Update the loading message with error
       setMessages(prev => {
-        const updated = prev.filter(msg => !msg.isLoading);
+        const updated = prev.filter(msg => msg.id !== loadingMessage.id);
         return [
           ...updated,
           {
@@ -0,0 +1,44 @@
+// POST a JSON body and read the server-sent events of the response.
+// EventSource only supports GET, so the stream is parsed by hand.
+export const postEventStream = async (url, { headers = {}, body }, onEvent) => {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      ...headers
+    },
+    body: JSON.stringify(body)
+  });
+
+  if (!response.ok) {
+    throw new Error(`API request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  const dispatch = (block) => {
+    let event = 'message';
+    const dataLines = [];
+    block.split('\n').forEach(line => {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    });
+    if (dataLines.length) onEvent(event, JSON.parse(dataLines.join('\n')));
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let separator;
+    while ((separator = buffer.indexOf('\n\n')) !== -1) {
+      dispatch(buffer.slice(0, separator));
+      buffer = buffer.slice(separator + 2);
+    }
+  }
+  if (buffer.trim()) dispatch(buffer);
+};